@@ -1,13 +1,39 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import Flask, request, jsonify, Response
 import os
 import json
 import re
-from datetime import datetime
-import shutil
+from datetime import datetime, timedelta
 import pytz
+from utils.cors import init_app as init_cors
+from utils.metrics import init_app as init_metrics, share_across_workers, span
+from utils.storage import load_json
+from utils.executor import map_blocking
+from utils import tracker_store
+from utils import layout
+from utils import events
+from utils import journal
+from utils import owners
+from utils.analytics import AnalyticsEngine, parse_date, bid_key_from_bid_id
+from utils.workload_index import WorkloadIndex
+from utils.alerts import DeadlineScheduler, sink_from_config
+from utils.changelog import ChangeLog
+from utils.suggestions import ActivitySuggestions
+from utils.workshop import WorkshopStore
+from utils.search_index import SearchIndex
+from utils import exporter
+from utils import importer
+from utils import projection
+from utils import admission
+from utils import invalidation
+from utils.singleflight import SingleFlight, SINGLEFLIGHT_SHARED
+from routes.bid_routes import bid_routes
 
 app = Flask(__name__)
+# Directory-per-bid store with per-deliverable activity shards (controllers/bid_controller.py)
+app.register_blueprint(bid_routes, url_prefix='/api/blueprint-bids')
+# CORS preflights are answered by the first before_request hook, ahead of metrics and logging
+init_cors(app)
+init_metrics(app)
 
 #FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
@@ -15,15 +41,77 @@ FRONTEND_URL = os.getenv("FRONTEND_URL")
 #BIDS_DIR = os.getenv("BIDS_DIR", "bids")
 BIDS_DIR = "bids"
 
-#CORS(app, resources={r"/*": {"origins": FRONTEND_URL}}, supports_credentials=True)
-CORS(app, resources={r"/*": {"origins": "https://bid-management-software.vercel.app"}}, supports_credentials=True)
-
 os.makedirs(BIDS_DIR, exist_ok=True)
 
 # Directory for Action Trackers
 ACTION_TRACKERS_DIR = os.path.join(BIDS_DIR, 'action_trackers')
 os.makedirs(ACTION_TRACKERS_DIR, exist_ok=True)
 
+# Archived bids and trackers
+ARCHIVE_DIR = os.path.join(BIDS_DIR, 'Archive')
+
+# Saved bid templates: <name>/bid.json and a sharded tracker under <name>/tracker
+TEMPLATES_DIR = os.path.join(BIDS_DIR, 'templates')
+
+# Directory for indexes, registries and background-job state (not bid documents)
+STATE_DIR = os.path.join(BIDS_DIR, '.state')
+os.makedirs(STATE_DIR, exist_ok=True)
+
+# Each worker writes its metrics here so /metrics reports the whole server
+share_across_workers(os.path.join(STATE_DIR, 'metrics'))
+
+# Generation table shared by the workers on this node: every write bumps the
+# revision of its file and of the bids tree, so caches elsewhere see it at once
+invalidation.init(os.path.join(STATE_DIR, 'generations'))
+invalidation.watch(BIDS_DIR, exclude=[STATE_DIR])
+
+# Per-route, per-bid and priority-class concurrency limits across all workers; reloaded when the file changes
+admission.init_app(app, os.getenv("ADMISSION_CONFIG", os.path.join(STATE_DIR, 'admission.json')),
+                   os.path.join(STATE_DIR, 'admission'))
+
+# Owner registry: documents store integer owner ids, resolved to names on read
+owners.init(os.path.join(STATE_DIR, 'owners.json'))
+
+# Change-data-capture log of every mutation, for incremental sync (GET /changes)
+change_log = ChangeLog(os.path.join(STATE_DIR, 'changes'))
+
+# Write-ahead journal for multi-document updates, which also records each
+# update's change in the change log; finish any a crash interrupted
+journal.init(os.path.join(STATE_DIR, 'journal'))
+journal.attach_change_log(change_log)
+journal.recover()
+
+# Full-text search over active and archived bids, activities and actions
+search_index = SearchIndex(os.path.join(STATE_DIR, 'search.db'), BIDS_DIR, ACTION_TRACKERS_DIR, ARCHIVE_DIR)
+events.subscribe(search_index.notify)
+
+# Single-flight groups for expensive reads that browsers fire in bursts
+singleflight_dir = os.path.join(STATE_DIR, 'singleflight') if SINGLEFLIGHT_SHARED else None
+dashboard_flight = SingleFlight("dashboard", singleflight_dir)
+listing_flight = SingleFlight("list_files", singleflight_dir)
+
+# Activity sequences per deliverable mined from past bids, for new bids
+activity_suggestions = ActivitySuggestions(os.path.join(STATE_DIR, 'activity_suggestions.json'), BIDS_DIR, ARCHIVE_DIR)
+events.subscribe(activity_suggestions.notify)
+
+# Shared win-theme workshop sessions: item and vote streams with server-side tallies
+workshops = WorkshopStore(os.path.join(STATE_DIR, 'workshops'))
+
+# Columnar analytics over every active activity and action
+analytics = AnalyticsEngine(BIDS_DIR, ACTION_TRACKERS_DIR, change_log)
+events.subscribe(analytics.notify)
+
+# Per-owner interval index for capacity queries across bids
+workload = WorkloadIndex(BIDS_DIR, ACTION_TRACKERS_DIR, change_log)
+events.subscribe(workload.notify)
+
+# Reminder and overdue alerts for open activities and actions
+deadline_alerts = DeadlineScheduler(
+    workload, sink_from_config(),
+    os.path.join(STATE_DIR, 'alerts_fired.json'), os.path.join(STATE_DIR, 'alerts.lock'),
+)
+events.subscribe(deadline_alerts.notify)
+
 # In-memory session data
 session_data = {
     "context": None,
@@ -50,18 +138,27 @@ SUGGESTED_ACTIVITIES = {
     'Commercial Proposal': ['Draft Proposal', 'Review', 'Submit'],
 }
 
-def get_bid_file_path(bid_id="current_bid"):
-    return os.path.join(BIDS_DIR, f"{bid_id}.json")
+# Pass create=True when the path is written directly rather than through a
+# journal transaction (which creates the shard itself)
+def get_bid_file_path(bid_id="current_bid", create=False):
+    return layout.entry_path(BIDS_DIR, f"{bid_id}.json", create)
 
 def get_action_tracker_file_path(at_id):
-    return os.path.join(ACTION_TRACKERS_DIR, f"{at_id}.json")
+    return layout.entry_path(ACTION_TRACKERS_DIR, f"{at_id}.json")
+
+# Bid documents are stored with owner ids instead of names (see utils/owners.py)
+def load_bid(file_path):
+    return owners.decode_bid(load_json(file_path))
+
+def get_archive_path(name):
+    return layout.new_entry_path(ARCHIVE_DIR, name)
 
-def move_to_archive(bid_id):
-    archive_dir = os.path.join(BIDS_DIR, 'Archive')
-    os.makedirs(archive_dir, exist_ok=True)
+def move_to_archive(bid_id, tx=None):
     file_path = get_bid_file_path(bid_id)
     if os.path.exists(file_path):
-        shutil.move(file_path, os.path.join(archive_dir, f"{bid_id}.json"))
+        with journal.transaction(tx) as tx:
+            tx.move(file_path, get_archive_path(f"{bid_id}.json"))
+            tx.publish("bid", bid_id, "archive")
     # Move corresponding action tracker if exists
     # We'll handle action trackers separately by their naming.
 
@@ -79,10 +176,15 @@ def isValidDate(date_str):
 def isAfterDate(date1, date2):
     return datetime.strptime(date1, "%Y-%m-%d") > datetime.strptime(date2, "%Y-%m-%d")
 
+# Deliverables to offer for a new bid: the most used ones first, then the defaults
+def suggestDeliverables():
+    mined = activity_suggestions.top_deliverables(len(DEFAULT_DELIVERABLES))
+    return mined + [d for d in DEFAULT_DELIVERABLES if d not in mined][:len(DEFAULT_DELIVERABLES) - len(mined)]
+
 def generateActivities(deliverables):
     activities = {}
     for deliverable in deliverables:
-        tasks = SUGGESTED_ACTIVITIES.get(deliverable, ['Task 1'])
+        tasks = activity_suggestions.suggest(deliverable) or SUGGESTED_ACTIVITIES.get(deliverable, ['Task 1'])
         activities[deliverable] = [{"name": t, "owner": "Unassigned", "status": "Pending", "startDate": "", "endDate": ""} for t in tasks]
     return activities
 
@@ -97,27 +199,30 @@ def finalizeBid(bidDetails):
     try:
         bidNameBase = f"{bidDetails['clientName']}_{bidDetails['opportunityName']}"
         existing_files = [
-            f for f in os.listdir(BIDS_DIR)
-            if f.startswith(bidNameBase) and f.endswith('.json') and "action_trackers" not in f
+            f for f in layout.list_prefix(BIDS_DIR, bidNameBase)
+            if f.endswith('.json') and "action_trackers" not in f
         ]
         current_versions = [extract_version(f) for f in existing_files]
         newVersion = max(current_versions) + 1 if current_versions else 1
         newBidId = f"{bidNameBase}_version{newVersion}"
         newBidData = {**bidDetails, "bidId": newBidId}
 
-        if current_versions:
-            lastVersion = max(current_versions)
-            previousBidId = f"{bidNameBase}_version{lastVersion}"
-            move_to_archive(previousBidId)
+        # Archiving the old version, saving the new one and rotating the
+        # tracker commit together or not at all
+        with journal.transaction() as tx:
+            if current_versions:
+                lastVersion = max(current_versions)
+                previousBidId = f"{bidNameBase}_version{lastVersion}"
+                move_to_archive(previousBidId, tx)
 
-        # Save the new bid JSON
-        file_path = get_bid_file_path(newBidId)
-        with open(file_path, 'w') as file:
-            json.dump(newBidData, file, indent=4)
+            # Save the new bid JSON
+            file_path = get_bid_file_path(newBidId)
+            tx.save(file_path, owners.encode_bid(newBidData))
+            tx.publish("bid", newBidId, "create")
 
-        # Initialize Action Tracker
-        at_base_id = get_action_tracker_base_id(bidDetails['clientName'], bidDetails['opportunityName'])
-        create_new_action_tracker_version(at_base_id, bidDetails['deliverables'])
+            # Initialize Action Tracker
+            at_base_id = get_action_tracker_base_id(bidDetails['clientName'], bidDetails['opportunityName'])
+            create_new_action_tracker_version(at_base_id, bidDetails['deliverables'], tx)
 
         return f"Bid saved successfully as {newBidId} and Action Tracker initialized!"
     except Exception as e:
@@ -127,54 +232,58 @@ def finalizeBid(bidDetails):
 def get_action_tracker_base_id(clientName, opportunityName):
     return f"{clientName}_{opportunityName}_Action Tracker"
 
+def list_action_tracker_versions(at_base_id):
+    # Sharded trackers are directories; trackers written before sharding are single .json files
+    return list(layout.list_prefix(ACTION_TRACKERS_DIR, at_base_id))
+
+def get_action_tracker_version_path(at_base_id, version):
+    path = layout.entry_path(ACTION_TRACKERS_DIR, f"{at_base_id}_version{version}")
+    return path if os.path.isdir(path) else layout.entry_path(ACTION_TRACKERS_DIR, f"{at_base_id}_version{version}.json")
+
 def get_latest_action_tracker_file(at_base_id):
-    # Find all action tracker files starting with at_base_id
-    if not os.path.exists(ACTION_TRACKERS_DIR):
-        return None
-    files = [f for f in os.listdir(ACTION_TRACKERS_DIR) if f.startswith(at_base_id) and f.endswith('.json')]
+    # Find all action tracker versions starting with at_base_id
+    files = list_action_tracker_versions(at_base_id)
     if not files:
         return None
     current_versions = [extract_version(f) for f in files]
     latest_version = max(current_versions) if current_versions else None
     if latest_version is None:
         return None
-    latest_file = f"{at_base_id}_version{latest_version}.json"
-    return os.path.join(ACTION_TRACKERS_DIR, latest_file)
+    return get_action_tracker_version_path(at_base_id, latest_version)
 
-def archive_action_tracker(at_base_id):
-    archive_dir = os.path.join(BIDS_DIR, 'Archive')
-    os.makedirs(archive_dir, exist_ok=True)
-    files = [f for f in os.listdir(ACTION_TRACKERS_DIR) if f.startswith(at_base_id) and f.endswith('.json')]
+def archive_action_tracker(at_base_id, tx=None):
+    files = layout.list_prefix(ACTION_TRACKERS_DIR, at_base_id)
     if not files:
         return
-    # Archive all existing versions
-    for f in files:
-        shutil.move(os.path.join(ACTION_TRACKERS_DIR, f), os.path.join(archive_dir, f))
-
-def create_new_action_tracker_version(at_base_id, deliverables):
+    # Archive all existing versions, writing out any coalesced updates first
+    with journal.transaction(tx) as tx:
+        for f, path in files.items():
+            tracker_store.flush(path)
+            tx.move(path, get_archive_path(f))
+        tx.publish("tracker", at_base_id, "archive")
+
+def create_new_action_tracker_version(at_base_id, deliverables, tx=None):
     # Check existing versions
-    files = [f for f in os.listdir(ACTION_TRACKERS_DIR) if f.startswith(at_base_id) and f.endswith('.json')]
+    files = list_action_tracker_versions(at_base_id)
     old_action_tracker_data = None
 
     if files:
         existing_versions = [extract_version(f) for f in files]
         old_version = max(existing_versions)
-        old_file = f"{at_base_id}_version{old_version}.json"
-        old_file_path = os.path.join(ACTION_TRACKERS_DIR, old_file)
+        old_file_path = get_action_tracker_version_path(at_base_id, old_version)
 
         # Load old version data before archiving
-        with open(old_file_path, 'r') as old_file:
-            old_action_tracker_data = json.load(old_file)
+        old_action_tracker_data = tracker_store.load_tracker(old_file_path)
 
         # Archive old versions
-        archive_action_tracker(at_base_id)
+        archive_action_tracker(at_base_id, tx)
         new_version = old_version + 1
     else:
         # No previous versions, start fresh
         new_version = 1
 
     new_at_id = f"{at_base_id}_version{new_version}"
-    new_at_path = get_action_tracker_file_path(new_at_id)
+    new_at_path = layout.new_entry_path(ACTION_TRACKERS_DIR, new_at_id)
 
     if old_action_tracker_data:
         # Use old data as a base and update deliverables if needed
@@ -194,32 +303,57 @@ def create_new_action_tracker_version(at_base_id, deliverables):
             "actionHistory": {}
         }
 
-    with open(new_at_path, 'w') as at_file:
-        json.dump(action_tracker_data, at_file, indent=4)
+    with journal.transaction(tx) as tx:
+        tracker_store.write_tracker(new_at_path, action_tracker_data, tx)
+        tx.publish("tracker", at_base_id, "create")
 
     return new_at_path
 
+TEMPLATE_NAME = re.compile(r"^[\w\- ]+$")
+
+def get_template_dir(name):
+    return os.path.join(TEMPLATES_DIR, name) if name and TEMPLATE_NAME.match(name) else None
+
+# Bid document path and tracker path (or None) to clone from: an active bid,
+# an archived bid version, or a saved template
+def resolve_clone_source(source, source_type):
+    if source_type == "template":
+        template_dir = get_template_dir(source)
+        if not template_dir or not os.path.exists(os.path.join(template_dir, "bid.json")):
+            return None, None
+        tracker_path = os.path.join(template_dir, "tracker")
+        return os.path.join(template_dir, "bid.json"), tracker_path if os.path.isdir(tracker_path) else None
+
+    parts = source.split('_')
+    if len(parts) < 3:
+        return None, None
+    at_base_id = get_action_tracker_base_id(parts[0], "_".join(parts[1:-1]))
+    if source_type == "archive":
+        bid_path = layout.entry_path(ARCHIVE_DIR, f"{source}.json")
+        # Trackers are archived with the same version number as their bid
+        tracker_name = f"{at_base_id}_version{extract_version(source)}"
+        tracker_path = layout.entry_path(ARCHIVE_DIR, tracker_name)
+        if not os.path.isdir(tracker_path):
+            tracker_path = layout.entry_path(ARCHIVE_DIR, f"{tracker_name}.json")
+    else:
+        bid_path = layout.entry_path(BIDS_DIR, f"{source}.json")
+        tracker_path = get_latest_action_tracker_file(at_base_id)
+    if not os.path.exists(bid_path):
+        return None, None
+    return bid_path, tracker_path if tracker_path and os.path.exists(tracker_path) else None
+
 @app.before_request
 def log_request_info():
     print(f"[Request] {request.method} {request.url}")
     print("[Request Headers]", request.headers)
-    if request.method != 'OPTIONS':
+    # Uploads (CSV/JSONL imports) are streamed by their handlers, so only JSON
+    # bodies are logged, and never an import's: a JSONL upload may be sent as
+    # application/json, and reading it here would leave the handler an empty stream
+    if request.is_json and request.endpoint not in ('import_actions_route', 'import_activities_route'):
         print(f"[Request Body] {request.get_data()}")
 
-@app.after_request
-def add_cors_headers(response):
-    #response.headers["Access-Control-Allow-Origin"] = FRONTEND_URL
-    response.headers["Access-Control-Allow-Origin"] = "https://bid-management-software.vercel.app"
-
-    response.headers["Access-Control-Allow-Credentials"] = "true"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    return response
-
-@app.route('/create-bid', methods=['OPTIONS', 'POST'])
+@app.route('/create-bid', methods=['POST'])
 def create_bid_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         data = request.json
         required_fields = ['clientName', 'opportunityName', 'timeline']
@@ -241,9 +375,8 @@ def create_bid_route():
 
         client_opportunity_prefix = f"{data['clientName']}_{data['opportunityName']}"
         version = 1
-        existing_files = [
-            f for f in os.listdir(BIDS_DIR) if f.startswith(client_opportunity_prefix) and f.endswith('.json')
-        ]
+        candidates = layout.list_prefix(BIDS_DIR, client_opportunity_prefix)
+        existing_files = [f for f in candidates if f.endswith('.json')]
         new_bid_data = data
 
         if existing_files:
@@ -251,23 +384,29 @@ def create_bid_route():
             version = max(existing_versions) + 1
 
             latest_file = max(existing_files, key=extract_version)
-            latest_file_path = os.path.join(BIDS_DIR, latest_file)
-            with open(latest_file_path, 'r') as file:
-                archived_data = json.load(file)
+            latest_file_path = candidates[latest_file]
+            archived_data = load_bid(latest_file_path)
 
             new_bid_data = {**archived_data, **data}
             new_bid_data['timeline'] = data['timeline']
             new_bid_data['deliverables'] = data['deliverables']
             new_bid_data['bidId'] = f"{client_opportunity_prefix}_version{version}"
 
-            move_to_archive(latest_file.replace('.json', ''))
         else:
             new_bid_data['bidId'] = f"{client_opportunity_prefix}_version{version}"
 
+        # Deliverables without activities start from the suggested ones
+        activities = new_bid_data.get('activities') or {}
+        suggested = generateActivities([d for d in new_bid_data['deliverables'] if not activities.get(d)])
+        new_bid_data['activities'] = {d: activities.get(d) or suggested[d] for d in new_bid_data['deliverables']}
+
         bid_id = new_bid_data['bidId']
         file_path = get_bid_file_path(bid_id)
-        with open(file_path, 'w') as file:
-            json.dump(new_bid_data, file, indent=4)
+        with journal.transaction() as tx:
+            if existing_files:
+                move_to_archive(latest_file.replace('.json', ''), tx)
+            tx.save(file_path, owners.encode_bid(new_bid_data))
+            tx.publish("bid", bid_id, "create")
 
         print(f"[CREATE BID] Bid created successfully: {bid_id}")
         return jsonify({"success": True, "message": f"Bid created successfully: {bid_id}", "bidId": bid_id}), 201
@@ -275,10 +414,186 @@ def create_bid_route():
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error creating bid: {str(e)}"}), 500
 
-@app.route('/move-to-archive', methods=['OPTIONS', 'POST'])
+@app.route('/api/bids/clone', methods=['POST'])
+def clone_bid_route():
+    try:
+        # {"source": bid id or template name, "sourceType": "bid" | "archive" | "template",
+        #  "clientName": ..., "opportunityName": ..., "overrides": {timeline, deliverables, team, activities}}
+        data = request.json or {}
+        source = data.get('source')
+        source_type = data.get('sourceType', 'bid')
+        client_name = data.get('clientName')
+        opportunity_name = data.get('opportunityName')
+        overrides = {k: v for k, v in (data.get('overrides') or {}).items()
+                     if k in ('timeline', 'deliverables', 'team', 'activities')}
+
+        if source_type not in ('bid', 'archive', 'template'):
+            return jsonify({"success": False, "message": "sourceType must be bid, archive or template."}), 400
+        if not source or not client_name or not opportunity_name:
+            return jsonify({"success": False, "message": "source, clientName and opportunityName are required."}), 400
+
+        bid_path, tracker_path = resolve_clone_source(source, source_type)
+        if not bid_path:
+            return jsonify({"success": False, "message": f"Clone source {source} not found."}), 404
+
+        bid_name_base = f"{client_name}_{opportunity_name}"
+        at_base_id = get_action_tracker_base_id(client_name, opportunity_name)
+        if any(bid_key_from_bid_id(f[:-len('.json')]) == bid_name_base
+               for f in layout.list_prefix(BIDS_DIR, bid_name_base) if f.endswith('.json')) \
+                or list_action_tracker_versions(at_base_id):
+            return jsonify({"success": False, "message": f"A bid for {bid_name_base} already exists."}), 409
+
+        # Work on the stored form: unchanged activities and team keep their owner ids
+        new_bid_id = f"{bid_name_base}_version1"
+        new_bid_data = load_json(bid_path)
+        new_bid_data.update(owners.encode_bid(overrides))
+        new_bid_data.update({"clientName": client_name, "opportunityName": opportunity_name, "bidId": new_bid_id})
+        deliverables = new_bid_data.get('deliverables', [])
+        new_bid_data['activities'] = {
+            d: acts for d, acts in (new_bid_data.get('activities') or {}).items() if d in deliverables
+        }
+
+        new_at_path = layout.new_entry_path(ACTION_TRACKERS_DIR, f"{at_base_id}_version1")
+        with journal.transaction() as tx:
+            tx.save(get_bid_file_path(new_bid_id), new_bid_data)
+            tx.publish("bid", new_bid_id, "create")
+            if tracker_path:
+                # Action shards and history are hard-linked, not copied
+                tracker_store.clone_tracker(
+                    tracker_path, new_at_path, {"bidId": at_base_id, "deliverables": deliverables}, tx)
+                tx.publish("tracker", at_base_id, "create")
+            else:
+                create_new_action_tracker_version(at_base_id, deliverables, tx)
+
+        print(f"[CLONE BID] {source_type} {source} cloned as {new_bid_id}")
+        return jsonify({"success": True, "message": f"Bid cloned successfully: {new_bid_id}", "bidId": new_bid_id}), 201
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error cloning bid: {str(e)}"}), 500
+
+@app.route('/api/suggestions', methods=['GET'])
+def suggestions_route():
+    try:
+        # ?deliverables=a,b for activity suggestions; deliverable suggestions always
+        deliverables = [d.strip() for d in request.args.get('deliverables', '').split(',') if d.strip()]
+        return jsonify({
+            "success": True,
+            "deliverables": suggestDeliverables(),
+            "activities": {d: [a["name"] for a in acts] for d, acts in generateActivities(deliverables).items()},
+        }), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error fetching suggestions: {str(e)}"}), 500
+
+@app.route('/api/workshops', methods=['GET', 'POST'])
+def workshops_route():
+    try:
+        if request.method == 'GET':
+            return jsonify({"success": True, "sessions": workshops.list(request.args.get('bidId'))}), 200
+        data = request.get_json(silent=True) or {}
+        mid_votes = data.get('midVotes', 5)
+        mid_impact = data.get('midImpact')
+        if not isinstance(mid_votes, (int, float)) or (mid_impact is not None and not isinstance(mid_impact, (int, float))):
+            return jsonify({"success": False, "message": "midVotes and midImpact must be numbers"}), 400
+        session = workshops.create(data.get('bidId'), data.get('name') or "Win themes workshop", mid_votes, mid_impact)
+        journal.publish("workshop", session["id"], "create")
+        return jsonify({"success": True, "session": session}), 201
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error handling workshop sessions: {str(e)}"}), 500
+
+def _since_arg(value):
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return None
+
+# ?since=<seq> returns only the items changed after that event; poll with the
+# returned seq to receive tallies and quadrants as they move
+@app.route('/api/workshops/<session_id>', methods=['GET'])
+def workshop_state_route(session_id):
+    try:
+        since = _since_arg(request.args.get('since'))
+        if since is None:
+            return jsonify({"success": False, "message": "since must be an integer"}), 400
+        state = workshops.read(session_id, since)
+        if state is None:
+            return jsonify({"success": False, "message": "Workshop session not found"}), 404
+        return jsonify({"success": True, **state}), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error fetching workshop: {str(e)}"}), 500
+
+# Body: {"participant", "since", "events": [{"type": "add", "category", "text", "impactScore"},
+# {"type": "vote", "itemId", "delta"}, {"type": "impact", "itemId", "value"}, ...]}.
+# Valid events are appended even if others are rejected; the response carries
+# the changes since "since", including other participants' events.
+@app.route('/api/workshops/<session_id>/events', methods=['POST'])
+def workshop_events_route(session_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        events_in = data.get('events')
+        since = _since_arg(data.get('since'))
+        if not isinstance(events_in, list) or not events_in:
+            return jsonify({"success": False, "message": "events must be a non-empty list"}), 400
+        if since is None:
+            return jsonify({"success": False, "message": "since must be an integer"}), 400
+        state, errors = workshops.append(session_id, str(data.get('participant') or 'anonymous'), events_in, since)
+        if state is None:
+            return jsonify({"success": False, "message": "Workshop session not found"}), 404
+        if len(errors) < len(events_in):
+            journal.publish("workshop", session_id, "update")
+        return jsonify({"success": True, "accepted": len(events_in) - len(errors), "errors": errors, **state}), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error recording workshop events: {str(e)}"}), 500
+
+@app.route('/api/templates', methods=['GET'])
+def list_templates_route():
+    try:
+        names = sorted(
+            f for f in (os.listdir(TEMPLATES_DIR) if os.path.isdir(TEMPLATES_DIR) else [])
+            if os.path.exists(os.path.join(TEMPLATES_DIR, f, "bid.json"))
+        )
+        return jsonify({"success": True, "templates": names}), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error listing templates: {str(e)}"}), 500
+
+@app.route('/api/templates', methods=['POST'])
+def save_template_route():
+    try:
+        # {"name": ..., "source": bid id, "sourceType": "bid" | "archive"}
+        data = request.json or {}
+        template_dir = get_template_dir(data.get('name'))
+        source_type = data.get('sourceType', 'bid')
+        if not template_dir:
+            return jsonify({"success": False, "message": "Template name may only contain letters, digits, spaces, _ and -."}), 400
+        if source_type not in ('bid', 'archive'):
+            return jsonify({"success": False, "message": "sourceType must be bid or archive."}), 400
+        if os.path.exists(template_dir):
+            return jsonify({"success": False, "message": f"Template {data['name']} already exists."}), 409
+
+        bid_path, tracker_path = resolve_clone_source(data.get('source') or '', source_type)
+        if not bid_path:
+            return jsonify({"success": False, "message": f"Bid {data.get('source')} not found."}), 404
+
+        template = load_json(bid_path)
+        template.pop('bidId', None)
+        with journal.transaction() as tx:
+            tx.save(os.path.join(template_dir, "bid.json"), template)
+            if tracker_path:
+                tracker_store.clone_tracker(
+                    tracker_path, os.path.join(template_dir, "tracker"), {"bidId": data['name']}, tx)
+            tx.publish("template", data['name'], "create")
+
+        return jsonify({"success": True, "message": f"Template {data['name']} saved."}), 201
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error saving template: {str(e)}"}), 500
+
+@app.route('/move-to-archive', methods=['POST'])
 def move_to_archive_endpoint():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         data = request.json
         file_name = data.get('fileName')
@@ -286,18 +601,19 @@ def move_to_archive_endpoint():
         if not file_name:
             return jsonify({"success": False, "message": "File name is required."}), 400
 
-        source_path = os.path.join(BIDS_DIR, f"{file_name}.json")
-        archive_path = os.path.join(BIDS_DIR, 'Archive', f"{file_name}.json")
+        source_path = get_bid_file_path(file_name)
 
         if not os.path.exists(source_path):
             return jsonify({"success": False, "message": "File not found."}), 404
 
-        shutil.move(source_path, archive_path)
-
-        # Move corresponding action tracker if exists
         action_tracker_path = get_action_tracker_file_path(file_name)
-        if os.path.exists(action_tracker_path):
-            shutil.move(action_tracker_path, os.path.join(BIDS_DIR, 'Archive', f"{file_name}_action_tracker.json"))
+        tracker_store.flush(action_tracker_path)
+        with journal.transaction() as tx:
+            move_to_archive(file_name, tx)
+            # Move corresponding action tracker if exists
+            if os.path.exists(action_tracker_path):
+                tx.move(action_tracker_path, get_archive_path(f"{file_name}_action_tracker.json"))
+                tx.publish("tracker", f"{bid_key_from_bid_id(file_name)}_Action Tracker", "archive")
 
         return jsonify({"success": True, "message": f"File '{file_name}' moved to archive."}), 200
 
@@ -305,90 +621,94 @@ def move_to_archive_endpoint():
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error moving file to archive: {str(e)}"}), 500
 
-@app.route('/save-bid-data', methods=['OPTIONS', 'POST'])
+@app.route('/save-bid-data', methods=['POST'])
 def save_bid_data_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         data = request.json
         bid_id = data.get('bidId', 'current_bid')
-        file_path = get_bid_file_path(bid_id)
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        file_path = get_bid_file_path(bid_id, create=True)
+        with journal.transaction() as tx:
+            tx.save(file_path, owners.encode_bid(data))
+            tx.publish("bid", bid_id, "update")
 
         return jsonify({"message": "Bid data saved successfully."}), 200
     except Exception as e:
         print(f"[Error] {str(e)}")
         return jsonify({"success": False, "message": f"Error saving bid data: {str(e)}"}), 500
 
-@app.route('/get-bid-data', methods=['OPTIONS', 'GET'])
+@app.route('/get-bid-data', methods=['GET'])
 def get_bid_data_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         bid_id = request.args.get('bidId', 'current_bid')
+        fields = projection.from_request(request.args)
         file_path = get_bid_file_path(bid_id)
         if not os.path.exists(file_path):
             return jsonify({"message": "No bid data found.", "data": None}), 404
-        with open(file_path, 'r') as file:
-            data = json.load(file)
+        # Owner names are resolved only for the activities and team actually returned
+        data = owners.decode_bid(projection.project(load_json(file_path), fields))
         return jsonify({"message": "Bid data fetched successfully.", "data": data}), 200
     except Exception as e:
         print(f"[Error] {str(e)}")
         return jsonify({"success": False, "message": f"Error fetching bid data: {str(e)}"}), 500
 
-@app.route('/list-files', methods=['OPTIONS', 'GET'])
+# Summary entries for the given bid files, for /list-files
+def build_file_list(all_files):
+    # Read the files concurrently on the I/O pool rather than one after another
+    file_list = []
+    for file_path, file_data in zip(all_files, map_blocking(load_json, all_files)):
+        file_list.append({
+            "id": os.path.basename(file_path).replace('.json', '').replace('_action_tracker', ''),
+            "clientName": file_data.get('clientName', 'Unknown'),
+            "opportunityName": file_data.get('opportunityName', 'Unknown'),
+            "lastModified": os.path.getmtime(file_path),
+            "archived": 'Archive' in file_path,
+        })
+    return file_list
+
+@app.route('/list-files', methods=['GET'])
 def list_files_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
-        bids_dir = BIDS_DIR
-        archive_dir = os.path.join(bids_dir, 'Archive')
         include_archived = request.args.get('archived', 'false').lower() == 'true'
 
         active_files = [
-            os.path.join(bids_dir, f) for f in os.listdir(bids_dir)
+            path for f, path in layout.list_entries(BIDS_DIR)
             if f.endswith('.json') and f != 'current_bid.json'
         ]
 
         archived_files = []
-        if include_archived and os.path.exists(archive_dir):
-            archived_files = [
-                os.path.join(archive_dir, f) for f in os.listdir(archive_dir) if f.endswith('.json')
-            ]
+        if include_archived:
+            archived_files = [path for f, path in layout.list_entries(ARCHIVE_DIR) if f.endswith('.json')]
 
         all_files = active_files + archived_files
 
-        file_list = []
-        for file_path in all_files:
-            with open(file_path, 'r') as file:
-                file_data = json.load(file)
-                file_list.append({
-                    "id": os.path.basename(file_path).replace('.json', '').replace('_action_tracker', ''),
-                    "clientName": file_data.get('clientName', 'Unknown'),
-                    "opportunityName": file_data.get('opportunityName', 'Unknown'),
-                    "lastModified": os.path.getmtime(file_path),
-                    "archived": 'Archive' in file_path,
-                })
+        # Keyed by the bids tree's revision (or every listed file's mtime without the
+        # invalidation table), so concurrent identical listings share one read
+        revision = invalidation.tree_revision(BIDS_DIR, ARCHIVE_DIR)
+        if revision is None:
+            revision = [(path, os.stat(path).st_mtime_ns) for path in all_files]
+        revision = (include_archived, all_files, revision)
+        file_list = listing_flight.do(revision, lambda: build_file_list(all_files))
 
         return jsonify({"files": file_list}), 200
     except Exception as e:
         print(f"[Error] {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/delete-bid-data', methods=['OPTIONS', 'DELETE'])
+@app.route('/delete-bid-data', methods=['DELETE'])
 def delete_bid_data_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         bid_id = request.args.get('bidId', 'current_bid')
         file_path = get_bid_file_path(bid_id)
 
         if os.path.exists(file_path):
-            os.remove(file_path)
             action_tracker_path = get_action_tracker_file_path(bid_id)
-            if os.path.exists(action_tracker_path):
-                os.remove(action_tracker_path)
+            tracker_store.flush(action_tracker_path)
+            with journal.transaction() as tx:
+                tx.delete(file_path)
+                tx.publish("bid", bid_id, "delete")
+                if os.path.exists(action_tracker_path):
+                    tx.delete(action_tracker_path)
+                    tx.publish("tracker", f"{bid_key_from_bid_id(bid_id)}_Action Tracker", "delete")
             return jsonify({"message": "Bid data deleted successfully."}), 200
         else:
             return jsonify({"message": "No bid data found to delete."}), 404
@@ -407,17 +727,113 @@ def save_activities_route():
 
     bid_id = "current_bid"
     file_path = get_bid_file_path(bid_id)
-    with open(file_path, 'r') as file:
-        bid_data = json.load(file)
+    bid_data = load_bid(file_path)
 
     bid_data['activities'] = bid_data.get('activities', {})
     bid_data['activities'][deliverable] = activities
 
-    with open(file_path, 'w') as file:
-        json.dump(bid_data, file, indent=4)
+    with journal.transaction() as tx:
+        tx.save(file_path, owners.encode_bid(bid_data))
+        tx.publish("bid", bid_id, "update")
 
     return jsonify({"success": True, "message": "Activities saved successfully"})
 
+# Dashboard response for one bid document, with only the requested sections
+def build_dashboard(file_path, sections):
+    wanted_metrics = projection.subkeys(sections, "metrics")
+    want_metric = lambda name: projection.wants(sections, "metrics") and (wanted_metrics is None or name in wanted_metrics)
+
+    # Aggregated on the stored owner ids; names are resolved once at the end
+    bid_data = load_json(file_path)
+    response = {"success": True}
+
+    with span("aggregate"):
+        if projection.wants(sections, "metrics"):
+            metrics = {}
+            if want_metric("totalActivities"):
+                metrics["totalActivities"] = sum(len(activities) for activities in bid_data.get("activities", {}).values())
+            if want_metric("completedActivities"):
+                metrics["completedActivities"] = sum(
+                    sum(1 for activity in activities if activity.get("status") == "Completed")
+                    for activities in bid_data.get("activities", {}).values()
+                )
+
+            if want_metric("completionByTrack"):
+                metrics["completionByTrack"] = [
+                    {
+                        "name": deliverable,
+                        "value": len([a for a in activities if a.get("status") == "Completed"]),
+                        "total": len(activities),
+                        "completionPercentage": round(
+                            (len([a for a in activities if a.get("status") == "Completed"]) / len(activities)) * 100, 2
+                        ) if len(activities) > 0 else 0
+                    }
+                    for deliverable, activities in bid_data.get("activities", {}).items()
+                ]
+
+            if want_metric("completionByPerson"):
+                completion_by_person = {}
+                total_activities_by_person = {}
+                for activities in bid_data.get("activities", {}).values():
+                    for activity in activities:
+                        owner = owners.owner_key(activity)
+                        total_activities_by_person[owner] = total_activities_by_person.get(owner, 0) + 1
+                        if activity.get("status") == "Completed":
+                            completion_by_person[owner] = completion_by_person.get(owner, 0) + 1
+
+                person_names = dict(zip(total_activities_by_person, owners.resolve(list(total_activities_by_person))))
+                metrics["completionByPerson"] = [
+                    {
+                        "name": person_names[person],
+                        "value": completion_by_person.get(person, 0),
+                        "totalActivities": total_activities_by_person.get(person, 1),
+                        "completionPercentage": round(
+                            (completion_by_person.get(person, 0) / total_activities_by_person.get(person, 1)) * 100, 2
+                        ) if total_activities_by_person.get(person, 1) > 0 else 0
+                    }
+                    for person in total_activities_by_person
+                ]
+            response["metrics"] = metrics
+
+        if projection.wants(sections, "activitiesByStatus"):
+            activities_by_status = {}
+            for activities in bid_data.get("activities", {}).values():
+                for activity in activities:
+                    owner = owners.owner_key(activity)
+                    status = activity.get("status", "Unknown")
+                    if owner not in activities_by_status:
+                        activities_by_status[owner] = {}
+                    activities_by_status[owner][status] = activities_by_status[owner].get(status, 0) + 1
+
+            response["activitiesByStatus"] = [
+                {"owner": name, "statuses": statuses}
+                for name, statuses in zip(owners.resolve(list(activities_by_status)), activities_by_status.values())
+            ]
+
+        if projection.wants(sections, "groupedActivities"):
+            wanted_deliverables = projection.subkeys(sections, "groupedActivities")
+            activities_by_deliverable = {
+                deliverable: activities
+                for deliverable, activities in bid_data.get("activities", {}).items()
+                if wanted_deliverables is None or deliverable in wanted_deliverables
+            }
+            owners.decode_records([a for acts in activities_by_deliverable.values() for a in acts])
+
+            response["groupedActivities"] = {
+                deliverable: [
+                    {
+                        "name": activity.get("name", "Unnamed Activity"),
+                        "owner": activity.get("owner", "Unassigned"),
+                        "endDate": activity.get("endDate", "N/A"),
+                        "status": activity.get("status", "Unknown"),
+                        "remarks": activity.get("remarks", "No Remarks"),
+                    }
+                    for activity in activities
+                ]
+                for deliverable, activities in activities_by_deliverable.items()
+            }
+    return response
+
 @app.route('/api/dashboard', methods=['GET'], endpoint='get_dashboard_data')
 def get_dashboard_data_route():
     try:
@@ -426,89 +842,15 @@ def get_dashboard_data_route():
         if not os.path.exists(file_path):
             return jsonify({"success": False, "message": "Bid data not found.", "data": None}), 404
 
-        with open(file_path, 'r') as file:
-            bid_data = json.load(file)
-
-        total_activities = sum(len(activities) for activities in bid_data.get("activities", {}).values())
-        completed_activities = sum(
-            sum(1 for activity in activities if activity.get("status") == "Completed")
-            for activities in bid_data.get("activities", {}).values()
-        )
-
-        completion_by_track = [
-            {
-                "name": deliverable,
-                "value": len([a for a in activities if a.get("status") == "Completed"]),
-                "total": len(activities),
-                "completionPercentage": round(
-                    (len([a for a in activities if a.get("status") == "Completed"]) / len(activities)) * 100, 2
-                ) if len(activities) > 0 else 0
-            }
-            for deliverable, activities in bid_data.get("activities", {}).items()
-        ]
-
-        completion_by_person = {}
-        total_activities_by_person = {}
-        for activities in bid_data.get("activities", {}).values():
-            for activity in activities:
-                owner = activity.get("owner", "Unassigned")
-                total_activities_by_person[owner] = total_activities_by_person.get(owner, 0) + 1
-                if activity.get("status") == "Completed":
-                    completion_by_person[owner] = completion_by_person.get(owner, 0) + 1
-
-        completion_by_person_data = [
-            {
-                "name": person,
-                "value": completion_by_person.get(person, 0),
-                "totalActivities": total_activities_by_person.get(person, 1),
-                "completionPercentage": round(
-                    (completion_by_person.get(person, 0) / total_activities_by_person.get(person, 1)) * 100, 2
-                ) if total_activities_by_person.get(person, 1) > 0 else 0
-            }
-            for person in total_activities_by_person
-        ]
-
-        activities_by_status = {}
-        for activities in bid_data.get("activities", {}).values():
-            for activity in activities:
-                owner = activity.get("owner", "Unassigned")
-                status = activity.get("status", "Unknown")
-                if owner not in activities_by_status:
-                    activities_by_status[owner] = {}
-                activities_by_status[owner][status] = activities_by_status[owner].get(status, 0) + 1
-
-        activities_by_status_chart = [
-            {"owner": owner, "statuses": statuses}
-            for owner, statuses in activities_by_status.items()
-        ]
+        # ?sections=metrics,groupedActivities,activitiesByStatus (or metrics.<name>)
+        # builds only those parts of the response
+        sections = projection.from_request(request.args)
 
-        grouped_activities = {
-            deliverable: [
-                {
-                    "name": activity.get("name", "Unnamed Activity"),
-                    "owner": activity.get("owner", "Unassigned"),
-                    "endDate": activity.get("endDate", "N/A"),
-                    "status": activity.get("status", "Unknown"),
-                    "remarks": activity.get("remarks", "No Remarks"),
-                }
-                for activity in activities
-            ]
-            for deliverable, activities in bid_data.get("activities", {}).items()
-        }
-
-        metrics = {
-            "totalActivities": total_activities,
-            "completedActivities": completed_activities,
-            "completionByTrack": completion_by_track,
-            "completionByPerson": completion_by_person_data,
-        }
-
-        return jsonify({
-            "success": True,
-            "metrics": metrics,
-            "groupedActivities": grouped_activities,
-            "activitiesByStatus": activities_by_status_chart,
-        }), 200
+        # Concurrent requests for the same bid revision and sections share one computation
+        stat = os.stat(file_path)
+        revision = (file_path, stat.st_mtime_ns, stat.st_size, projection.cache_key(sections))
+        response = dashboard_flight.do(revision, lambda: build_dashboard(file_path, sections))
+        return jsonify(response), 200
 
     except Exception as e:
         print(f"[ERROR] {str(e)}")
@@ -523,16 +865,17 @@ def update_activity_route(bid_id, deliverable):
         if not os.path.exists(file_path):
             return jsonify({"success": False, "message": "Bid data not found."}), 404
 
-        with open(file_path, 'r') as file:
-            bid_data = json.load(file)
+        bid_data = load_bid(file_path)
 
         activities = bid_data.get("activities", {}).get(deliverable, [])
         for activity in activities:
             if activity.get("name") == updated_activity.get("name"):
                 activity.update(updated_activity)
 
-        with open(file_path, 'w') as file:
-            json.dump(bid_data, file, indent=4)
+        # The bid and its tracker counters are committed together
+        tx = journal.Transaction()
+        tx.save(file_path, owners.encode_bid(bid_data))
+        tx.publish("bid", bid_id, "update")
 
         # Update Action Tracker metrics if exists
         # Note: Action tracker ID differs from bid_id. We must derive it.
@@ -545,8 +888,9 @@ def update_activity_route(bid_id, deliverable):
             at_base_id = get_action_tracker_base_id(clientName, opportunityName)
             action_tracker_file = get_latest_action_tracker_file(at_base_id)
             if action_tracker_file and os.path.exists(action_tracker_file):
-                with open(action_tracker_file, 'r') as at_file:
-                    action_tracker = json.load(at_file)
+                # Only the tracker header holds these counters
+                action_tracker_file = tracker_store.ensure_sharded(action_tracker_file)
+                action_tracker = tracker_store.load_header(action_tracker_file)
 
                 action_tracker['totalActions'] = sum(len(acts) for acts in bid_data.get("activities", {}).values())
                 action_tracker['openActions'] = sum(
@@ -558,23 +902,142 @@ def update_activity_route(bid_id, deliverable):
                     for acts in bid_data.get("activities", {}).values()
                 )
 
-                with open(action_tracker_file, 'w') as at_file:
-                    json.dump(action_tracker, at_file, indent=4)
+                # Write out any coalesced header update first so it cannot land after this one
+                tracker_store.flush(action_tracker_file)
+                tx.save(os.path.join(action_tracker_file, tracker_store.HEADER_FILE), action_tracker)
+                tx.publish("tracker", at_base_id, "update")
 
+        tx.commit()
         return jsonify({"success": True, "message": "Activity updated successfully."}), 200
 
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/api/analytics/query', methods=['GET'])
+def analytics_query_route():
+    try:
+        # e.g. ?groupBy=owner,week&kind=activity&from=2025-01-01&to=2025-03-31
+        group_by = [d.strip() for d in request.args.get('groupBy', 'owner').split(',') if d.strip()]
+        completed = request.args.get('completed')
+        filters = {
+            "kind": request.args.getlist('kind'),
+            "bid": request.args.getlist('bid'),
+            "deliverable": request.args.getlist('deliverable'),
+            "owner": request.args.getlist('owner'),
+            "status": request.args.getlist('status'),
+            "completed": None if completed is None else completed.lower() == 'true',
+            "from": request.args.get('from'),
+            "to": request.args.get('to'),
+        }
+        date_field = request.args.get('dateField', 'endDate')
+        rows = analytics.query(group_by, filters, date_field)
+        return jsonify({"success": True, "groupBy": group_by, "rows": rows}), 200
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error running analytics query: {str(e)}"}), 500
+
+@app.route('/api/capacity', methods=['GET'])
+def capacity_route():
+    try:
+        # Defaults to the next seven days
+        today = datetime.now().date()
+        window_from = request.args.get('from', today.isoformat())
+        window_to = request.args.get('to', (today + timedelta(days=6)).isoformat())
+        if not isValidDate(window_from) or not isValidDate(window_to):
+            return jsonify({"success": False, "message": "from and to must be dates in YYYY-MM-DD format."}), 400
+        if isAfterDate(window_from, window_to):
+            return jsonify({"success": False, "message": "from must not be after to."}), 400
+
+        people = request.args.getlist('owner')
+        include_completed = request.args.get('includeCompleted', 'false').lower() == 'true'
+        report = workload.capacity(parse_date(window_from)[0], parse_date(window_to)[0], people, include_completed)
+        return jsonify({"success": True, "from": window_from, "to": window_to, "people": report}), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error computing capacity: {str(e)}"}), 500
+
+@app.route('/api/alerts/upcoming', methods=['GET'])
+def upcoming_alerts_route():
+    try:
+        limit = request.args.get('limit', '50')
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({"success": False, "message": "limit must be a positive integer."}), 400
+        # Deadlines are listed even where the scheduler isn't running (e.g. flask
+        # run without the reloader); schedulerRunning says whether this process sends them
+        alerts = deadline_alerts.upcoming(int(limit))
+        return jsonify({"success": True, "alerts": alerts, "schedulerRunning": deadline_alerts.running()}), 200
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error listing alerts: {str(e)}"}), 500
+
+@app.route('/search', methods=['GET'])
+def search_route():
+    try:
+        # e.g. ?q=rate card disc&archived=false&kind=action
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"success": False, "message": "Query parameter q is required."}), 400
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        include_archived = request.args.get('archived', 'true').lower() == 'true'
+        results = search_index.search(query, limit, include_archived, request.args.getlist('kind'))
+        return jsonify({"success": True, "query": query, "results": results}), 200
+    except ValueError:
+        return jsonify({"success": False, "message": "limit must be an integer."}), 400
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error searching: {str(e)}"}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_route():
+    try:
+        # e.g. ?format=xlsx&bid=Acme_Cloud&kind=action&status=Pending&columns=bid,name,owner,endDate
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'xlsx'):
+            return jsonify({"success": False, "message": "format must be csv or xlsx."}), 400
+        columns = [c.strip() for c in request.args.get('columns', ','.join(exporter.COLUMNS)).split(',') if c.strip()]
+        unknown = [c for c in columns if c not in exporter.COLUMNS]
+        if unknown or not columns:
+            return jsonify({"success": False, "message": f"Unknown columns: {', '.join(unknown)}. "
+                                                        f"Available: {', '.join(exporter.COLUMNS)}"}), 400
+        filters = {name: request.args.getlist(name) for name in ('bid', 'kind', 'deliverable', 'owner', 'status')}
+        include_archived = request.args.get('archived', 'false').lower() == 'true'
+
+        # Rows are produced and encoded while the response is sent, never held in full
+        roots = {"bids": BIDS_DIR, "trackers": ACTION_TRACKERS_DIR, "archive": ARCHIVE_DIR}
+        rows = exporter.iter_rows(roots, filters, include_archived)
+        if export_format == 'csv':
+            body, mimetype = exporter.csv_chunks(rows, columns), 'text/csv'
+        else:
+            body = exporter.xlsx_chunks(rows, columns)
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        filename = f"export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        return Response(body, mimetype=mimetype,
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error exporting: {str(e)}"}), 500
+
+@app.route('/changes', methods=['GET'])
+def changes_route():
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(max(int(request.args.get('limit', 500)), 1), 5000)
+        return jsonify({"success": True, **change_log.read(since, limit)}), 200
+    except ValueError:
+        return jsonify({"success": False, "message": "since and limit must be integers."}), 400
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error reading changes: {str(e)}"}), 500
+
 @app.route('/')
 def home_route():
     return jsonify({"message": "Backend is running successfully!"}), 200
 
 # Action Tracker endpoints
-@app.route('/api/action-trackers/<bid_id>', methods=['OPTIONS', 'GET'])
+@app.route('/api/action-trackers/<bid_id>', methods=['GET'])
 def get_action_tracker_route(bid_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         # Convert bid_id to action tracker base id by removing version and adding Action Tracker
         parts = bid_id.split('_')
@@ -588,18 +1051,16 @@ def get_action_tracker_route(bid_id):
         if not at_file:
             return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID.", "data": None}), 404
 
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
+        fields = projection.from_request(request.args)
+        action_tracker_data = tracker_store.load_tracker(at_file, fields=fields)
 
         return jsonify({"success": True, "data": action_tracker_data}), 200
     except Exception as e:
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error fetching Action Tracker data: {str(e)}"}), 500
 
-@app.route('/api/action-trackers', methods=['OPTIONS', 'POST'])
+@app.route('/api/action-trackers', methods=['POST'])
 def create_action_tracker_route():
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         data = request.json
         bid_id = data.get('bidId')
@@ -611,8 +1072,7 @@ def create_action_tracker_route():
         if not os.path.exists(bid_file_path):
             return jsonify({"success": False, "message": "Bid not found."}), 404
 
-        with open(bid_file_path, 'r') as bid_file:
-            bid_data = json.load(bid_file)
+        bid_data = load_json(bid_file_path)
 
         # Build action tracker base id
         parts = bid_id.split('_')
@@ -623,8 +1083,7 @@ def create_action_tracker_route():
         at_base_id = get_action_tracker_base_id(clientName, opportunityName)
 
         new_file_path = create_new_action_tracker_version(at_base_id, bid_data.get("deliverables", []))
-        with open(new_file_path, 'r') as nf:
-            action_tracker_data = json.load(nf)
+        action_tracker_data = tracker_store.load_tracker(new_file_path)
 
         return jsonify({"success": True, "message": "Action Tracker created successfully.", "data": action_tracker_data}), 201
 
@@ -632,10 +1091,8 @@ def create_action_tracker_route():
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error creating Action Tracker: {str(e)}"}), 500
 
-@app.route('/api/action-trackers/<bid_id>', methods=['OPTIONS', 'PUT'])
+@app.route('/api/action-trackers/<bid_id>', methods=['PUT'])
 def update_action_tracker_route(bid_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         parts = bid_id.split('_')
         if len(parts) < 3:
@@ -649,13 +1106,15 @@ def update_action_tracker_route(bid_id):
             return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID."}), 404
 
         updates = request.json
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
+        action_tracker_data = tracker_store.load_tracker(at_file)
 
         action_tracker_data.update(updates)
 
-        with open(at_file, 'w') as at_f:
-            json.dump(action_tracker_data, at_f, indent=4)
+        at_file = tracker_store.ensure_sharded(at_file)
+        tx = journal.Transaction()
+        tracker_store.write_tracker(at_file, action_tracker_data, tx)
+        tx.publish("tracker", at_base_id, "update")
+        tracker_store.commit(tx)
 
         return jsonify({"success": True, "message": "Action Tracker updated successfully.", "data": action_tracker_data}), 200
 
@@ -663,10 +1122,8 @@ def update_action_tracker_route(bid_id):
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error updating Action Tracker: {str(e)}"}), 500
 
-@app.route('/api/action-trackers/<bid_id>/actions', methods=['OPTIONS', 'POST'])
+@app.route('/api/action-trackers/<bid_id>/actions', methods=['POST'])
 def add_action_route(bid_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         action = request.json
         deliverable = action.get('deliverable')
@@ -688,25 +1145,23 @@ def add_action_route(bid_id):
         if not at_file:
             return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID."}), 404
 
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
+        at_file = tracker_store.ensure_sharded(at_file)
+        header = tracker_store.load_header(at_file)
 
-        if deliverable not in action_tracker_data.get("deliverables", []):
+        if deliverable not in header.get("deliverables", []):
             return jsonify({"success": False, "message": "Invalid Deliverable."}), 400
 
-        if deliverable not in action_tracker_data["actionsByDeliverable"]:
-            action_tracker_data["actionsByDeliverable"][deliverable] = []
+        actions = tracker_store.load_actions(at_file, header, deliverable)
 
         # Generate a new actionId by finding max existing one
         max_id = 0
-        for acts in action_tracker_data["actionsByDeliverable"].values():
-            for a in acts:
-                try:
-                    aid = int(a["actionId"])
-                    if aid > max_id:
-                        max_id = aid
-                except:
-                    pass
+        for existing_id in header["actionIndex"]:
+            try:
+                aid = int(existing_id)
+                if aid > max_id:
+                    max_id = aid
+            except:
+                pass
         new_id = max_id + 1
 
         new_action = {
@@ -719,46 +1174,174 @@ def add_action_route(bid_id):
             "remarks": action.get("remarks", ""),
         }
 
-        action_tracker_data["actionsByDeliverable"][deliverable].append(new_action)
-
-        # Recalculate total, open, closed actions
-        total = 0
-        closed = 0
-        open_count = 0
-        owners_set = set()
-        for dacts in action_tracker_data["actionsByDeliverable"].values():
-            for a in dacts:
-                total += 1
-                owners_set.add(a["owner"])
-                if a["status"].lower() == "completed":
-                    closed += 1
-                else:
-                    open_count += 1
-
-        action_tracker_data["totalActions"] = total
-        action_tracker_data["openActions"] = open_count
-        action_tracker_data["closedActions"] = closed
-        action_tracker_data["owners"] = list(owners_set)
-
-        action_tracker_data["actionHistory"][str(new_id)] = [{
+        actions.append(new_action)
+
+        history = tracker_store.load_history(at_file)
+        history[str(new_id)] = [{
             "date": action.get("createdDate", ""),
             "changedBy": action.get("changedBy", "system"),
             "change": "Action Created"
         }]
 
-        with open(at_file, 'w') as at_f:
-            json.dump(action_tracker_data, at_f, indent=4)
+        # The shard, the history and the header commit as one transaction
+        tx = journal.Transaction()
+        # Recalculate total, open, closed actions from the per-deliverable summaries
+        with span("aggregate"):
+            tracker_store.save_actions(at_file, header, deliverable, actions, tx)
+        tracker_store.save_history(at_file, history, tx)
+        tracker_store.save_header(at_file, header, tx)
+        tx.publish("tracker", at_base_id, "update")
+        tracker_store.commit(tx)
 
         return jsonify({"success": True, "message": "Action added successfully.", "data": new_action}), 201
     except Exception as e:
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error adding action: {str(e)}"}), 500
 
+@app.route('/api/action-trackers/<bid_id>/actions/import', methods=['POST'])
+def import_actions_route(bid_id):
+    try:
+        # CSV (header row) or JSONL body, or a multipart "file" upload, with columns
+        # deliverable, owner, name, endDate, status, remarks. ?dryRun=true only validates.
+        parts = bid_id.split('_')
+        if len(parts) < 3:
+            return jsonify({"success": False, "message": "Invalid bid ID format for Action Tracker."}), 400
+        clientName = parts[0]
+        opportunityName = "_".join(parts[1:-1])
+        at_base_id = get_action_tracker_base_id(clientName, opportunityName)
+
+        at_file = get_latest_action_tracker_file(at_base_id)
+        if not at_file:
+            return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID."}), 404
+
+        at_file = tracker_store.ensure_sharded(at_file)
+        header = tracker_store.load_header(at_file)
+        deliverables = header.get("deliverables", [])
+        bid_file_path = get_bid_file_path(bid_id)
+        team = [m.get("name") for m in load_bid(bid_file_path).get("team", [])] if os.path.exists(bid_file_path) else []
+        dry_run = request.args.get('dryRun', 'false').lower() == 'true'
+
+        stream, fmt = importer.request_source(request)
+        valid = {}
+        errors = []
+        rows = rejected = 0
+        for number, record, parse_error in importer.iter_records(stream, fmt):
+            rows += 1
+            if parse_error:
+                action, row_errors = None, [parse_error]
+            else:
+                action, row_errors = importer.validate_action(record, deliverables, team)
+            if row_errors:
+                rejected += 1
+                if len(errors) < importer.IMPORT_MAX_ERRORS:
+                    errors.append({"row": number, "errors": row_errors})
+                continue
+            valid.setdefault(action["deliverable"], []).append((action, record))
+
+        accepted = sum(len(v) for v in valid.values())
+        if accepted and not dry_run:
+            max_id = 0
+            for existing_id in header["actionIndex"]:
+                try:
+                    max_id = max(max_id, int(existing_id))
+                except (TypeError, ValueError):
+                    pass
+
+            # Every touched shard, the history and the header commit as one transaction
+            history = tracker_store.load_history(at_file)
+            tx = journal.Transaction()
+            with span("aggregate"):
+                for deliverable, new_actions in valid.items():
+                    actions = tracker_store.load_actions(at_file, header, deliverable)
+                    for action, record in new_actions:
+                        max_id += 1
+                        actions.append({"actionId": str(max_id), **action})
+                        history[str(max_id)] = [{
+                            "date": record.get("createdDate", ""),
+                            "changedBy": record.get("changedBy", "import"),
+                            "change": "Action Created"
+                        }]
+                    tracker_store.save_actions(at_file, header, deliverable, actions, tx)
+            tracker_store.save_history(at_file, history, tx)
+            tracker_store.save_header(at_file, header, tx)
+            tx.publish("tracker", at_base_id, "update")
+            tracker_store.commit(tx)
+
+        return jsonify({
+            "success": True,
+            "dryRun": dry_run,
+            "rows": rows,
+            "imported": 0 if dry_run else accepted,
+            "valid": accepted,
+            "rejected": rejected,
+            "errors": errors,
+        }), 200
+    except importer.ImportTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error importing actions: {str(e)}"}), 500
+
+@app.route('/api/bids/<bid_id>/activities/import', methods=['POST'])
+def import_activities_route(bid_id):
+    try:
+        # Same upload formats as the action import, with columns
+        # deliverable, name, owner, status, startDate, endDate, remarks
+        file_path = get_bid_file_path(bid_id)
+        if not os.path.exists(file_path):
+            return jsonify({"success": False, "message": "Bid data not found."}), 404
+
+        bid_data = load_bid(file_path)
+        deliverables = bid_data.get("deliverables", [])
+        team = [m.get("name") for m in bid_data.get("team", [])]
+        activities = bid_data.setdefault("activities", {})
+        names = {d: {a.get("name") for a in acts} for d, acts in activities.items()}
+        dry_run = request.args.get('dryRun', 'false').lower() == 'true'
+
+        stream, fmt = importer.request_source(request)
+        errors = []
+        rows = rejected = accepted = 0
+        for number, record, parse_error in importer.iter_records(stream, fmt):
+            rows += 1
+            if parse_error:
+                row_errors = [parse_error]
+            else:
+                deliverable, activity, row_errors = importer.validate_activity(record, deliverables, team)
+                # Activities are addressed by name within a deliverable
+                if not row_errors and activity["name"] in names.setdefault(deliverable, set()):
+                    row_errors = [f"activity '{activity['name']}' already exists under '{deliverable}'"]
+            if row_errors:
+                rejected += 1
+                if len(errors) < importer.IMPORT_MAX_ERRORS:
+                    errors.append({"row": number, "errors": row_errors})
+                continue
+            names[deliverable].add(activity["name"])
+            activities.setdefault(deliverable, []).append(activity)
+            accepted += 1
+
+        if accepted and not dry_run:
+            with journal.transaction() as tx:
+                tx.save(file_path, owners.encode_bid(bid_data))
+                tx.publish("bid", bid_id, "update")
+
+        return jsonify({
+            "success": True,
+            "dryRun": dry_run,
+            "rows": rows,
+            "imported": 0 if dry_run else accepted,
+            "valid": accepted,
+            "rejected": rejected,
+            "errors": errors,
+        }), 200
+    except importer.ImportTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+    except Exception as e:
+        print(f"[ERROR] {str(e)}")
+        return jsonify({"success": False, "message": f"Error importing activities: {str(e)}"}), 500
+
 # Ensure update_existing_action, delete actions also re-calculate metrics in a similar manner
-@app.route('/api/action-trackers/<bid_id>/actions/<action_id>', methods=['OPTIONS', 'DELETE'])
+@app.route('/api/action-trackers/<bid_id>/actions/<action_id>', methods=['DELETE'])
 def delete_action_route(bid_id, action_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         parts = bid_id.split('_')
         if len(parts) < 3:
@@ -771,60 +1354,36 @@ def delete_action_route(bid_id, action_id):
         if not at_file:
             return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID."}), 404
 
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
-
-        action_found = False
-        removed_action = None
-        for deliverable, actions in action_tracker_data.get("actionsByDeliverable", {}).items():
-            for action in actions:
-                if action.get("actionId") == action_id:
-                    removed_action = action
-                    actions.remove(action)
-                    action_found = True
-                    if not actions:
-                        del action_tracker_data["actionsByDeliverable"][deliverable]
-                    break
-            if action_found:
-                break
-
-        if not action_found:
+        at_file = tracker_store.ensure_sharded(at_file)
+        header = tracker_store.load_header(at_file)
+
+        deliverable = header["actionIndex"].get(action_id)
+        if deliverable is None:
             return jsonify({"success": False, "message": "Action ID not found."}), 404
 
+        actions = [a for a in tracker_store.load_actions(at_file, header, deliverable) if a.get("actionId") != action_id]
+
+        tx = journal.Transaction()
         # Recalculate metrics
-        total = 0
-        closed = 0
-        open_count = 0
-        owners_set = set()
-        for dacts in action_tracker_data["actionsByDeliverable"].values():
-            for a in dacts:
-                total += 1
-                owners_set.add(a["owner"])
-                if a["status"].lower() == "completed":
-                    closed += 1
-                else:
-                    open_count += 1
-
-        action_tracker_data["totalActions"] = total
-        action_tracker_data["openActions"] = open_count
-        action_tracker_data["closedActions"] = closed
-        action_tracker_data["owners"] = list(owners_set)
-
-        if action_id in action_tracker_data.get("actionHistory", {}):
-            del action_tracker_data["actionHistory"][action_id]
-
-        with open(at_file, 'w') as at_f:
-            json.dump(action_tracker_data, at_f, indent=4)
+        with span("aggregate"):
+            tracker_store.save_actions(at_file, header, deliverable, actions, tx)
+
+        history = tracker_store.load_history(at_file)
+        if action_id in history:
+            del history[action_id]
+            tracker_store.save_history(at_file, history, tx)
+
+        tracker_store.save_header(at_file, header, tx)
+        tx.publish("tracker", at_base_id, "update")
+        tracker_store.commit(tx)
 
         return jsonify({"success": True, "message": "Action deleted successfully."}), 200
     except Exception as e:
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": f"Error deleting action: {str(e)}"}), 500
 
-@app.route('/api/action-trackers/<bid_id>/actions/<action_id>', methods=['OPTIONS', 'PUT'])
+@app.route('/api/action-trackers/<bid_id>/actions/<action_id>', methods=['PUT'])
 def update_action_endpoint(bid_id, action_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         updated_data = request.json
 
@@ -840,36 +1399,24 @@ def update_action_endpoint(bid_id, action_id):
         if not at_file:
             return jsonify({"success": False, "message": "Action Tracker not found for this Bid ID."}), 404
 
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
+        at_file = tracker_store.ensure_sharded(at_file)
+        header = tracker_store.load_header(at_file)
 
         # We must find the action's old location (old deliverable)
-        old_deliverable = None
-        old_action = None
-        for d, actions in action_tracker_data.get("actionsByDeliverable", {}).items():
-            for a in actions:
-                if a.get("actionId") == action_id:
-                    old_deliverable = d
-                    old_action = a.copy()  # keep old state for comparison
-                    break
-            if old_deliverable is not None:
-                break
-
+        old_deliverable = header["actionIndex"].get(action_id)
         if not old_deliverable:
             return jsonify({"success": False, "message": "Action not found."}), 404
 
+        old_actions = tracker_store.load_actions(at_file, header, old_deliverable)
+        old_action = next((a.copy() for a in old_actions if a.get("actionId") == action_id), None)
+        if old_action is None:
+            return jsonify({"success": False, "message": "Action not found."}), 404
+
         # If deliverable changed, we must move the action
         new_deliverable = updated_data.get("deliverable", old_action.get("deliverable", old_deliverable))
 
         # Remove from old deliverable
-        # Find the action in old_deliverable and remove it
-        for idx, act in enumerate(action_tracker_data["actionsByDeliverable"][old_deliverable]):
-            if act["actionId"] == action_id:
-                action_tracker_data["actionsByDeliverable"][old_deliverable].pop(idx)
-                break
-        # If new deliverable doesn't exist in dictionary, create it
-        if new_deliverable not in action_tracker_data["actionsByDeliverable"]:
-            action_tracker_data["actionsByDeliverable"][new_deliverable] = []
+        old_actions = [a for a in old_actions if a.get("actionId") != action_id]
 
         # Prepare updated action
         updated_action = old_action.copy()
@@ -877,29 +1424,22 @@ def update_action_endpoint(bid_id, action_id):
             if key not in ["changedFields", "changedDate", "changedBy"]:
                 updated_action[key] = val
 
-        # Add the action to the new deliverable
-        action_tracker_data["actionsByDeliverable"][new_deliverable].append(updated_action)
-
-        # Recalculate metrics
-        total = 0
-        closed = 0
-        owners_set = set()
-        for acts in action_tracker_data["actionsByDeliverable"].values():
-            for a in acts:
-                total += 1
-                owners_set.add(a.get("owner", "Unassigned"))
-                if a.get("status", "").lower() == "completed":
-                    closed += 1
-        open_count = total - closed
-        action_tracker_data["totalActions"] = total
-        action_tracker_data["openActions"] = open_count
-        action_tracker_data["closedActions"] = closed
-        action_tracker_data["owners"] = list(owners_set)
+        # Add the action to the new deliverable, then recalculate metrics. The
+        # touched shards, the history and the header commit as one transaction.
+        tx = journal.Transaction()
+        with span("aggregate"):
+            if new_deliverable == old_deliverable:
+                tracker_store.save_actions(at_file, header, old_deliverable, old_actions + [updated_action], tx)
+            else:
+                new_actions = tracker_store.load_actions(at_file, header, new_deliverable)
+                tracker_store.save_actions(at_file, header, old_deliverable, old_actions, tx)
+                tracker_store.save_actions(at_file, header, new_deliverable, new_actions + [updated_action], tx)
 
         # Record history
         # If action_id not in actionHistory, create empty list
-        if action_id not in action_tracker_data["actionHistory"]:
-            action_tracker_data["actionHistory"][action_id] = []
+        history = tracker_store.load_history(at_file)
+        if action_id not in history:
+            history[action_id] = []
 
         # Get IST timestamp if not provided
         ist = pytz.timezone('Asia/Kolkata')
@@ -910,16 +1450,18 @@ def update_action_endpoint(bid_id, action_id):
         # changedFields is passed from frontend, store them as is
         changedFields = updated_data.get("changedFields", [])
 
-        action_tracker_data["actionHistory"][action_id].append({
+        history[action_id].append({
             "date": changedDate,
             "changedBy": updated_data.get("changedBy", "user"),
             "changedFields": changedFields,
             "change": "Action Updated"
         })
 
-        # Write back to file
-        with open(at_file, 'w') as at_f:
-            json.dump(action_tracker_data, at_f, indent=4)
+        # Write back the touched shards
+        tracker_store.save_history(at_file, history, tx)
+        tracker_store.save_header(at_file, header, tx)
+        tx.publish("tracker", at_base_id, "update")
+        tracker_store.commit(tx)
 
         return jsonify({"success": True, "message": "Action updated successfully."}), 200
 
@@ -927,10 +1469,8 @@ def update_action_endpoint(bid_id, action_id):
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
     
-@app.route('/api/action-trackers/<bid_id>/actions/<action_id>/history', methods=['OPTIONS', 'GET'])
+@app.route('/api/action-trackers/<bid_id>/actions/<action_id>/history', methods=['GET'])
 def get_action_history_route(bid_id, action_id):
-    if request.method == 'OPTIONS':
-        return jsonify({}), 200
     try:
         parts = bid_id.split('_')
         if len(parts) < 3:
@@ -943,21 +1483,14 @@ def get_action_history_route(bid_id, action_id):
         if not at_file:
             return jsonify({"success": False, "message": "Action Tracker not found."}), 404
 
-        with open(at_file, 'r') as at_f:
-            action_tracker_data = json.load(at_f)
-
-        history = action_tracker_data.get("actionHistory", {}).get(action_id, [])
+        history = tracker_store.load_history(at_file).get(action_id, [])
         return jsonify({"success": True, "history": history}), 200
     except Exception as e:
         print(f"[ERROR] {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
-@app.route('/finalize_bid', methods=['OPTIONS', 'POST'])
+@app.route('/finalize_bid', methods=['POST'])
 def finalize_bid_route():
-    if request.method == 'OPTIONS':
-        # CORS preflight request, handled by flask_cors
-        return jsonify({}), 200
-
     try:
         data = request.json
 
@@ -1020,18 +1553,17 @@ def chatbot_route():
                 current_bid_path = get_bid_file_path("current_bid")
                 if not os.path.exists(current_bid_path):
                     return jsonify({"response": "No current bid data found to summarize."})
-                with open(current_bid_path, "r") as file:
-                    cbid_data = json.load(file)
-                    summary = {
-                        "Client Name": cbid_data.get("clientName", "N/A"),
-                        "Opportunity Name": cbid_data.get("opportunityName", "N/A"),
-                        "RFP Dates": cbid_data.get("timeline", {}),
-                        "Deliverables": cbid_data.get("deliverables", []),
-                    }
-                    return jsonify({
-                        "response": f"Summary:\nClient: {summary['Client Name']}\nOpportunity: {summary['Opportunity Name']}\n"
-                                    f"RFP Timeline: {summary['RFP Dates']}\nDeliverables: {', '.join(summary['Deliverables'])}"
-                    })
+                cbid_data = load_json(current_bid_path)
+                summary = {
+                    "Client Name": cbid_data.get("clientName", "N/A"),
+                    "Opportunity Name": cbid_data.get("opportunityName", "N/A"),
+                    "RFP Dates": cbid_data.get("timeline", {}),
+                    "Deliverables": cbid_data.get("deliverables", []),
+                }
+                return jsonify({
+                    "response": f"Summary:\nClient: {summary['Client Name']}\nOpportunity: {summary['Opportunity Name']}\n"
+                                f"RFP Timeline: {summary['RFP Dates']}\nDeliverables: {', '.join(summary['Deliverables'])}"
+                })
             elif "help" in lowerInput:
                 return jsonify({"response": "I can assist with creating bids, summarizing existing bids, and managing deliverables. Ask me a question!"})
             else:
@@ -1073,7 +1605,7 @@ def chatbot_route():
                 session_data["context"] = "deliverables"
                 return jsonify({
                     "response": f"Here are some default deliverables, or type your own (comma-separated).",
-                    "suggestions": DEFAULT_DELIVERABLES
+                    "suggestions": suggestDeliverables()
                 })
             else:
                 return jsonify({"response": "Invalid Proposal Submission Date. Ensure it is after the RFP Issue Date."})
@@ -1267,5 +1799,16 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Internal Server Error', 'message': 'An unexpected error occurred.'}), 500
 
+# Background jobs (suggestion mining, the alert scheduler) start once a process
+# is about to serve requests, from gunicorn's post_worker_init hook or the dev
+# server below, not on import, so scripts can import the app without them
+def start_background_jobs():
+    activity_suggestions.start()
+    if os.getenv("ALERTS_ENABLED", "true").lower() == "true":
+        deadline_alerts.start()
+
 if __name__ == '__main__':
+    # The reloader re-runs this file in a child process, which is the one serving
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_jobs()
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -1,25 +1,74 @@
 import os
-import json
+import hashlib
+import threading
 from datetime import datetime
 import uuid
 from utils.logo_fetcher import fetch_logo
+from utils.executor import submit
+from utils.storage import load_json, save_json
+from utils import journal
+from utils import invalidation
 
 # Define the base directory for storing bid data
 DATA_DIR = os.path.join(os.path.dirname(__file__), '../data')
 
+# Each bid is a directory holding metadata.json and one activity shard per
+# deliverable under activities/, so a deliverable's activities are read and
+# written without touching the others:
+#   <bid>/metadata.json
+#   <bid>/activities/deliverable-<hash>.json   {"deliverable": ..., "activities": [...]}
+ACTIVITIES_DIR = 'activities'
+
+# Metadata of every bid, by bid name: (revision, metadata.json mtime, metadata).
+# An entry is current while its metadata.json revision in the invalidation
+# table is unchanged (no stat needed); it is re-read only when the file changed.
+_catalog = {}
+_catalog_lock = threading.Lock()
+
 # Utility: Ensure the data directory exists
 def ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
-# Utility: Save JSON to file
-def save_json(file_path, data):
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
-
-# Utility: Read JSON from file
-def load_json(file_path):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+# Utility: Directory of a bid, or None for names that would leave DATA_DIR
+def bid_path(bid_name):
+    if not bid_name or bid_name.startswith('.') or os.sep in bid_name:
+        return None
+    return os.path.join(DATA_DIR, bid_name)
+
+# Utility: Activity shard of one deliverable
+def activity_shard_path(bid_name, deliverable_name):
+    digest = hashlib.sha1(deliverable_name.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DATA_DIR, bid_name, ACTIVITIES_DIR, f"deliverable-{digest}.json")
+
+# Utility: (mtime, metadata) of a bid through the catalog, or None if there is no such bid
+def catalog_entry(bid_name):
+    path = bid_path(bid_name)
+    if path is None:
+        return None
+    metadata_path = os.path.join(path, 'metadata.json')
+    revision = invalidation.path_revision(metadata_path)
+    with _catalog_lock:
+        cached = _catalog.get(bid_name)
+    if cached is not None and revision is not None and cached[0] == revision:
+        return cached[1:]
+    try:
+        mtime = os.stat(metadata_path).st_mtime_ns
+    except FileNotFoundError:
+        with _catalog_lock:
+            _catalog.pop(bid_name, None)
+        return None
+    if cached is not None and cached[1] == mtime:
+        entry = (revision, mtime, cached[2])
+    else:
+        entry = (revision, mtime, load_json(metadata_path))
+    with _catalog_lock:
+        _catalog[bid_name] = entry
+    return entry[1:]
+
+# Utility: Metadata of a bid, or None if there is no such bid
+def load_metadata(bid_name):
+    entry = catalog_entry(bid_name)
+    return entry[1] if entry is not None else None
 
 # Create a new bid
 def create_bid(data):
@@ -48,11 +97,14 @@ def create_bid(data):
             'deliverables': deliverables,
         }
         save_json(os.path.join(bid_path, 'metadata.json'), metadata)
+        os.makedirs(os.path.join(bid_path, ACTIVITIES_DIR), exist_ok=True)
+        journal.publish("blueprint", bid_name, "create")
 
-        # Attempt to fetch and save the client logo
+        # Fetch the client logo in the background so the request does not wait on the network
         logo_path = os.path.join(bid_path, 'client_logo.png')
         try:
-            fetch_logo(client_name, logo_path)
+            if submit(fetch_logo, client_name, logo_path) is None:
+                print(f"Warning: Logo fetch queue is full, skipping logo for {client_name}")
         except Exception as e:
             # If logo fetching fails, log the error and continue
             print(f"Warning: Failed to fetch logo for {client_name}. Error: {str(e)}")
@@ -66,22 +118,28 @@ def list_bids():
     ensure_data_dir()
 
     try:
-        # Validate bids directories
+        # Only metadata that changed since the last listing is parsed again
         bids = []
+        names = set()
         for bid_dir in os.listdir(DATA_DIR):
-            bid_path = os.path.join(DATA_DIR, bid_dir)
-            metadata_path = os.path.join(bid_path, 'metadata.json')
-            if os.path.isdir(bid_path) and os.path.exists(metadata_path):
-                # Load metadata for each valid bid
-                try:
-                    metadata = load_json(metadata_path)
-                    bids.append({
-                        'bidName': bid_dir,
-                        'clientName': metadata.get('clientName', 'Unknown'),
-                        'lastModified': os.path.getmtime(metadata_path),
-                    })
-                except Exception as e:
-                    print(f"Warning: Skipping invalid bid directory {bid_dir}. Error: {str(e)}")
+            if bid_path(bid_dir) is None:
+                continue
+            names.add(bid_dir)
+            try:
+                entry = catalog_entry(bid_dir)
+                if entry is None:
+                    continue
+                mtime, metadata = entry
+                bids.append({
+                    'bidName': bid_dir,
+                    'clientName': metadata.get('clientName', 'Unknown'),
+                    'lastModified': mtime / 1e9,
+                })
+            except Exception as e:
+                print(f"Warning: Skipping invalid bid directory {bid_dir}. Error: {str(e)}")
+        with _catalog_lock:
+            for removed in set(_catalog) - names:
+                del _catalog[removed]
         return {'success': True, 'bids': bids}
     except Exception as e:
         return {'success': False, 'message': f"Error listing bids: {str(e)}", 'status': 500}
@@ -89,25 +147,44 @@ def list_bids():
 # Retrieve metadata for a specific bid
 def get_bid(bid_name):
     ensure_data_dir()
-    bid_path = os.path.join(DATA_DIR, bid_name, 'metadata.json')
 
     try:
-        if os.path.exists(bid_path):
-            metadata = load_json(bid_path)
+        metadata = load_metadata(bid_name)
+        if metadata is not None:
             return {'success': True, 'metadata': metadata}
         return {'success': False, 'message': 'Bid not found', 'status': 404}
     except Exception as e:
         return {'success': False, 'message': f"Error retrieving bid: {str(e)}", 'status': 500}
     
-# Fetch activities for a deliverable
+# Fetch activities for a deliverable; reads only that deliverable's shard
 def get_activities(bid_name, deliverable_name):
-    # Fetch activities from database or mock data for now
-    return [
-        {"activityName": "Draft Proposal", "owner": "John Doe", "startDate": "2024-12-01", "endDate": "2024-12-02"},
-        {"activityName": "Review Draft", "owner": "Jane Doe", "startDate": "2024-12-03", "endDate": "2024-12-04"},
-    ]
+    ensure_data_dir()
 
-# Save activities for a deliverable
+    try:
+        if load_metadata(bid_name) is None:
+            return {'success': False, 'message': 'Bid not found', 'status': 404}
+        shard_path = activity_shard_path(bid_name, deliverable_name)
+        activities = load_json(shard_path)['activities'] if os.path.exists(shard_path) else []
+        return {'success': True, 'activities': activities}
+    except Exception as e:
+        return {'success': False, 'message': f"Error fetching activities: {str(e)}", 'status': 500}
+
+# Save activities for a deliverable, replacing only that deliverable's shard
 def save_activities(bid_name, deliverable_name, activities):
-    # Save the activities to database or mock saving logic for now
-    print(f"Saving activities for {deliverable_name} in bid {bid_name}: {activities}")
\ No newline at end of file
+    ensure_data_dir()
+
+    if isinstance(activities, dict):
+        activities = activities.get('activities')
+    if not isinstance(activities, list) or not all(isinstance(a, dict) for a in activities):
+        return {'success': False, 'message': 'Activities must be a list of objects', 'status': 400}
+
+    try:
+        if load_metadata(bid_name) is None:
+            return {'success': False, 'message': 'Bid not found', 'status': 404}
+        shard_path = activity_shard_path(bid_name, deliverable_name)
+        os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+        save_json(shard_path, {'deliverable': deliverable_name, 'activities': activities})
+        journal.publish("blueprint", bid_name, "update")
+        return {'success': True, 'message': 'Activities updated successfully'}
+    except Exception as e:
+        return {'success': False, 'message': f"Error saving activities: {str(e)}", 'status': 500}
@@ -0,0 +1,45 @@
+import os
+
+# Serving mode, picked up automatically by `gunicorn app:app` (see Procfile).
+#   sync  - one request at a time per worker (gunicorn default)
+#   async - threaded workers: a worker keeps serving other requests while one
+#           waits on disk or network I/O, so concurrency grows without adding
+#           worker processes (and their memory)
+# Worker count follows gunicorn's own WEB_CONCURRENCY handling in both modes.
+SERVER_MODE = os.getenv("SERVER_MODE", "sync")
+
+if SERVER_MODE == "async":
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "32"))
+else:
+    worker_class = "sync"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+# Coalescing tracker writes (TRACKER_COALESCE_WINDOW > 0) stages them in the
+# worker's memory, so it is a single-worker mode: one worker serves every
+# request (use SERVER_MODE=async for concurrency within it)
+if float(os.getenv("TRACKER_COALESCE_WINDOW", "0")) > 0:
+    workers = 1
+
+
+# Staged tracker writes are per process, so with several workers (forced with
+# -w on the command line) they would overwrite each other's updates; commit
+# every transaction directly instead
+def post_fork(server, worker):
+    from utils.write_coalescer import tracker_writes
+    if server.cfg.workers > 1 and tracker_writes.window > 0:
+        print(f"[COALESCER] Ignoring TRACKER_COALESCE_WINDOW={tracker_writes.window} with {server.cfg.workers} workers")
+        tracker_writes.window = 0
+
+
+# Start suggestion mining and the alert scheduler once the worker has loaded the app
+def post_worker_init(worker):
+    from app import start_background_jobs
+    start_background_jobs()
+
+
+# Write out coalesced tracker updates before a worker exits
+def worker_exit(server, worker):
+    from utils.write_coalescer import tracker_writes
+    tracker_writes.flush()
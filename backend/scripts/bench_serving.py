@@ -0,0 +1,175 @@
+# Compare the sync and async (threaded) gunicorn serving modes at equal memory.
+#
+#   cd backend && python scripts/bench_serving.py --workers 2 --clients 32 --slow-clients 8
+#
+# Both modes run with the same number of worker processes against a seeded
+# temporary bids store. Fast clients read /list-files and /api/dashboard while
+# "slow" clients trickle request bodies to /save-bid-data, the way clients on
+# poor connections do. Sync workers are held by each slow upload; threaded
+# workers keep serving reads. Reports throughput, latency and total RSS.
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_store(root, bids):
+    bids_dir = os.path.join(root, "bids")
+    os.makedirs(os.path.join(bids_dir, "action_trackers"), exist_ok=True)
+    for i in range(bids):
+        activities = {
+            f"Deliverable {d}": [
+                {"name": f"Task {t}", "owner": f"Owner {t % 7}", "status": "Completed" if t % 3 == 0 else "Pending",
+                 "startDate": "2025-01-01", "endDate": "2025-02-01", "remarks": ""}
+                for t in range(10)
+            ]
+            for d in range(5)
+        }
+        bid = {"bidId": f"Client{i}_Opp_version1", "clientName": f"Client{i}", "opportunityName": "Opp",
+               "deliverables": list(activities), "activities": activities, "team": []}
+        with open(os.path.join(bids_dir, f"Client{i}_Opp_version1.json"), "w") as f:
+            json.dump(bid, f)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def process_tree_rss_kb(pid):
+    # Sum VmRSS of the gunicorn master and its workers (Linux only)
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def slow_upload(port, stop, trickle_seconds):
+    body = json.dumps({"bidId": "current_bid", "clientName": "Slow", "opportunityName": "Upload"}).encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+                s.sendall(b"POST /save-bid-data HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                          b"Connection: close\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n")
+                step = trickle_seconds / len(body)
+                for i in range(len(body)):
+                    s.sendall(body[i:i + 1])
+                    time.sleep(step)
+                s.recv(4096)
+        except OSError:
+            time.sleep(0.05)
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    try:
+        urllib.request.urlopen(url, timeout=30).read()
+        ok = True
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_mode(mode, args):
+    root = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    seed_store(root, args.bids)
+    port = free_port()
+    env = dict(os.environ, SERVER_MODE=mode, WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"),
+         "--chdir", root, "--pythonpath", BACKEND_DIR, "-b", f"127.0.0.1:{port}", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        stop = threading.Event()
+        slow_threads = [threading.Thread(target=slow_upload, args=(port, stop, args.trickle), daemon=True)
+                        for _ in range(args.slow_clients)]
+        for t in slow_threads:
+            t.start()
+        time.sleep(args.trickle / 2)
+
+        urls = [f"http://127.0.0.1:{port}/list-files",
+                f"http://127.0.0.1:{port}/api/dashboard?bidId=Client0_Opp_version1"]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(timed_get, (urls[i % 2] for i in range(args.requests))))
+        elapsed = time.perf_counter() - started
+        rss_mb = process_tree_rss_kb(server.pid) / 1024
+        stop.set()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        shutil.rmtree(root, ignore_errors=True)
+
+    latencies = sorted(d for d, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float("nan")
+    return {
+        "mode": mode,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95_ms": p95 * 1000,
+        "errors": errors,
+        "rss_mb": rss_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async serving modes")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes in both modes")
+    parser.add_argument("--threads", type=int, default=32, help="threads per worker in async mode")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent fast clients")
+    parser.add_argument("--requests", type=int, default=400, help="total fast requests")
+    parser.add_argument("--slow-clients", type=int, default=8, help="concurrent slow uploads")
+    parser.add_argument("--trickle", type=float, default=2.0, help="seconds each slow upload takes")
+    parser.add_argument("--bids", type=int, default=200, help="bid files to seed")
+    args = parser.parse_args()
+
+    rows = [run_mode(mode, args) for mode in ("sync", "async")]
+    print(f"{'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>9} {'errors':>7} {'RSS MB':>8}")
+    for r in rows:
+        print(f"{r['mode']:<6} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>9.1f} {r['errors']:>7} {r['rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# Check (and optionally repair) a bids store offline.
+#
+#   cd backend && python scripts/fsck.py [--bids-dir bids] [--repair] [--reindex] [--workers N] [--report fsck-report.json]
+#
+# Stop the app first: repairs write straight to disk and would race its
+# coalesced tracker writes. Journal transactions a crash interrupted are
+# finished before checking. Documents are grouped by client/opportunity (the
+# unit that shares a shard) and each group is checked in a process pool sized
+# to the available cores, so groups are validated and repaired in parallel.
+# Progress is streamed to stdout and a JSON report of every finding is written
+# at the end. Exit status is 0 when the store is clean (or fully repaired) and
+# 1 when issues remain.
+#
+# Checks per group:
+#   unreadable                a bid or tracker does not parse
+#   bid_id_mismatch           a bid's bidId differs from its file name
+#   multiple_active_bids      more than one active bid version      (repair: archive older)
+#   multiple_active_trackers  more than one active tracker version  (repair: archive older)
+#   missing_tracker           an active bid without an active tracker (repair: create one)
+#   counter_mismatch          total/open/closed/owners differ from the actions (repair: re-derive)
+#   index_mismatch            shard summaries or actionIndex differ from the shards (repair: re-derive)
+#   missing_shard             the header lists a deliverable file that does not exist
+#   orphan_shard              a deliverable file the header does not list
+#   bad_archive_name          an archived entry that is not <client>_<opp>[_Action Tracker]_versionN
+#   archive_version_conflict  an archived version at or above the active one
+#   misplaced                 an entry in the wrong shard directory  (repair: move)
+#   unmigrated                an entry still at the top level (run scripts/migrate_layout.py)
+#
+# With --repair (or --reindex alone) the state derived from the documents is
+# then rebuilt, as repairs bypass the app's write events: the search database,
+# the activity suggestion table and the change log checkpoint under .state.
+# The report lists each rebuilt file under "reindexed".
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils import journal, layout, owners, tracker_store  # noqa: E402
+from utils.changelog import ChangeLog  # noqa: E402
+from utils.search_index import SearchIndex  # noqa: E402
+from utils.storage import load_json, save_json  # noqa: E402
+from utils.suggestions import ActivitySuggestions  # noqa: E402
+
+RESERVED = {"action_trackers", "Archive", "archive", "templates", ".state"}
+TRACKER_SUFFIX = "_Action Tracker"
+VERSION = re.compile(r"_version(\d+)(\.json)?$", re.IGNORECASE)
+ARCHIVE_NAME = re.compile(r"^(.+?)(_Action Tracker)?_version(\d+)(\.json)?$|^(.+)_action_tracker\.json$", re.IGNORECASE)
+
+
+def _version(name):
+    match = VERSION.search(name)
+    return int(match.group(1)) if match else 1
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# {key: {"bids": [...], "trackers": [...], "archive": [...]}} of (name, path, shard) tuples,
+# shard being the directory it sits in (None at the top level)
+def collect_groups(bids_dir):
+    roots = {
+        "bids": bids_dir,
+        "trackers": os.path.join(bids_dir, "action_trackers"),
+        "archive": os.path.join(bids_dir, "Archive"),
+    }
+    groups = {}
+    for section, root in roots.items():
+        for name, path in layout.list_entries(root):
+            if section == "bids" and (name in RESERVED or not name.endswith(".json") or name == "current_bid.json"):
+                continue
+            parent = os.path.basename(os.path.dirname(path))
+            shard = parent if os.path.dirname(os.path.dirname(path)) == root and layout.is_shard_dir(parent) else None
+            key = layout.shard_key(name)
+            group = groups.setdefault(key, {"bids": [], "trackers": [], "archive": []})
+            group[section].append((name, path, shard))
+    return roots, groups
+
+
+def _actual_tracker(path):
+    # Header as stored plus the actions actually present in its shards
+    if not tracker_store.is_sharded(path):
+        doc = load_json(path)
+        return doc, doc.get("actionsByDeliverable", {}), [], []
+    header = load_json(os.path.join(path, tracker_store.HEADER_FILE))
+    actions = {}
+    missing = []
+    for deliverable, info in header.get("shards", {}).items():
+        shard_path = os.path.join(path, info["file"])
+        if os.path.exists(shard_path):
+            actions[deliverable] = load_json(shard_path)
+        else:
+            missing.append(info["file"])
+    listed = {info["file"] for info in header.get("shards", {}).values()}
+    orphans = [f for f in os.listdir(path)
+               if f.startswith("deliverable-") and f not in listed]
+    return header, actions, missing, orphans
+
+
+def _expected_counters(actions_by_deliverable):
+    header = {"shards": {d: tracker_store.summarize_actions(a) for d, a in actions_by_deliverable.items()}}
+    tracker_store.refresh_totals(header)
+    return header
+
+
+def check_tracker(name, path, repair, issues):
+    first = len(issues)
+    try:
+        stored, actions, missing, orphans = _actual_tracker(path)
+    except Exception as e:
+        issues.append({"check": "unreadable", "path": path, "detail": str(e)})
+        return
+    for f in missing:
+        issues.append({"check": "missing_shard", "path": path, "detail": f})
+    for f in orphans:
+        issues.append({"check": "orphan_shard", "path": path, "detail": f})
+
+    expected = _expected_counters(actions)
+    stale = False
+    for counter in ("totalActions", "openActions", "closedActions"):
+        if stored.get(counter) != expected[counter]:
+            issues.append({"check": "counter_mismatch", "path": path,
+                           "detail": f"{counter}={stored.get(counter)} expected {expected[counter]}"})
+            stale = True
+    stored_owners = stored.get("ownerIds", stored.get("owners", []))
+    if sorted(map(str, stored_owners)) != sorted(map(str, expected["ownerIds"])):
+        issues.append({"check": "counter_mismatch", "path": path, "detail": "owners"})
+        stale = True
+
+    if tracker_store.is_sharded(path):
+        for deliverable, summary in expected["shards"].items():
+            info = stored.get("shards", {}).get(deliverable, {})
+            if {k: info.get(k) for k in summary} != summary:
+                issues.append({"check": "index_mismatch", "path": path, "detail": f"shard summary for {deliverable}"})
+                stale = True
+        index = {a.get("actionId"): d for d, acts in actions.items() for a in acts}
+        if stored.get("actionIndex") != index:
+            issues.append({"check": "index_mismatch", "path": path, "detail": "actionIndex"})
+            stale = True
+
+    if stale and repair:
+        doc = tracker_store.public_header(stored) if tracker_store.is_sharded(path) else dict(stored)
+        doc["actionsByDeliverable"] = actions
+        if tracker_store.is_sharded(path):
+            doc["actionHistory"] = load_json(os.path.join(path, tracker_store.HISTORY_FILE)) \
+                if os.path.exists(os.path.join(path, tracker_store.HISTORY_FILE)) else {}
+        for counter in ("totalActions", "openActions", "closedActions"):
+            doc[counter] = expected[counter]
+        doc["owners"] = owners.resolve(expected["ownerIds"])
+        if tracker_store.is_sharded(path):
+            tx = journal.Transaction()
+            tracker_store.write_tracker(path, doc, tx)
+            tx.commit()
+        else:
+            save_json(path, doc)
+        for issue in issues[first:]:
+            if issue["check"] in ("counter_mismatch", "index_mismatch"):
+                issue["repaired"] = True
+
+
+def _archive(roots, name, path, repair, issues, check):
+    target = layout.new_entry_path(roots["archive"], name) if repair else None
+    issue = {"check": check, "path": path}
+    if repair:
+        if os.path.exists(target):
+            issue["detail"] = f"{target} already archived; left in place"
+        else:
+            tracker_store.flush(path)
+            shutil.move(path, target)
+            issue["repaired"] = True
+    issues.append(issue)
+
+
+def check_group(args):
+    key, group, roots, repair = args
+    issues = []
+    expected_shard = layout.shard_of(key)
+
+    # Layout
+    for section in ("bids", "trackers", "archive"):
+        for i, (name, path, shard) in enumerate(group[section]):
+            if shard is None:
+                issues.append({"check": "unmigrated", "path": path})
+            elif shard != expected_shard:
+                issue = {"check": "misplaced", "path": path, "detail": f"belongs in shard {expected_shard}"}
+                if repair:
+                    target = layout.new_entry_path(roots[section], name)
+                    if not os.path.exists(target):
+                        shutil.move(path, target)
+                        group[section][i] = (name, target, expected_shard)
+                        issue["repaired"] = True
+                issues.append(issue)
+
+    # Active bids
+    bids = sorted(group["bids"], key=lambda e: _version(e[0]))
+    for name, path, _ in bids:
+        try:
+            doc = load_json(path)
+        except Exception as e:
+            issues.append({"check": "unreadable", "path": path, "detail": str(e)})
+            continue
+        if doc.get("bidId") != name[:-len(".json")]:
+            issues.append({"check": "bid_id_mismatch", "path": path, "detail": f"bidId={doc.get('bidId')}"})
+    for name, path, _ in bids[:-1]:
+        _archive(roots, name, path, repair, issues, "multiple_active_bids")
+
+    # Active trackers
+    trackers = sorted(group["trackers"], key=lambda e: _version(e[0]))
+    for name, path, _ in trackers[:-1]:
+        _archive(roots, name, path, repair, issues, "multiple_active_trackers")
+    if trackers:
+        check_tracker(*trackers[-1][:2], repair, issues)
+    elif bids:
+        issue = {"check": "missing_tracker", "path": bids[-1][1]}
+        if repair:
+            archived = [_version(n) for n, _, _ in group["archive"] if TRACKER_SUFFIX in n]
+            at_id = f"{key}{TRACKER_SUFFIX}_version{max(archived, default=0) + 1}"
+            try:
+                deliverables = load_json(bids[-1][1]).get("deliverables", [])
+            except Exception:
+                deliverables = []
+            path = layout.new_entry_path(roots["trackers"], at_id)
+            tx = journal.Transaction()
+            tracker_store.write_tracker(path, {
+                "bidId": f"{key}{TRACKER_SUFFIX}",
+                "totalActions": 0,
+                "openActions": 0,
+                "closedActions": 0,
+                "actionsByDeliverable": {},
+                "owners": [],
+                "deliverables": deliverables,
+                "actionHistory": {},
+            }, tx)
+            tx.commit()
+            issue["repaired"] = True
+            issue["detail"] = f"created {at_id}"
+        issues.append(issue)
+
+    # Archive names and versions
+    active_bid = _version(bids[-1][0]) if bids else None
+    active_tracker = _version(trackers[-1][0]) if trackers else None
+    for name, path, _ in group["archive"]:
+        match = ARCHIVE_NAME.match(name)
+        if not match or (match.group(1) and match.group(1) != key):
+            issues.append({"check": "bad_archive_name", "path": path})
+            continue
+        if match.group(5):
+            continue  # legacy <bid_id>_action_tracker.json from /move-to-archive
+        active = active_tracker if match.group(2) else active_bid
+        if active is not None and int(match.group(3)) >= active:
+            issues.append({"check": "archive_version_conflict", "path": path,
+                           "detail": f"archived version {match.group(3)} >= active {active}"})
+
+    return key, issues
+
+
+# Rebuild what .state derives from the documents; one entry per rebuilt file
+def reindex(roots, bids_dir):
+    state_dir = os.path.join(bids_dir, ".state")
+    os.makedirs(state_dir, exist_ok=True)
+    rebuilt = []
+
+    # From scratch, so rows of documents fsck moved or archived cannot linger
+    db_path = os.path.join(state_dir, "search.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    indexed = SearchIndex(db_path, bids_dir, roots["trackers"], roots["archive"]).refresh()
+    rebuilt.append({"state": os.path.relpath(db_path, bids_dir), "documents": indexed})
+
+    table_path = os.path.join(state_dir, "activity_suggestions.json")
+    mined = ActivitySuggestions(table_path, bids_dir, roots["archive"]).rebuild()
+    rebuilt.append({"state": os.path.relpath(table_path, bids_dir), "rebuilt": mined})
+
+    changes_dir = os.path.join(state_dir, "changes")
+    if os.path.isdir(changes_dir):
+        checkpoint = ChangeLog(changes_dir).rebuild_checkpoint()
+        rebuilt.append({"state": os.path.relpath(os.path.join(changes_dir, "checkpoint.json"), bids_dir), **checkpoint})
+
+    for entry in rebuilt:
+        print(f"[FSCK] Rebuilt {entry['state']}")
+    return rebuilt
+
+
+# Workers load the owner registry and open the journal themselves: under the
+# spawn and forkserver start methods they do not inherit them from this process
+def init_worker(registry, journal_dir):
+    owners.init(registry)
+    journal.init(journal_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and repair a bids store")
+    parser.add_argument("--bids-dir", default="bids")
+    parser.add_argument("--repair", action="store_true", help="fix what can be fixed in place")
+    parser.add_argument("--reindex", action="store_true",
+                        help="rebuild the search index, suggestions and change log checkpoint (implied by --repair)")
+    parser.add_argument("--workers", type=int, default=_cpu_count())
+    parser.add_argument("--report", default="fsck-report.json")
+    args = parser.parse_args()
+
+    started = time.time()
+    registry = os.path.join(args.bids_dir, ".state", "owners.json")
+    journal_dir = os.path.join(args.bids_dir, ".state", "journal")
+    init_worker(registry, journal_dir)
+    # Finish transactions a crash interrupted before judging the documents
+    journal.attach_change_log(ChangeLog(os.path.join(args.bids_dir, ".state", "changes")))
+    recovered = journal.recover()
+    if recovered:
+        print(f"[FSCK] Finished {recovered} interrupted transactions")
+    roots, groups = collect_groups(args.bids_dir)
+    total = len(groups)
+    print(f"[FSCK] {total} bid groups under {args.bids_dir}, {args.workers} workers, repair={args.repair}")
+
+    findings = []
+    work = [(key, group, roots, args.repair) for key, group in sorted(groups.items())]
+    chunksize = max(1, total // (args.workers * 8))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(registry, journal_dir)) as pool:
+        for done, (key, issues) in enumerate(pool.map(check_group, work, chunksize=chunksize), 1):
+            findings.extend({"group": key, **issue} for issue in issues)
+            if issues:
+                print(f"[{done}/{total}] {key}: " + ", ".join(i["check"] for i in issues), flush=True)
+            elif done % 100 == 0 or done == total:
+                print(f"[{done}/{total}] ok", flush=True)
+
+    reindexed = reindex(roots, args.bids_dir) if args.repair or args.reindex else []
+
+    by_check = {}
+    for issue in findings:
+        by_check[issue["check"]] = by_check.get(issue["check"], 0) + 1
+    remaining = [i for i in findings if not i.get("repaired") and i["check"] != "unmigrated"]
+    report = {
+        "bidsDir": os.path.abspath(args.bids_dir),
+        "groups": total,
+        "repair": args.repair,
+        "elapsedSeconds": round(time.time() - started, 3),
+        "issuesByCheck": by_check,
+        "unresolved": len(remaining),
+        "reindexed": reindexed,
+        "issues": findings,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"[FSCK] {len(findings)} issues, {len(remaining)} unresolved; report written to {args.report}")
+    return 1 if remaining else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Move a flat bids store into the hash-sharded layout (see utils/layout.py).
+#
+#   cd backend && python scripts/migrate_layout.py [--bids-dir bids] [--min-age 60] [--dry-run]
+#
+# Safe to run while the app is serving. The app reads an entry from its shard
+# first and falls back to the top level, so every entry is reachable before,
+# during and after its move:
+#   - files are hard-linked into their shard and then unlinked at the top
+#     level, so there is no moment where neither copy exists;
+#   - tracker directories are moved with a single rename().
+# Entries modified in the last --min-age seconds are left for a later run, so
+# a write the app is still coalescing for the old path is not stranded. Run
+# it again until it reports nothing pending.
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils import layout  # noqa: E402
+
+# Top-level directories of the bids root that are not bid documents
+RESERVED = {"action_trackers", "Archive", "archive", "templates", ".state", ".DS_Store"}
+
+
+def _mtime(path):
+    if os.path.isdir(path):
+        return max([os.stat(path).st_mtime] + [os.stat(os.path.join(path, f)).st_mtime for f in os.listdir(path)])
+    return os.stat(path).st_mtime
+
+
+def migrate_root(root, min_age, dry_run, stats):
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in sorted(os.listdir(root)):
+        src = os.path.join(root, name)
+        if name in RESERVED or layout.is_shard_dir(name):
+            continue
+        if now - _mtime(src) < min_age:
+            print(f"[PENDING] {src} (modified recently)")
+            stats["pending"] += 1
+            continue
+        dst = os.path.join(layout.shard_dir(root, layout.shard_key(name)), name)
+        if os.path.exists(dst):
+            # A write landed on the old path after an earlier move: keep the newer copy
+            if os.path.isfile(src) and _mtime(src) > _mtime(dst):
+                print(f"[REPLACE] {src} -> {dst}")
+                if not dry_run:
+                    os.replace(src, dst)
+                stats["moved"] += 1
+            else:
+                print(f"[CONFLICT] {src} already exists at {dst}; left in place")
+                stats["conflicts"] += 1
+            continue
+
+        print(f"[MOVE] {src} -> {dst}")
+        stats["moved"] += 1
+        if dry_run:
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.isdir(src):
+            os.rename(src, dst)
+        else:
+            try:
+                os.link(src, dst)
+                os.unlink(src)
+            except OSError:
+                os.rename(src, dst)
+
+    # Entries filed under the wrong shard, such as trackers archived as
+    # "<bid>_versionN_action_tracker.json" before shard_key stripped that suffix
+    for shard in sorted(os.listdir(root)):
+        shard_path = os.path.join(root, shard)
+        if not layout.is_shard_dir(shard) or not os.path.isdir(shard_path):
+            continue
+        for name in sorted(os.listdir(shard_path)):
+            if name.startswith(".") or layout.shard_of(layout.shard_key(name)) == shard:
+                continue
+            src = os.path.join(shard_path, name)
+            dst = os.path.join(layout.shard_dir(root, layout.shard_key(name)), name)
+            if os.path.exists(dst):
+                print(f"[CONFLICT] {src} already exists at {dst}; left in place")
+                stats["conflicts"] += 1
+                continue
+            print(f"[MOVE] {src} -> {dst}")
+            stats["moved"] += 1
+            if not dry_run:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.rename(src, dst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a flat bids directory to the sharded layout")
+    parser.add_argument("--bids-dir", default="bids")
+    parser.add_argument("--min-age", type=float, default=60.0,
+                        help="skip entries modified within this many seconds (default 60)")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    stats = {"moved": 0, "pending": 0, "conflicts": 0}
+    for root in (args.bids_dir,
+                 os.path.join(args.bids_dir, "action_trackers"),
+                 os.path.join(args.bids_dir, "Archive")):
+        migrate_root(root, args.min_age, args.dry_run, stats)
+
+    print(f"[DONE] moved={stats['moved']} pending={stats['pending']} conflicts={stats['conflicts']}")
+    return 1 if stats["pending"] or stats["conflicts"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+# Incremental, deduplicated snapshots of a bids store.
+#
+#   cd backend && python scripts/snapshot.py [--repo backups] snapshot [--bids-dir bids] [--workers N] [--rehash]
+#   python scripts/snapshot.py [--repo backups] list
+#   python scripts/snapshot.py [--repo backups] restore <snapshot|latest> --target DIR [--delete]
+#   python scripts/snapshot.py [--repo backups] verify [<snapshot>|latest|all]
+#
+# Files are cut into content-defined chunks (a gear rolling hash picks the cut
+# points, so an edit only changes the chunks around it) and each chunk is
+# stored once, zlib-compressed, under chunks/<sha256[:2]>/<sha256>. A snapshot
+# is a manifest listing every file's size, mode, mtime and chunk hashes, in
+# snapshots/<id>.json. Files whose size and mtime match the previous snapshot
+# reuse its chunk list without being read (--rehash reads everything), and
+# only chunks the repository does not have yet are written, so a daily
+# snapshot costs about as much as the day's changes. Every archived version
+# and cloned bid shares chunks with the others.
+#
+# Hashing, restoring and verifying run in a process pool sized to the
+# available cores. Each file is read once and is consistent on its own (the
+# app replaces files atomically) but a snapshot of a live store is not a
+# single point in time across files; run scripts/fsck.py after a restore, or
+# stop the app for the snapshot. Restore checks every chunk's hash. Exit
+# status is 1 when verify or restore finds a missing or corrupt chunk.
+#
+# Derived state that is rebuilt on startup (search index, single-flight
+# results) and lock files are left out; --exclude adds more patterns.
+import argparse
+import fcntl
+import fnmatch
+import hashlib
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.storage import load_json, save_json  # noqa: E402
+
+DEFAULT_EXCLUDES = [".state/search.db*", ".state/singleflight/*", "*.lock", "*.tmp"]
+
+# Chunk sizes: cut points are searched between MIN and MAX bytes into a
+# chunk and land every AVG bytes on average (AVG must be a power of two)
+MIN_CHUNK = 2 * 1024
+AVG_CHUNK = 8 * 1024
+MAX_CHUNK = 64 * 1024
+# Gear hashing shifts left, so the high bits depend on the most bytes
+CUT_MASK = (AVG_CHUNK - 1) << (64 - AVG_CHUNK.bit_length() + 1)
+MASK64 = (1 << 64) - 1
+GEAR = [int.from_bytes(hashlib.sha256(b"gear%d" % i).digest()[:8], "big") for i in range(256)]
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# End offsets of the content-defined chunks of data
+def chunk_ends(data):
+    ends = []
+    start = 0
+    size = len(data)
+    while start < size:
+        limit = min(size, start + MAX_CHUNK)
+        cut = limit
+        h = 0
+        for i in range(start + MIN_CHUNK, limit):
+            h = ((h << 1) + GEAR[data[i]]) & MASK64
+            if not h & CUT_MASK:
+                cut = i + 1
+                break
+        ends.append(cut)
+        start = cut
+    return ends
+
+
+def _chunk_path(repo, digest):
+    return os.path.join(repo, "chunks", digest[:2], digest)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _read_chunk(repo, digest):
+    with open(_chunk_path(repo, digest), "rb") as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"chunk {digest} is corrupt")
+    return data
+
+
+# Pool task: chunk one file and store the chunks the repository lacks
+def store_file(args):
+    repo, root, rel = args
+    path = os.path.join(root, rel)
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    chunks = []
+    written = 0
+    start = 0
+    for end in chunk_ends(data):
+        piece = data[start:end]
+        digest = hashlib.sha256(piece).hexdigest()
+        chunk_path = _chunk_path(repo, digest)
+        if not os.path.exists(chunk_path):
+            _write_atomic(chunk_path, zlib.compress(piece, 6))
+            written += len(piece)
+        chunks.append(digest)
+        start = end
+    entry = {"path": rel, "size": len(data), "mode": st.st_mode & 0o7777, "mtimeNs": st.st_mtime_ns,
+             "chunks": chunks}
+    return entry, written
+
+
+# Pool task: rebuild one file from its chunks; returns an error string or None
+def restore_file(args):
+    repo, target, entry = args
+    path = os.path.join(target, entry["path"])
+    try:
+        data = b"".join(_read_chunk(repo, digest) for digest in entry["chunks"])
+        if len(data) != entry["size"]:
+            return f"{entry['path']}: restored {len(data)} bytes, expected {entry['size']}"
+        _write_atomic(path, data)
+        os.chmod(path, entry["mode"])
+        os.utime(path, ns=(entry["mtimeNs"], entry["mtimeNs"]))
+        return None
+    except (OSError, ValueError, zlib.error) as e:
+        return f"{entry['path']}: {e}"
+
+
+# Pool task: check a batch of chunks; returns (digest, problem) pairs
+def verify_chunks(args):
+    repo, digests = args
+    problems = []
+    for digest in digests:
+        try:
+            _read_chunk(repo, digest)
+        except FileNotFoundError:
+            problems.append((digest, "missing"))
+        except (OSError, ValueError, zlib.error) as e:
+            problems.append((digest, f"corrupt: {e}"))
+    return problems
+
+
+def _snapshot_ids(repo):
+    directory = os.path.join(repo, "snapshots")
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-len(".json")] for f in os.listdir(directory) if f.endswith(".json"))
+
+
+def _load_snapshot(repo, name):
+    ids = _snapshot_ids(repo)
+    if name == "latest":
+        if not ids:
+            raise SystemExit(f"No snapshots in {repo}")
+        name = ids[-1]
+    if name not in ids:
+        raise SystemExit(f"Unknown snapshot {name}; see 'list'")
+    return load_json(os.path.join(repo, "snapshots", name + ".json"))
+
+
+def _excluded(rel, patterns):
+    return any(fnmatch.fnmatch(rel, p) for p in patterns)
+
+
+def _walk(root, patterns):
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if os.path.isfile(path) and not os.path.islink(path) and not _excluded(rel, patterns):
+                yield rel
+
+
+def cmd_snapshot(args):
+    started = time.time()
+    root = os.path.abspath(args.bids_dir)
+    os.makedirs(os.path.join(args.repo, "snapshots"), exist_ok=True)
+    with open(os.path.join(args.repo, "repo.lock"), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise SystemExit(f"Another snapshot is running against {args.repo}")
+
+        ids = _snapshot_ids(args.repo)
+        previous = {}
+        if ids and not args.rehash:
+            previous = {e["path"]: e for e in _load_snapshot(args.repo, ids[-1])["files"]}
+
+        entries = []
+        changed = []
+        for rel in _walk(root, DEFAULT_EXCLUDES + args.exclude):
+            st = os.stat(os.path.join(root, rel))
+            prior = previous.get(rel)
+            if prior and prior["size"] == st.st_size and prior["mtimeNs"] == st.st_mtime_ns:
+                entries.append(prior)
+            else:
+                changed.append(rel)
+        print(f"[SNAPSHOT] {len(entries) + len(changed)} files under {root}, {len(changed)} to hash, "
+              f"{args.workers} workers", flush=True)
+
+        written = 0
+        work = [(args.repo, root, rel) for rel in changed]
+        chunksize = max(1, len(work) // (args.workers * 8))
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for done, result in enumerate(pool.map(store_file, work, chunksize=chunksize), 1):
+                entries.append(result[0])
+                written += result[1]
+                if done % 500 == 0:
+                    print(f"[{done}/{len(work)}] hashed", flush=True)
+
+        entries.sort(key=lambda e: e["path"])
+        snapshot_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(started))
+        while snapshot_id in ids:
+            snapshot_id += "a"
+        total = sum(e["size"] for e in entries)
+        save_json(os.path.join(args.repo, "snapshots", snapshot_id + ".json"), {
+            "id": snapshot_id,
+            "source": root,
+            "created": started,
+            "files": entries,
+            "bytes": total,
+            "newBytes": written,
+            "rehashedFiles": len(changed),
+        }, fsync=True)
+    print(f"[SNAPSHOT] {snapshot_id}: {len(entries)} files, {total} bytes, {written} new bytes stored "
+          f"in {time.time() - started:.1f}s")
+    return 0
+
+
+def cmd_list(args):
+    for name in _snapshot_ids(args.repo):
+        snapshot = load_json(os.path.join(args.repo, "snapshots", name + ".json"))
+        print(f"{name}  {len(snapshot['files']):>7} files  {snapshot['bytes']:>12} bytes  "
+              f"{snapshot['newBytes']:>12} new  {snapshot['source']}")
+    return 0
+
+
+def cmd_restore(args):
+    started = time.time()
+    snapshot = _load_snapshot(args.repo, args.snapshot)
+    target = os.path.abspath(args.target)
+    for entry in snapshot["files"]:
+        parts = entry["path"].split("/")
+        if entry["path"].startswith("/") or ".." in parts:
+            raise SystemExit(f"Refusing to restore unsafe path {entry['path']}")
+    os.makedirs(target, exist_ok=True)
+    print(f"[RESTORE] {snapshot['id']}: {len(snapshot['files'])} files into {target}, {args.workers} workers",
+          flush=True)
+
+    errors = []
+    work = [(args.repo, target, entry) for entry in snapshot["files"]]
+    chunksize = max(1, len(work) // (args.workers * 8))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for error in pool.map(restore_file, work, chunksize=chunksize):
+            if error:
+                errors.append(error)
+                print(f"[RESTORE] {error}", flush=True)
+
+    removed = 0
+    if args.delete and not errors:
+        # Make the target match the snapshot exactly, excluded state aside
+        wanted = {e["path"] for e in snapshot["files"]}
+        for rel in list(_walk(target, DEFAULT_EXCLUDES)):
+            if rel not in wanted:
+                os.remove(os.path.join(target, rel))
+                removed += 1
+    print(f"[RESTORE] {len(snapshot['files']) - len(errors)} files restored, {len(errors)} failed, "
+          f"{removed} removed in {time.time() - started:.1f}s")
+    return 1 if errors else 0
+
+
+def cmd_verify(args):
+    started = time.time()
+    names = _snapshot_ids(args.repo) if args.snapshot == "all" else [_load_snapshot(args.repo, args.snapshot)["id"]]
+    users = {}
+    for name in names:
+        for entry in load_json(os.path.join(args.repo, "snapshots", name + ".json"))["files"]:
+            for digest in entry["chunks"]:
+                users.setdefault(digest, set()).add(f"{name}:{entry['path']}")
+    digests = sorted(users)
+    print(f"[VERIFY] {len(digests)} chunks in {len(names)} snapshots, {args.workers} workers", flush=True)
+
+    batch = max(1, min(256, len(digests) // (args.workers * 4) or 1))
+    work = [(args.repo, digests[i:i + batch]) for i in range(0, len(digests), batch)]
+    problems = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for result in pool.map(verify_chunks, work):
+            problems.extend(result)
+    for digest, problem in problems:
+        print(f"[VERIFY] chunk {digest} {problem}, used by " + ", ".join(sorted(users[digest])[:5]))
+    print(f"[VERIFY] {len(problems)} bad chunks in {time.time() - started:.1f}s")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot and restore a bids store")
+    parser.add_argument("--repo", default="backups", help="snapshot repository directory")
+    parser.add_argument("--workers", type=int, default=_cpu_count())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="record the current state of the store")
+    snapshot.add_argument("--bids-dir", default="bids")
+    snapshot.add_argument("--rehash", action="store_true", help="read every file, not only changed ones")
+    snapshot.add_argument("--exclude", action="append", default=[], help="glob of relative paths to skip")
+    snapshot.set_defaults(run=cmd_snapshot)
+
+    commands.add_parser("list", help="list snapshots").set_defaults(run=cmd_list)
+
+    restore = commands.add_parser("restore", help="rebuild the tree of a snapshot")
+    restore.add_argument("snapshot", help="snapshot id or 'latest'")
+    restore.add_argument("--target", required=True)
+    restore.add_argument("--delete", action="store_true", help="remove files the snapshot does not have")
+    restore.set_defaults(run=cmd_restore)
+
+    verify = commands.add_parser("verify", help="check the chunks snapshots refer to")
+    verify.add_argument("snapshot", nargs="?", default="latest", help="snapshot id, 'latest' or 'all'")
+    verify.set_defaults(run=cmd_verify)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
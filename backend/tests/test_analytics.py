@@ -0,0 +1,69 @@
+import json
+import pytest
+from utils import invalidation
+from utils import layout
+from utils.analytics import AnalyticsEngine
+
+ACTIVITIES = [
+    ("Ann", "Completed", "2026-01-05"),
+    ("Ann", "Pending", "2026-01-31"),
+    ("Bo", "Pending", "2026-02-01"),
+    ("Bo", "Completed", "2026-02-28"),
+    ("Ann", "Pending", ""),
+]
+
+
+def _save_bid(bids_dir, bid_id, activities):
+    doc = {"bidId": bid_id, "activities": {"Security Plan": [
+        {"name": f"A{i}", "owner": owner, "status": status, "startDate": "2026-01-01", "endDate": end}
+        for i, (owner, status, end) in enumerate(activities)
+    ]}}
+    with open(layout.entry_path(bids_dir, f"{bid_id}.json", create=True), "w") as f:
+        json.dump(doc, f)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(invalidation, "_table", None)
+    bids_dir = str(tmp_path / "bids")
+    trackers_dir = str(tmp_path / "bids" / "action_trackers")
+    (tmp_path / "bids" / "action_trackers").mkdir(parents=True)
+    _save_bid(bids_dir, "Acme_Cloud_version1", ACTIVITIES)
+    return AnalyticsEngine(bids_dir, trackers_dir, rescan_seconds=3600)
+
+
+@pytest.mark.parametrize("bound, value", [
+    ("from", "2026-13-01"), ("to", "yesterday"), ("from", "01/02/2026"), ("to", "2026-02-30"),
+])
+def test_malformed_bounds_are_rejected(engine, bound, value):
+    with pytest.raises(ValueError, match=bound):
+        engine.query(["owner"], {bound: value})
+
+
+def test_date_window_matches_brute_force(engine):
+    for start, end in [("2026-01-01", "2026-01-31"), ("2026-01-31", "2026-02-01"), ("2026-02-02", None),
+                       (None, "2026-01-05"), ("2026-03-01", "2026-03-31")]:
+        expected = [
+            a for a in ACTIVITIES if a[2]
+            and (start is None or a[2] >= start) and (end is None or a[2] <= end)
+        ]
+        rows = engine.query([], {"from": start, "to": end})
+        assert rows[0]["count"] == len(expected)
+        assert rows[0]["completed"] == sum(1 for a in expected if a[1] == "Completed")
+
+
+def test_group_by_owner_and_month(engine):
+    rows = engine.query(["owner", "month"])
+    assert sorted((r["owner"], r["month"], r["count"], r["completed"]) for r in rows) == [
+        ("Ann", "2026-01", 2, 1),
+        ("Bo", "2026-02", 2, 1),
+    ]
+
+
+def test_notify_reloads_the_written_bid(engine, tmp_path):
+    assert engine.query([])[0]["count"] == len(ACTIVITIES)
+    _save_bid(str(tmp_path / "bids"), "Acme_Cloud_version1", ACTIVITIES[:2])
+    _save_bid(str(tmp_path / "bids"), "Other_Deal_version1", ACTIVITIES[2:3])
+    # No change log and a long rescan interval: only the notified bid is reloaded
+    engine.notify("bid", "Acme_Cloud_version1", "update")
+    assert engine.query([])[0]["count"] == 2
@@ -0,0 +1,72 @@
+import os
+import time
+import pytest
+from utils import invalidation
+from utils.changelog import ChangeLog
+
+
+@pytest.fixture(autouse=True)
+def no_invalidation_table(monkeypatch):
+    monkeypatch.setattr(invalidation, "_table", None)
+
+
+# Follow the log the way a /changes client does, page by page
+def _sync(log, since, limit):
+    changes = []
+    while True:
+        page = log.read(since, limit)
+        changes.extend(page["changes"])
+        assert len(page["changes"]) <= limit
+        since = page["nextSince"]
+        if not page["hasMore"]:
+            return changes, page
+
+
+def test_read_pages_through_every_change(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes"))
+    for i in range(7):
+        log.append("bid", f"bid{i}", "update")
+
+    page = log.read(0, 3)
+    assert [c["seq"] for c in page["changes"]] == [1, 2, 3]
+    assert page["hasMore"] and page["nextSince"] == 3 and page["headSeq"] == 7
+
+    changes, last = _sync(log, 0, 3)
+    assert [c["seq"] for c in changes] == list(range(1, 8))
+    assert not last["hasMore"] and last["nextSince"] == 7
+    assert log.read(7, 3)["changes"] == []
+
+
+def test_compaction_keeps_latest_change_per_document(tmp_path):
+    # Every append seals the active segment, so compaction runs early
+    log = ChangeLog(str(tmp_path / "changes"), segment_bytes=1, compact_segments=2)
+    ops = [("a", "create"), ("b", "create"), ("a", "update"), ("c", "create"),
+           ("b", "delete"), ("a", "update"), ("d", "create")]
+    for doc_id, op in ops:
+        log.append("bid", doc_id, op)
+
+    assert len(os.listdir(log.directory)) < len(ops)
+    changes, last = _sync(log, 0, 2)
+    assert last["compactedThrough"] > 0 and last["headSeq"] == len(ops)
+    seqs = [c["seq"] for c in changes]
+    assert seqs == sorted(seqs) and seqs[-1] == len(ops)
+    # A client starting over ends with every document's final state
+    final = {}
+    for c in changes:
+        final[c["id"]] = c["op"]
+    assert final == {"a": "update", "b": "delete", "c": "create", "d": "create"}
+    # Changes after the compacted range are all kept
+    assert [c["seq"] for c in changes if c["seq"] > last["compactedThrough"]] == \
+        list(range(last["compactedThrough"] + 1, len(ops) + 1))
+
+
+def test_replayed_transaction_changes_are_logged_once(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes"))
+    started = time.time() - 1
+    assert log.append_all([("bid", "x", "update")], tx="t1") == [1]
+    # The replay after a crash carries the same changes plus the unlogged one
+    seqs = log.append_all([("bid", "x", "update"), ("tracker", "x", "update")], tx="t1", since=started)
+    assert seqs == [2]
+    changes = log.read(0)["changes"]
+    assert [(c["kind"], c["op"]) for c in changes] == [("bid", "update"), ("tracker", "update")]
+    assert all("tx" not in c for c in changes)
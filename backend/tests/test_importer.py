@@ -0,0 +1,77 @@
+import io
+import pytest
+from utils import importer
+
+DELIVERABLES = ["Security Plan", "Rate Card"]
+TEAM = ["Ann", "Bo"]
+
+
+def _rows(text, fmt):
+    return list(importer.iter_records(io.BytesIO(text.encode("utf-8")), fmt))
+
+
+def test_jsonl_rows_keep_line_numbers_and_report_bad_lines():
+    rows = _rows('{"name": "a"}\n\nnot json\n[1, 2]\n{"name": "b"}', "jsonl")
+    assert [(number, record) for number, record, _ in rows] == \
+        [(1, {"name": "a"}), (3, None), (4, None), (5, {"name": "b"})]
+    assert rows[1][2].startswith("Invalid JSON")
+    assert rows[2][2] == "Each line must be a JSON object."
+
+
+def test_csv_rows_are_numbered_as_in_a_spreadsheet():
+    text = "\ufeffname, owner ,deliverable\nScope, Ann ,Security Plan\nRates,Bo,Rate Card\n"
+    rows = _rows(text, "csv")
+    assert [number for number, _, _ in rows] == [2, 3]
+    assert rows[0][1] == {"name": "Scope", "owner": "Ann", "deliverable": "Security Plan"}
+
+
+def test_multibyte_character_split_across_chunks():
+    # The two bytes of "é" straddle the first 64 KiB read
+    name = "x" * (64 * 1024 - 11) + "é"
+    rows = _rows('{"name": "%s"}\n' % name, "jsonl")
+    assert rows[0][1] == {"name": name}
+
+
+@pytest.mark.parametrize("fmt, text", [
+    ("jsonl", "".join('{"name": "a%d"}\n' % i for i in range(4))),
+    ("csv", "name\n" + "".join("a%d\n" % i for i in range(4))),
+])
+def test_row_limit(monkeypatch, fmt, text):
+    monkeypatch.setattr(importer, "IMPORT_MAX_ROWS", 3)
+    rows = importer.iter_records(io.BytesIO(text.encode("utf-8")), fmt)
+    assert len([next(rows) for _ in range(3)]) == 3
+    with pytest.raises(importer.ImportTooLarge):
+        next(rows)
+
+
+def test_row_limit_counts_only_non_blank_jsonl_lines(monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_MAX_ROWS", 2)
+    assert len(_rows('{"a": 1}\n\n\n{"a": 2}\n\n', "jsonl")) == 2
+
+
+def test_validate_action_lists_every_error():
+    action, errors = importer.validate_action(
+        {"name": "", "owner": "Zed", "deliverable": "Unknown", "endDate": "02/03/2026"}, DELIVERABLES, TEAM)
+    assert errors == [
+        "unknown deliverable 'Unknown'",
+        "owner 'Zed' is not on the bid team",
+        "name is required",
+        "endDate must be YYYY-MM-DD",
+    ]
+    assert action["status"] == "Pending"
+
+
+def test_validate_action_accepts_any_owner_without_a_team():
+    action, errors = importer.validate_action(
+        {"name": "Scope", "owner": "Zed", "deliverable": "Security Plan", "endDate": "2026-03-02"}, DELIVERABLES, [])
+    assert errors == []
+    assert action == {"name": "Scope", "deliverable": "Security Plan", "owner": "Zed",
+                      "endDate": "2026-03-02", "status": "Pending", "remarks": ""}
+
+
+def test_validate_activity_rejects_start_after_end():
+    record = {"name": "Scope", "owner": "Ann", "deliverable": "Security Plan",
+              "startDate": "2026-03-05", "endDate": "2026-03-01"}
+    deliverable, activity, errors = importer.validate_activity(record, DELIVERABLES, TEAM)
+    assert deliverable == "Security Plan"
+    assert errors == ["startDate is after endDate"]
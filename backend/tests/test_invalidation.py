@@ -0,0 +1,75 @@
+import multiprocessing
+import pytest
+from utils import invalidation
+
+# Children are spawned, not forked, so each maps the table on its own like a
+# separately started worker would
+_spawn = multiprocessing.get_context("spawn")
+
+
+def _publish(table_path, key, times):
+    invalidation.init(table_path)
+    for _ in range(times):
+        invalidation.publish(key)
+
+
+def _read(table_path, key, results):
+    invalidation.init(table_path)
+    results.put(invalidation.revision(key))
+
+
+def _run(target, *args):
+    process = _spawn.Process(target=target, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+@pytest.fixture
+def table_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(invalidation, "_table", None)
+    monkeypatch.setattr(invalidation, "_roots", [])
+    return str(tmp_path / "generations")
+
+
+def test_revision_published_by_another_process(table_path):
+    invalidation.init(table_path)
+    before = invalidation.revision("bids")
+    _run(_publish, table_path, "bids", 1)
+    assert invalidation.revision("bids") == before + 1
+
+
+def test_revision_visible_to_another_process(table_path):
+    _run(_publish, table_path, "bids", 3)
+    results = _spawn.Queue()
+    _run(_read, table_path, "bids", results)
+    assert results.get(timeout=10) == 3
+
+
+def test_concurrent_publishes_are_not_lost(table_path):
+    invalidation.init(table_path)
+    processes = [_spawn.Process(target=_publish, args=(table_path, "bids", 500)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    assert invalidation.revision("bids") == 1000
+
+
+def test_tree_revision_follows_paths_under_watched_root(table_path, tmp_path):
+    invalidation.init(table_path)
+    root = tmp_path / "bids"
+    invalidation.watch(str(root), exclude=[str(root / ".state")])
+    before = invalidation.tree_revision(str(root))
+    invalidation.publish_path(str(root / ".state" / "search.db"))
+    assert invalidation.tree_revision(str(root)) == before
+    invalidation.publish_path(str(root / "3f" / "Acme_Cloud_version1.json"))
+    assert invalidation.tree_revision(str(root)) != before
+    assert invalidation.tree_revision(str(tmp_path / "elsewhere")) is None
+
+
+def test_without_table(monkeypatch):
+    monkeypatch.setattr(invalidation, "_table", None)
+    invalidation.publish("bids")
+    assert invalidation.revision("bids") is None
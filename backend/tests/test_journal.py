@@ -0,0 +1,150 @@
+import json
+import os
+import pytest
+from utils import invalidation
+from utils import journal
+from utils.changelog import ChangeLog
+
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(invalidation, "_table", None)
+    monkeypatch.setattr(journal, "_journal_dir", None)
+    path = str(tmp_path / "journal")
+    journal.init(path)
+    return path
+
+
+@pytest.fixture
+def change_log(journal_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "_change_log", None)
+    monkeypatch.setattr(journal, "_unlogged", set())
+    log = ChangeLog(str(tmp_path / "changes"))
+    journal.attach_change_log(log)
+    return log
+
+
+def _write(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _read(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# Commit tx up to its record and the first `applied` operations, as a process
+# that died mid-commit leaves it
+def _crash_after(tx, applied):
+    for i, op in enumerate(tx.ops):
+        if op["op"] == "write":
+            op["before"] = journal._before_image(tx.ops, i)
+    record_path = journal._write_record(tx.id, tx.ops)
+    journal._apply(tx.id, tx.ops[:applied])
+    return os.stat(record_path).st_mtime_ns
+
+
+# Another worker writing path after the dead transaction's record
+def _write_later(path, data, committed):
+    _write(path, data)
+    os.utime(path, ns=(committed + 10**9, committed + 10**9))
+
+
+def test_commit_applies_and_cleans_up(journal_dir, tmp_path):
+    _write(tmp_path / "gone.json", {"v": 0})
+    tx = journal.Transaction()
+    tx.save(str(tmp_path / "a.json"), {"v": 1})
+    tx.delete(str(tmp_path / "gone.json"))
+    tx.commit()
+    assert _read(tmp_path / "a.json") == {"v": 1}
+    assert not (tmp_path / "gone.json").exists()
+    assert os.listdir(journal_dir) == [journal.LOCK_FILE]
+
+
+def test_recover_replays_partly_applied_transaction(journal_dir, tmp_path):
+    _write(tmp_path / "a.json", {"v": 0})
+    _write(tmp_path / "c.json", {"v": 0})
+    tx = journal.Transaction()
+    tx.save(str(tmp_path / "a.json"), {"v": 1})
+    tx.save(str(tmp_path / "b.json"), {"v": 1})
+    tx.delete(str(tmp_path / "c.json"))
+    _crash_after(tx, 1)
+
+    assert journal.recover() == 1
+    assert _read(tmp_path / "a.json") == {"v": 1}
+    assert _read(tmp_path / "b.json") == {"v": 1}
+    assert not (tmp_path / "c.json").exists()
+    assert os.listdir(journal_dir) == [journal.LOCK_FILE]
+
+
+def test_recover_rolls_back_whole_transaction_on_newer_write(journal_dir, tmp_path):
+    _write(tmp_path / "a.json", {"v": 0})
+    tx = journal.Transaction()
+    tx.save(str(tmp_path / "a.json"), {"v": 1})
+    tx.save(str(tmp_path / "b.json"), {"v": 1})
+    tx.save(str(tmp_path / "c.json"), {"v": 1})
+    committed = _crash_after(tx, 2)
+    _write_later(tmp_path / "b.json", {"v": "other"}, committed)
+
+    assert journal.recover() == 1
+    # Nothing of the transaction survives, and the newer write is kept
+    assert _read(tmp_path / "a.json") == {"v": 0}
+    assert _read(tmp_path / "b.json") == {"v": "other"}
+    assert not (tmp_path / "c.json").exists()
+
+
+def test_rollback_undoes_moves_and_deletes(journal_dir, tmp_path):
+    (tmp_path / "bid").mkdir()
+    _write(tmp_path / "bid" / "header.json", {"v": 0})
+    _write(tmp_path / "c.json", {"v": 0})
+    tx = journal.Transaction()
+    tx.delete(str(tmp_path / "c.json"))
+    tx.move(str(tmp_path / "bid"), str(tmp_path / "archive" / "bid"))
+    tx.save(str(tmp_path / "x.json"), {"v": 1})
+    committed = _crash_after(tx, 2)
+    assert not (tmp_path / "c.json").exists()
+    _write_later(tmp_path / "x.json", {"v": "other"}, committed)
+
+    journal.recover()
+    assert _read(tmp_path / "c.json") == {"v": 0}
+    assert _read(tmp_path / "bid" / "header.json") == {"v": 0}
+    assert not (tmp_path / "archive" / "bid").exists()
+    assert _read(tmp_path / "x.json") == {"v": "other"}
+    assert os.listdir(journal_dir) == [journal.LOCK_FILE]
+
+
+def test_before_image_follows_earlier_operations(journal_dir, tmp_path):
+    _write(tmp_path / "a.json", {"v": 0})
+    tx = journal.Transaction()
+    tx.move(str(tmp_path / "a.json"), str(tmp_path / "b.json"))
+    tx.save(str(tmp_path / "b.json"), {"v": 1})
+    tx.save(str(tmp_path / "b.json"), {"v": 2})
+    tx.save(str(tmp_path / "a.json"), {"v": 3})
+    assert journal._before_image(tx.ops, 1) == {"data": {"v": 0}}
+    assert journal._before_image(tx.ops, 2) == {"data": {"v": 1}}
+    assert journal._before_image(tx.ops, 3) is None
+
+
+def test_commit_logs_changes_with_the_write(change_log, tmp_path):
+    tx = journal.Transaction()
+    tx.save(str(tmp_path / "a.json"), {"v": 1})
+    tx.publish("bid", "a", "update")
+    tx.commit()
+    assert [(c["kind"], c["id"], c["op"]) for c in change_log.read(0)["changes"]] == [("bid", "a", "update")]
+
+
+@pytest.mark.parametrize("logged_before_crash", [False, True])
+def test_replay_logs_changes_once(change_log, tmp_path, logged_before_crash):
+    tx = journal.Transaction()
+    tx.save(str(tmp_path / "a.json"), {"v": 1})
+    tx.publish("bid", "a", "update")
+    tx.publish("tracker", "a", "update")
+    _crash_after(tx, 1)
+    if logged_before_crash:
+        change_log.append_all([("bid", "a", "update"), ("tracker", "a", "update")], tx=tx.id)
+
+    assert journal.recover() == 1
+    assert _read(tmp_path / "a.json") == {"v": 1}
+    changes = change_log.read(0)["changes"]
+    assert [(c["kind"], c["op"]) for c in changes] == [("bid", "update"), ("tracker", "update")]
@@ -0,0 +1,23 @@
+from utils import layout
+
+
+def test_shard_key_strips_entry_suffixes():
+    assert layout.shard_key("Acme_Cloud_version2.json") == "Acme_Cloud"
+    assert layout.shard_key("Acme_Cloud_Action Tracker_version2") == "Acme_Cloud"
+    assert layout.shard_key("Acme_Cloud_Action Tracker_version2.json") == "Acme_Cloud"
+    assert layout.shard_key("Acme_Cloud_Action Tracker") == "Acme_Cloud"
+
+
+def test_shard_key_archived_tracker_named_after_bid():
+    assert layout.shard_key("Acme_Cloud_version1_action_tracker.json") == "Acme_Cloud"
+    assert layout.shard_of(layout.shard_key("Acme_Cloud_version1_action_tracker.json")) == \
+        layout.shard_of(layout.shard_key("Acme_Cloud_version1.json"))
+
+
+def test_entry_path_does_not_create_shard_on_read(tmp_path):
+    path = layout.entry_path(str(tmp_path), "Acme_Cloud_version1.json")
+    assert not (tmp_path / layout.shard_of("Acme_Cloud")).exists()
+    assert path == str(tmp_path / layout.shard_of("Acme_Cloud") / "Acme_Cloud_version1.json")
+
+    layout.entry_path(str(tmp_path), "Acme_Cloud_version1.json", create=True)
+    assert (tmp_path / layout.shard_of("Acme_Cloud")).is_dir()
@@ -0,0 +1,56 @@
+import random
+from utils.workload_index import IntervalTree
+
+
+def _brute_force(intervals, start, end):
+    return sorted(i for (s, e, i) in intervals if s <= end and e >= start)
+
+
+def _check_max_end(node):
+    if node is None:
+        return -1
+    below = max(_check_max_end(node.left), _check_max_end(node.right))
+    assert node.max_end == max(node.key[1], below)
+    return node.max_end
+
+
+def test_overlapping_matches_brute_force_through_inserts_and_removes():
+    rng = random.Random(31)
+    tree = IntervalTree()
+    intervals = set()
+    for i in range(2000):
+        if intervals and rng.random() < 0.3:
+            key = rng.choice(sorted(intervals))
+            tree.remove(key)
+            intervals.discard(key)
+        else:
+            start = rng.randrange(0, 400)
+            key = (start, start + rng.choice([0, 0, 1, 5, 30, 120]), i)
+            tree.insert(key, key[2])
+            intervals.add(key)
+        if i % 50 == 0:
+            _check_max_end(tree.root)
+            for _ in range(20):
+                start = rng.randrange(-10, 560)
+                end = start + rng.choice([0, 1, 7, 60])
+                assert sorted(tree.overlapping(start, end)) == _brute_force(intervals, start, end)
+    assert tree.size == len(intervals)
+
+
+def test_overlapping_is_inclusive_at_both_ends():
+    tree = IntervalTree()
+    tree.insert((10, 20, "a"), "a")
+    tree.insert((21, 21, "b"), "b")
+    tree.insert((5, 9, "c"), "c")
+    assert sorted(tree.overlapping(20, 21)) == ["a", "b"]
+    assert tree.overlapping(9, 9) == ["c"]
+    assert tree.overlapping(22, 30) == []
+    assert IntervalTree().overlapping(0, 100) == []
+
+
+def test_duplicate_ranges_are_told_apart_by_id():
+    tree = IntervalTree()
+    for i in range(5):
+        tree.insert((3, 8, i), i)
+    tree.remove((3, 8, 2))
+    assert sorted(tree.overlapping(8, 8)) == [0, 1, 3, 4]
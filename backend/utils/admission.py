@@ -0,0 +1,307 @@
+import fcntl
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from flask import g, jsonify, request
+from utils.analytics import bid_key_from_bid_id
+from utils.metrics import record_counter, span
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Every gate admits up to "limit" requests at once and lets up to "queue" more
+# wait, for at most queueTimeoutSeconds; anything beyond that gets a 503 with
+# Retry-After. Gates shared between worker processes don't queue (see
+# _SharedGate). A request passes its bid's gate, then its route's, then its
+# priority class's, so requests queued behind one hot bid or slow route don't
+# hold a slot that other bids and routes could use.
+#   classes - priority classes; GET requests are "read", the rest "write"
+#             unless their route names another class (null for none)
+#   routes  - per-route gates by URL rule, and their class
+#   perBid  - one gate per bid, for write requests only
+DEFAULT_CONFIG = {
+    "queueTimeoutSeconds": 5,
+    "retryAfterSeconds": 2,
+    "classes": {
+        "read": {"limit": 64, "queue": 256},
+        "write": {"limit": 8, "queue": 32},
+    },
+    "routes": {
+        "/finalize_bid": {"limit": 2, "queue": 8},
+        "/create-bid": {"limit": 2, "queue": 8},
+        "/save-bid-data": {"limit": 4, "queue": 16},
+        "/api/action-trackers/<bid_id>/actions/import": {"limit": 1, "queue": 2},
+        "/api/bids/<bid_id>/activities/import": {"limit": 1, "queue": 2},
+        "/api/export": {"limit": 2, "queue": 4},
+        "/metrics": {"class": None},
+    },
+    "perBid": {"limit": 2, "queue": 8},
+}
+
+# How often the config file is checked for changes (seconds)
+RELOAD_CHECK_SECONDS = 1.0
+# Per-bid gates shared between workers are hashed into this many lock file sets
+ADMISSION_BID_BUCKETS = int(os.getenv("ADMISSION_BID_BUCKETS", "1024"))
+
+
+class _Gate:
+    def __init__(self, limit, queue):
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.cond = threading.Condition()
+
+    def configure(self, limit, queue):
+        with self.cond:
+            self.limit = limit
+            self.queue = queue
+            self.cond.notify_all()
+
+    # A token for leave() once admitted; None if the queue is full or the wait timed out
+    def enter(self, timeout):
+        with self.cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                return None
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + timeout
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.cond.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def leave(self, token):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def idle(self):
+        return self.active == 0 and self.waiting == 0
+
+
+# Gate shared by every worker process on the node: one lock file per slot,
+# held with flock while a request is admitted, so the limit counts requests
+# in all workers and a worker that dies gives its slots back with its file
+# descriptors. There is no queue: under sync workers a waiting request would
+# tie up its worker and starve everything else, reads included, so a request
+# that finds every slot taken is turned away at once with a 503 and retries
+# after Retry-After.
+class _SharedGate:
+    def __init__(self, prefix, limit, queue):
+        self.prefix = prefix
+        self.limit = limit
+
+    def configure(self, limit, queue):
+        self.limit = limit
+
+    # Lock one of the slot files, starting at a random one so concurrent
+    # requests don't all contend for the first; returns its fd or None
+    def enter(self, timeout):
+        start = random.randrange(self.limit) if self.limit > 0 else 0
+        for i in range(self.limit):
+            fd = os.open(f"{self.prefix}.slot{(start + i) % self.limit}", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    # Closing the descriptor releases the slot
+    def leave(self, fd):
+        os.close(fd)
+
+    # Bid gates share a fixed set of lock files, so there is nothing to clean up
+    def idle(self):
+        return False
+
+
+# With lock_dir the limits hold across all worker processes (see _SharedGate),
+# which is what makes them engage under gunicorn's default sync workers, each
+# serving one request at a time. Without it they are per process, as scripts
+# and the single-process dev server need. The optional config file (JSON, same
+# shape as DEFAULT_CONFIG) overrides the defaults key by key and is re-read
+# when its mtime changes.
+class AdmissionController:
+    def __init__(self, config_path=None, lock_dir=None):
+        self.config_path = config_path
+        self.lock_dir = lock_dir
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._gates = {}
+        self._config_mtime = None
+        self._last_check = 0.0
+        self.config = DEFAULT_CONFIG
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_SECONDS:
+            return
+        self._last_check = now
+        mtime = None
+        if self.config_path and os.path.exists(self.config_path):
+            mtime = os.path.getmtime(self.config_path)
+        if not force and mtime == self._config_mtime:
+            return
+        config = dict(DEFAULT_CONFIG)
+        if mtime is not None:
+            try:
+                with open(self.config_path, 'r') as f:
+                    overrides = json.load(f)
+                for key, value in overrides.items():
+                    if isinstance(value, dict) and isinstance(config.get(key), dict):
+                        config[key] = {**config[key], **value}
+                    else:
+                        config[key] = value
+            except (OSError, ValueError) as e:
+                # Keep the current limits rather than run with a half-read file
+                print(f"[ADMISSION] Ignoring unreadable config {self.config_path}: {e}")
+                return
+        with self._lock:
+            self.config = config
+            self._config_mtime = mtime
+            for name, gate in self._gates.items():
+                limits = self._limits(name)
+                if limits is not None:
+                    gate.configure(limits["limit"], limits["queue"])
+        if mtime is not None:
+            print(f"[ADMISSION] Loaded {self.config_path}")
+
+    # limit/queue for a gate name: ("class", name), ("route", rule) or ("bid", key)
+    def _limits(self, name):
+        scope, key = name
+        if scope == "class":
+            return self.config["classes"].get(key)
+        if scope == "route":
+            limits = self.config["routes"].get(key, {})
+            return limits if "limit" in limits else None
+        return self.config.get("perBid")
+
+    def _gate(self, name):
+        with self._lock:
+            gate = self._gates.get(name)
+            if gate is None:
+                limits = self._limits(name)
+                if limits is None:
+                    return None
+                if self.lock_dir:
+                    gate = _SharedGate(self._lock_prefix(name), limits["limit"], limits["queue"])
+                else:
+                    gate = _Gate(limits["limit"], limits["queue"])
+                self._gates[name] = gate
+            return gate
+
+    # Lock file prefix of a shared gate
+    def _lock_prefix(self, name):
+        scope, key = name
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        if scope == "bid":
+            return os.path.join(self.lock_dir, f"bid-{int(digest, 16) % ADMISSION_BID_BUCKETS}")
+        return os.path.join(self.lock_dir, f"{scope}-{digest[:12]}")
+
+    # Gates a request must pass, most specific first
+    def _gate_names(self, rule, method, bid):
+        route = self.config["routes"].get(rule, {})
+        priority = route.get("class", "read" if method in ("GET", "HEAD") else "write")
+        names = []
+        if bid and priority == "write":
+            names.append(("bid", bid))
+        names.append(("route", rule))
+        if priority is not None:
+            names.append(("class", priority))
+        return names
+
+    # Admit the request or return the 503 response to send instead
+    def admit(self, rule, method, bid=None):
+        self._maybe_reload()
+        timeout = self.config["queueTimeoutSeconds"]
+        acquired = []
+        with span("admission_wait"):
+            for name in self._gate_names(rule, method, bid):
+                gate = self._gate(name)
+                if gate is None:
+                    continue
+                token = gate.enter(timeout)
+                if token is None:
+                    self.release(acquired)
+                    record_counter("admission_rejected", route=rule, gate=name[0])
+                    response = jsonify({
+                        "success": False,
+                        "message": "Server is busy, please retry shortly.",
+                    })
+                    response.status_code = 503
+                    response.headers["Retry-After"] = str(self.config["retryAfterSeconds"])
+                    return acquired, response
+                acquired.append((name, gate, token))
+        record_counter("admission_admitted", route=rule)
+        return acquired, None
+
+    def release(self, acquired):
+        for name, gate, token in reversed(acquired):
+            gate.leave(token)
+            # Per-bid gates come and go with the bids being edited
+            if name[0] == "bid" and gate.idle():
+                with self._lock:
+                    if gate.idle() and self._gates.get(name) is gate:
+                        del self._gates[name]
+        acquired.clear()
+
+
+# Bid a write request is about: the bid_id in the URL, ?bidId, or the client
+# and opportunity in the JSON body. Versions of a bid share one gate.
+def _request_bid():
+    bid_id = (request.view_args or {}).get("bid_id") or request.args.get("bidId")
+    if not bid_id and request.is_json:
+        body = request.get_json(silent=True) or {}
+        details = body.get("bidDetails", body) if isinstance(body, dict) else {}
+        if isinstance(details, dict):
+            bid_id = body.get("bidId") or (
+                f"{details['clientName']}_{details['opportunityName']}"
+                if details.get("clientName") and details.get("opportunityName") else None
+            )
+    return bid_key_from_bid_id(bid_id) if bid_id else None
+
+
+def init_app(app, config_path=None, lock_dir=None):
+    if not ADMISSION_ENABLED:
+        return None
+    controller = AdmissionController(config_path, lock_dir)
+
+    @app.before_request
+    def admit_request():
+        if request.method == "OPTIONS" or request.url_rule is None:
+            return None
+        bid = _request_bid() if request.method not in ("GET", "HEAD") else None
+        g.admission, rejection = controller.admit(request.url_rule.rule, request.method, bid)
+        return rejection
+
+    @app.after_request
+    def hold_admission_while_streaming(response):
+        # A streamed body (exports) is produced after the request is torn down,
+        # so its slots are released when the response is closed instead
+        acquired = g.get("admission")
+        if acquired and response.is_streamed:
+            g.admission = None
+            response.call_on_close(lambda: controller.release(acquired))
+        return response
+
+    @app.teardown_request
+    def release_admission(exc):
+        acquired = g.pop("admission", None)
+        if acquired:
+            controller.release(acquired)
+
+    return controller
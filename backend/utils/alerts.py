@@ -0,0 +1,269 @@
+import fcntl
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+import pytz
+import requests
+
+# Where alerts go: "log", "file:<path>" or "webhook:<url>"
+ALERT_SINK = os.getenv("ALERT_SINK", "log")
+# Days before the end date to send a reminder (0 disables reminders)
+ALERT_REMINDER_DAYS = int(os.getenv("ALERT_REMINDER_DAYS", "1"))
+ALERT_TIMEZONE = os.getenv("ALERT_TIMEZONE", "Asia/Kolkata")
+# Upper bound on how long the scheduler sleeps before checking for changes from other workers
+ALERT_POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", "30"))
+
+
+class LogSink:
+    def send(self, alert):
+        print(f"[ALERT] {alert['type'].upper()}: {alert['kind']} '{alert['name']}' ({alert['bid']} / "
+              f"{alert['deliverable']}) owned by {alert['owner']} is due {alert['endDate']}")
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert) + "\n")
+
+
+class WebhookSink:
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        requests.post(self.url, json=alert, timeout=self.timeout)
+
+
+def sink_from_config(config=ALERT_SINK):
+    if config.startswith("file:"):
+        return FileSink(config[len("file:"):])
+    if config.startswith("webhook:"):
+        return WebhookSink(config[len("webhook:"):])
+    return LogSink()
+
+
+# Fires reminder and overdue alerts for activities and actions that are not
+# Completed. Upcoming deadlines sit in a min-heap keyed by fire time, so the
+# scheduler sleeps until the next one instead of scanning trackers. Changes
+# arrive from the workload index whenever a document's assignments change;
+# superseded heap entries are skipped lazily via a per-item generation and
+# dropped once they outnumber the live ones.
+#
+# Every worker keeps the heap, so any of them can answer upcoming(); only the
+# one holding the lock file sends alerts, and another takes over if it exits.
+# Sent alerts are remembered per client/opportunity rather than per file, so a
+# new bid version does not repeat them.
+class DeadlineScheduler:
+    def __init__(self, index, sink, state_path, lock_path,
+                 reminder_days=ALERT_REMINDER_DAYS, timezone=ALERT_TIMEZONE, poll_seconds=ALERT_POLL_SECONDS):
+        self.index = index
+        self.sink = sink
+        self.state_path = state_path
+        self.lock_path = lock_path
+        self.reminder_days = reminder_days
+        self.tz = pytz.timezone(timezone)
+        self.poll_seconds = poll_seconds
+        self._cond = threading.Condition()
+        self._heap = []          # (fire_at, sequence, key, alert_type, generation)
+        self._items = {}         # key -> (assignment, generation)
+        self._by_document = {}   # document path -> set of keys
+        self._sequence = 0
+        self._fired = set()
+        self._wake = False
+        self._lock_file = None
+        self._thread = None
+        self._track_lock = threading.Lock()
+        self._tracking = False
+
+    # Build the heap from the index and follow its changes; returns whether
+    # this process is the one sending alerts
+    def start(self):
+        self._track()
+        leading = self._lead()
+        self._thread = threading.Thread(target=self._run, name="deadline-scheduler", daemon=True)
+        self._thread.start()
+        return leading
+
+    # Build the heap once, from start() or from the first upcoming() in a
+    # process that never started the scheduler (flask run, scripts)
+    def _track(self):
+        with self._track_lock:
+            if self._tracking:
+                return
+            self.index.listeners.append(self._on_document)
+            for path, assignments in self.index.assignments_by_document().items():
+                self._on_document(path, assignments)
+            self._tracking = True
+
+    # Whether this process runs the scheduler thread (alerts are only sent by
+    # one running process, see _lead)
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Take the lock file if no other process holds it
+    def _lead(self):
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                fired = set(json.load(f))
+            with self._cond:
+                self._fired = fired
+        print(f"[ALERTS] Sending alerts from process {os.getpid()}")
+        return True
+
+    # events.subscribe hook: a local write happened, pick it up now
+    def notify(self, kind, doc_id, op):
+        with self._cond:
+            self._wake = True
+            self._cond.notify()
+
+    def _key(self, path, assignment):
+        return (path, assignment["kind"], assignment["deliverable"], assignment["id"])
+
+    # Identifies a sent alert across bid versions
+    def _fired_key(self, assignment, alert_type):
+        return f"{assignment['bid']}|{assignment['kind']}|{assignment['deliverable']}|{assignment['id']}|" \
+               f"{assignment['end']}|{alert_type}"
+
+    def _fire_time(self, ordinal):
+        day = date.fromordinal(ordinal)
+        return self.tz.localize(datetime(day.year, day.month, day.day)).timestamp()
+
+    def _on_document(self, path, assignments):
+        with self._cond:
+            for key in self._by_document.pop(path, set()):
+                self._items.pop(key, None)
+            for assignment in assignments:
+                self._schedule(path, assignment)
+            self._compact()
+            self._cond.notify()
+
+    def _schedule(self, path, assignment):
+        if assignment["status"].lower() == "completed":
+            return
+        with self._cond:
+            key = self._key(path, assignment)
+            self._sequence += 1
+            generation = self._sequence
+            self._items[key] = (assignment, generation)
+            self._by_document.setdefault(path, set()).add(key)
+            # Overdue once the end date has fully passed
+            heapq.heappush(self._heap, (self._fire_time(assignment["end"] + 1), self._sequence, key, "overdue", generation))
+            if self.reminder_days > 0:
+                self._sequence += 1
+                heapq.heappush(self._heap, (self._fire_time(assignment["end"] - self.reminder_days), self._sequence,
+                                            key, "reminder", generation))
+
+    # Drop superseded entries once they are at least half the heap
+    def _compact(self):
+        per_item = 2 if self.reminder_days > 0 else 1
+        if len(self._heap) <= 2 * per_item * len(self._items) + 64:
+            return
+        self._heap = [entry for entry in self._heap
+                      if entry[2] in self._items and self._items[entry[2]][1] == entry[4]]
+        heapq.heapify(self._heap)
+
+    def _run(self):
+        while True:
+            due = []
+            leading = self._lead()
+            with self._cond:
+                now = time.time()
+                while leading and self._heap and self._heap[0][0] <= now:
+                    fire_at, _, key, alert_type, generation = heapq.heappop(self._heap)
+                    current = self._items.get(key)
+                    if current is None or current[1] != generation:
+                        continue
+                    assignment = current[0]
+                    if alert_type == "reminder" and self._fire_time(assignment["end"] + 1) <= now:
+                        # Already overdue; the overdue alert covers it
+                        continue
+                    fired_key = self._fired_key(assignment, alert_type)
+                    if fired_key in self._fired:
+                        continue
+                    self._fired.add(fired_key)
+                    due.append((alert_type, assignment))
+                timeout = self.poll_seconds
+                if leading and self._heap:
+                    timeout = min(timeout, max(0.0, self._heap[0][0] - now))
+                if not due and not self._wake:
+                    self._cond.wait(timeout)
+                wake = self._wake
+                self._wake = False
+
+            for alert_type, assignment in due:
+                self._send(alert_type, assignment)
+            if due:
+                self._save_state()
+            if wake or not due:
+                # Changes from other workers come back through _on_document
+                try:
+                    self.index.refresh()
+                except Exception as e:
+                    print(f"[ALERTS] Index refresh failed: {e}")
+
+    def _send(self, alert_type, assignment):
+        alert = {
+            "type": alert_type,
+            "kind": assignment["kind"],
+            "bid": assignment["bid"],
+            "deliverable": assignment["deliverable"],
+            "id": assignment["id"],
+            "name": assignment["name"],
+            "owner": assignment["owner"],
+            "status": assignment["status"],
+            "endDate": date.fromordinal(assignment["end"]).isoformat(),
+            "firedAt": datetime.now(self.tz).isoformat(),
+        }
+        try:
+            self.sink.send(alert)
+        except Exception as e:
+            print(f"[ALERTS] Failed to deliver {alert_type} alert for {assignment['name']}: {e}")
+
+    # Keep only alerts sent for items still pending with the same end date
+    def _save_state(self):
+        with self._cond:
+            pending = {self._fired_key(assignment, "").rstrip("|") for assignment, _ in self._items.values()}
+            self._fired = {k for k in self._fired if k.rsplit("|", 1)[0] in pending}
+            fired = sorted(self._fired)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(fired, f)
+        os.replace(tmp_path, self.state_path)
+
+    # Pending deadlines, soonest first (for inspection)
+    def upcoming(self, limit=50):
+        self._track()
+        # Pick up other workers' writes now rather than at the next poll
+        self.index.refresh()
+        with self._cond:
+            now = time.time()
+            live = [(fire_at, key, alert_type) for fire_at, _, key, alert_type, generation in self._heap
+                    if fire_at > now and key in self._items and self._items[key][1] == generation]
+            items = dict(self._items)
+        result = []
+        for fire_at, key, alert_type in heapq.nsmallest(limit, live):
+            assignment = items[key][0]
+            result.append({
+                "type": alert_type,
+                "fireAt": datetime.fromtimestamp(fire_at, self.tz).isoformat(),
+                "kind": assignment["kind"], "bid": assignment["bid"], "deliverable": assignment["deliverable"],
+                "id": assignment["id"], "name": assignment["name"], "owner": assignment["owner"],
+                "endDate": date.fromordinal(assignment["end"]).isoformat(),
+            })
+        return result
@@ -0,0 +1,360 @@
+import os
+import re
+import threading
+import time
+from datetime import date
+import numpy as np
+from utils.metrics import span
+from utils.storage import load_json
+from utils import layout
+from utils import owners
+from utils import tracker_store
+
+# How often to rescan the store for changed documents when there is no change log (seconds)
+ANALYTICS_RESCAN_SECONDS = float(os.getenv("ANALYTICS_RESCAN_SECONDS", "5"))
+
+KIND_ACTIVITY = 0
+KIND_ACTION = 1
+KINDS = ("activity", "action")
+
+GROUP_DIMENSIONS = ("kind", "bid", "deliverable", "owner", "status", "week", "month")
+DATE_FIELDS = {"startDate": "start", "endDate": "end"}
+
+# Activities and actions are flattened into parallel NumPy columns so that
+# filters are boolean masks and group-bys are a unique + bincount, instead of
+# Python loops over nested dicts.
+INT_COLUMNS = ("kind", "bid", "deliverable", "owner", "status", "start", "end", "start_month", "end_month")
+
+
+# Maps repeated strings (owners, statuses, ...) to small integer codes
+class Interner:
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+# Date string to proleptic ordinal and month index; -1 when missing or invalid
+def parse_date(value):
+    try:
+        d = date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return -1, -1
+    return d.toordinal(), d.year * 12 + d.month - 1
+
+
+def bid_key_from_bid_id(bid_id):
+    return re.sub(r"_version\d+$", "", bid_id, flags=re.IGNORECASE)
+
+
+def bid_key_from_tracker_id(tracker_id):
+    return re.sub(r"_Action Tracker(_version\d+)?(\.json)?$", "", tracker_id)
+
+
+def _version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Writers replace files (storage.save_json), so the inode changes even
+    # when a rewrite lands in the same mtime tick
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# Version of every active bid file and tracker (its header for sharded
+# trackers), by path; with bid_key, only that client/opportunity's documents
+def document_versions(bids_dir, trackers_dir, bid_key=None):
+    versions = {}
+    if bid_key is None:
+        bids, trackers = layout.list_entries(bids_dir), layout.list_entries(trackers_dir)
+    else:
+        bids = layout.list_prefix(bids_dir, bid_key).items()
+        trackers = layout.list_prefix(trackers_dir, bid_key).items()
+    for f, path in bids:
+        if f.endswith('.json') and f != 'current_bid.json' and \
+                (bid_key is None or bid_key_from_bid_id(f[:-len('.json')]) == bid_key):
+            version = _version(path)
+            if version is not None:
+                versions[path] = version
+    for f, path in trackers:
+        if bid_key is not None and bid_key_from_tracker_id(f) != bid_key:
+            continue
+        version = _version(path if f.endswith('.json') else os.path.join(path, tracker_store.HEADER_FILE))
+        if version is not None:
+            versions[path] = version
+    return versions
+
+
+# Which active documents changed, for indexes built from them. The store is
+# scanned once; after that only the client/opportunities named by new change
+# log records (appended by any worker) are listed and stat'ed, and "nothing
+# changed" is one read of the change log's revision in the invalidation
+# table. Write events in this worker go through changed_for() directly.
+# Without a change log the whole store is rescanned every rescan_seconds.
+class DocumentWatch:
+    def __init__(self, bids_dir, trackers_dir, changes=None, rescan_seconds=ANALYTICS_RESCAN_SECONDS):
+        self.bids_dir = bids_dir
+        self.trackers_dir = trackers_dir
+        self.changes = changes
+        self.rescan_seconds = rescan_seconds
+        self._versions = None   # document path -> version, once scanned
+        self._keys = {}         # bid key -> document paths
+        self._seq = 0           # change log sequence applied
+        self._revision = None   # change log revision at that point
+        self._last_scan = 0.0
+
+    def _key(self, path):
+        name = os.path.basename(path)
+        if path.startswith(self.trackers_dir):
+            return bid_key_from_tracker_id(name)
+        return bid_key_from_bid_id(name[:-len('.json')])
+
+    # (path, version) for new and changed documents, (path, None) for removed ones
+    def _diff(self, current, known, force=False):
+        changed = []
+        for path in known - set(current):
+            self._versions.pop(path, None)
+            self._keys.get(self._key(path), set()).discard(path)
+            changed.append((path, None))
+        for path, version in current.items():
+            if force or self._versions.get(path) != version:
+                self._versions[path] = version
+                self._keys.setdefault(self._key(path), set()).add(path)
+                changed.append((path, version))
+        return changed
+
+    # Documents of one client/opportunity that changed; force reports them all,
+    # for write events whose data may still be staged in this worker
+    def changed_for(self, bid_key, force=False):
+        if self._versions is None:
+            return []
+        current = document_versions(self.bids_dir, self.trackers_dir, bid_key)
+        return self._diff(current, set(self._keys.get(bid_key, ())), force)
+
+    # Documents changed since the last call; every document on the first
+    def changed(self):
+        rescan = self.changes is None and time.monotonic() - self._last_scan >= self.rescan_seconds
+        if self._versions is None or rescan:
+            return self._scan()
+        if self.changes is None:
+            return []
+        revision = self.changes.revision()
+        if revision is not None and revision == self._revision:
+            return []
+        keys = set()
+        since = self._seq
+        try:
+            while True:
+                page = self.changes.read(since, 1000)
+                for record in page["changes"]:
+                    if record["kind"] == "bid":
+                        keys.add(bid_key_from_bid_id(record["id"]))
+                    elif record["kind"] == "tracker":
+                        keys.add(bid_key_from_tracker_id(record["id"]))
+                since = page["nextSince"]
+                if not page["hasMore"]:
+                    break
+        except RuntimeError as e:
+            print(f"[DOCUMENTS] Change log unavailable, rescanning: {e}")
+            return self._scan()
+        self._seq = since
+        self._revision = revision
+        changed = []
+        for key in keys:
+            changed.extend(self.changed_for(key))
+        return changed
+
+    def _scan(self):
+        if self.changes is not None:
+            self._revision = self.changes.revision()
+            self._seq = self.changes.head()
+        known = set(self._versions or ())
+        if self._versions is None:
+            self._versions = {}
+        with span("document_scan"):
+            changed = self._diff(document_versions(self.bids_dir, self.trackers_dir), known)
+        self._last_scan = time.monotonic()
+        return changed
+
+    # Report path as changed again next time (after it failed to load)
+    def forget(self, path):
+        if self._versions is not None:
+            self._versions.pop(path, None)
+
+
+class AnalyticsEngine:
+    def __init__(self, bids_dir, trackers_dir, changes=None, rescan_seconds=ANALYTICS_RESCAN_SECONDS):
+        self.bids_dir = bids_dir
+        self.trackers_dir = trackers_dir
+        self._lock = threading.RLock()
+        self.interners = {name: Interner() for name in ("bid", "deliverable", "owner", "status")}
+        self.documents = DocumentWatch(bids_dir, trackers_dir, changes, rescan_seconds)
+        self._segments = {}      # document path -> dict of column arrays
+        self._columns = None     # concatenated columns, rebuilt when segments change
+
+    # events.subscribe hook: reload the written bid's documents now
+    def notify(self, kind, doc_id, op):
+        if kind not in ("bid", "tracker"):
+            return
+        bid_key = bid_key_from_bid_id(doc_id) if kind == "bid" else bid_key_from_tracker_id(doc_id)
+        with self._lock:
+            self._apply(self.documents.changed_for(bid_key, force=True))
+
+    def _rows(self, path):
+        name = os.path.basename(path)
+        columns = {c: [] for c in INT_COLUMNS}
+        codes = self.interners
+        completed = []
+
+        def add(kind, bid, deliverable, record, completed_status):
+            status = record.get("status") or "Unknown"
+            start, start_month = parse_date(record.get("startDate", ""))
+            end, end_month = parse_date(record.get("endDate", ""))
+            columns["kind"].append(kind)
+            columns["bid"].append(bid)
+            columns["deliverable"].append(codes["deliverable"].code(deliverable))
+            columns["owner"].append(codes["owner"].code(record.get("owner") or "Unassigned"))
+            columns["status"].append(codes["status"].code(status))
+            columns["start"].append(start)
+            columns["end"].append(end)
+            columns["start_month"].append(start_month)
+            columns["end_month"].append(end_month)
+            completed.append(completed_status(status))
+
+        if path.startswith(self.trackers_dir):
+            doc = tracker_store.load_tracker(path, include_history=False)
+            bid = codes["bid"].code(bid_key_from_tracker_id(name))
+            for deliverable, actions in doc.get("actionsByDeliverable", {}).items():
+                for a in actions:
+                    add(KIND_ACTION, bid, deliverable, a, lambda s: s.lower() == "completed")
+        else:
+            doc = owners.decode_bid(load_json(path))
+            bid = codes["bid"].code(bid_key_from_bid_id(name[:-len('.json')]))
+            for deliverable, activities in (doc.get("activities") or {}).items():
+                for a in activities:
+                    add(KIND_ACTIVITY, bid, deliverable, a, lambda s: s == "Completed")
+
+        segment = {c: np.asarray(v, dtype=np.int32) for c, v in columns.items()}
+        segment["completed"] = np.asarray(completed, dtype=bool)
+        return segment
+
+    # Reload the documents that changed (see DocumentWatch); the columns are
+    # concatenated again on the next query
+    def _apply(self, changes):
+        for path, version in changes:
+            if version is None:
+                self._segments.pop(path, None)
+                continue
+            try:
+                self._segments[path] = self._rows(path)
+            except Exception as e:
+                print(f"[ANALYTICS] Skipping {path}: {e}")
+                self._segments.pop(path, None)
+                self.documents.forget(path)
+        if changes:
+            self._columns = None
+
+    def refresh(self):
+        with self._lock, span("analytics_refresh"):
+            self._apply(self.documents.changed())
+            if self._columns is None:
+                self._compile()
+
+    def _compile(self):
+        segments = list(self._segments.values())
+        names = INT_COLUMNS + ("completed",)
+        if segments:
+            self._columns = {c: np.concatenate([s[c] for s in segments]) for c in names}
+        else:
+            self._columns = {c: np.zeros(0, dtype=bool if c == "completed" else np.int32) for c in names}
+
+    def _mask(self, cols, filters, date_field):
+        mask = np.ones(len(cols["kind"]), dtype=bool)
+        if filters.get("kind"):
+            mask &= np.isin(cols["kind"], [KINDS.index(k) for k in filters["kind"] if k in KINDS])
+        for name in ("bid", "deliverable", "owner", "status"):
+            if filters.get(name):
+                wanted = [self.interners[name].codes[v] for v in filters[name] if v in self.interners[name].codes]
+                mask &= np.isin(cols[name], wanted)
+        if filters.get("completed") is not None:
+            mask &= cols["completed"] == filters["completed"]
+        ordinals = cols[DATE_FIELDS[date_field]]
+        if filters.get("from"):
+            mask &= ordinals >= parse_date(filters["from"])[0]
+        if filters.get("to"):
+            mask &= (ordinals >= 0) & (ordinals <= parse_date(filters["to"])[0])
+        return mask
+
+    def _labels(self, dimension, codes):
+        if dimension == "kind":
+            return [KINDS[c] for c in codes]
+        if dimension == "week":
+            return [date.fromordinal(int(c)).isoformat() for c in codes]
+        if dimension == "month":
+            return [f"{c // 12:04d}-{c % 12 + 1:02d}" for c in codes]
+        values = self.interners[dimension].values
+        return [values[c] for c in codes]
+
+    # Count and completion grouped by the requested dimensions. "week" groups by
+    # the Monday starting the week and "month" by YYYY-MM of date_field.
+    def query(self, group_by, filters=None, date_field="endDate"):
+        filters = filters or {}
+        for dimension in group_by:
+            if dimension not in GROUP_DIMENSIONS:
+                raise ValueError(f"Unknown groupBy dimension: {dimension}")
+        if date_field not in DATE_FIELDS:
+            raise ValueError(f"Unknown dateField: {date_field}")
+        for bound in ("from", "to"):
+            if filters.get(bound) and parse_date(filters[bound])[0] < 0:
+                raise ValueError(f"{bound} must be a date in YYYY-MM-DD format")
+        self.refresh()
+
+        with self._lock:
+            cols = self._columns
+            with span("aggregate"):
+                mask = self._mask(cols, filters, date_field)
+                prefix = DATE_FIELDS[date_field]
+                keys = []
+                for dimension in group_by:
+                    if dimension == "week":
+                        ordinals = cols[prefix]
+                        mask &= ordinals >= 0
+                        # Ordinal 1 (0001-01-01) is a Monday
+                        keys.append(ordinals - (ordinals - 1) % 7)
+                    elif dimension == "month":
+                        mask &= cols[f"{prefix}_month"] >= 0
+                        keys.append(cols[f"{prefix}_month"])
+                    else:
+                        keys.append(cols[dimension])
+
+                completed = cols["completed"][mask]
+                if not group_by:
+                    total = int(mask.sum())
+                    done = int(completed.sum())
+                    return [{"count": total, "completed": done,
+                             "completionPercentage": round(done / total * 100, 2) if total else 0}]
+
+                stacked = np.stack([k[mask] for k in keys], axis=1)
+                if len(stacked) == 0:
+                    return []
+                groups, inverse = np.unique(stacked, axis=0, return_inverse=True)
+                inverse = inverse.reshape(-1)
+                counts = np.bincount(inverse, minlength=len(groups))
+                done = np.bincount(inverse, weights=completed, minlength=len(groups))
+
+                labels = [self._labels(d, groups[:, i]) for i, d in enumerate(group_by)]
+
+        rows = []
+        for g in range(len(groups)):
+            row = {d: labels[i][g] for i, d in enumerate(group_by)}
+            row["count"] = int(counts[g])
+            row["completed"] = int(done[g])
+            row["completionPercentage"] = round(done[g] / counts[g] * 100, 2) if counts[g] else 0
+            rows.append(row)
+        return rows
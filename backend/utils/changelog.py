@@ -0,0 +1,247 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from utils.metrics import span
+from utils import invalidation
+from utils.storage import load_json, save_json
+
+# Size at which the active segment is sealed and a new one started (bytes)
+CHANGES_SEGMENT_BYTES = int(os.getenv("CHANGES_SEGMENT_BYTES", str(1024 * 1024)))
+# Sealed segments kept before they are compacted into one
+CHANGES_COMPACT_SEGMENTS = int(os.getenv("CHANGES_COMPACT_SEGMENTS", "4"))
+
+CHECKPOINT_FILE = "checkpoint.json"
+LOCK_FILE = ".lock"
+
+
+def _segment_name(first_seq):
+    return f"segment-{first_seq:012d}.jsonl"
+
+
+def _segment_start(name):
+    return int(name[len("segment-"):-len(".jsonl")])
+
+
+def _encode(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+# Change-data-capture log of every document mutation, shared by all workers.
+# Each change gets the next sequence number and is appended as one JSON line
+#   {"seq":42,"ts":1735689600.0,"kind":"bid","id":"Acme_Cloud_version2","op":"update"}
+# to segment-<first seq>.jsonl files; the last segment is the active one.
+# Appends are serialized across processes with flock and fsynced before the
+# write that produced them returns; journal transactions append their changes
+# as part of the commit (utils.journal), so a change is logged exactly when
+# its write is applied. The head sequence is always re-read from
+# the tail of the active segment, so it survives crashes without extra state.
+# Every append bumps the log's revision in the invalidation table, so readers
+# in other workers see that there is something new without reading the log.
+#
+# When more than CHANGES_COMPACT_SEGMENTS segments are sealed they are merged
+# into a single segment keeping only the latest change per document, so a
+# client syncing from an old sequence still ends up with every document's
+# final state. checkpoint.json records the head at the last rotation and how
+# far the log has been compacted.
+class ChangeLog:
+    def __init__(self, directory, segment_bytes=CHANGES_SEGMENT_BYTES,
+                 compact_segments=CHANGES_COMPACT_SEGMENTS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.compact_segments = compact_segments
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(directory, LOCK_FILE)
+        self._checkpoint_path = os.path.join(directory, CHECKPOINT_FILE)
+        self._revision_key = "changes:" + os.path.abspath(directory)
+
+    def _segments(self):
+        names = [f for f in os.listdir(self.directory) if f.startswith("segment-") and f.endswith(".jsonl")]
+        return sorted(names, key=_segment_start)
+
+    def _checkpoint(self):
+        if os.path.exists(self._checkpoint_path):
+            return load_json(self._checkpoint_path)
+        return {"headSeq": 0, "compactedThrough": 0}
+
+    def _read_segment(self, name):
+        records = []
+        with open(os.path.join(self.directory, name), 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn line from a crash mid-append
+                    continue
+        return records
+
+    # (last sequence number, size in bytes, ends with newline) of a segment
+    def _tail(self, name):
+        path = os.path.join(self.directory, name)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(max(0, size - 4096))
+            chunk = f.read()
+        last = _segment_start(name) - 1
+        for line in reversed(chunk.splitlines()):
+            try:
+                last = json.loads(line)["seq"]
+                break
+            except (ValueError, KeyError):
+                continue
+        return last, size, chunk.endswith(b"\n") or size == 0
+
+    # Moves on every append by any worker; None without the invalidation table
+    def revision(self):
+        return invalidation.revision(self._revision_key)
+
+    def head(self):
+        segments = self._segments()
+        return self._tail(segments[-1])[0] if segments else self._checkpoint()["headSeq"]
+
+    def append(self, kind, doc_id, op):
+        return self.append_all([(kind, doc_id, op)])[0]
+
+    # Append (kind, doc_id, op) changes as consecutive records with one write
+    # and fsync; returns their sequence numbers. tx tags them with the journal
+    # transaction that made them. With since (the transaction's start time)
+    # those already logged for tx are left out, for a transaction replayed
+    # after its process died between appending and finishing.
+    def append_all(self, changes, tx=None, since=None):
+        with self._lock, span("changelog_append"), open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                segments = self._segments()
+                if since is not None:
+                    logged = self._logged(segments, tx, since)
+                    changes = [c for c in changes if tuple(c) not in logged]
+                if not changes:
+                    return []
+                if segments:
+                    head, size, clean = self._tail(segments[-1])
+                    active = segments[-1]
+                else:
+                    head, size, clean = self._checkpoint()["headSeq"], 0, True
+                    active = None
+                rotated = active is None or size >= self.segment_bytes
+                if rotated:
+                    active = _segment_name(head + 1)
+                    clean = True
+
+                ts = round(time.time(), 3)
+                records = []
+                for i, (kind, doc_id, op) in enumerate(changes):
+                    record = {"seq": head + 1 + i, "ts": ts, "kind": kind, "id": doc_id, "op": op}
+                    if tx is not None:
+                        record["tx"] = tx
+                    records.append(record)
+                with open(os.path.join(self.directory, active), 'a') as f:
+                    # Terminate a line torn by a crash so these records start on their own line
+                    f.write(("" if clean else "\n") + "".join(_encode(r) for r in records))
+                    f.flush()
+                    os.fsync(f.fileno())
+                invalidation.publish(self._revision_key)
+
+                if rotated:
+                    checkpoint = self._checkpoint()
+                    checkpoint["headSeq"] = head
+                    save_json(self._checkpoint_path, checkpoint, fsync=True)
+                    if len(segments) > self.compact_segments:
+                        self._compact(segments, checkpoint)
+                return [r["seq"] for r in records]
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # (kind, id, op) of the records tagged tx, searching back from the newest
+    # segment to the first one that starts before since
+    def _logged(self, segments, tx, since):
+        logged = set()
+        for name in reversed(segments):
+            records = self._read_segment(name)
+            logged.update((r["kind"], r["id"], r["op"]) for r in records if r.get("tx") == tx)
+            if records and records[0]["ts"] < since:
+                break
+        return logged
+
+    # Re-derive checkpoint.json from the segments (scripts/fsck.py): the head
+    # at the last rotation is the sequence before the active segment. How far
+    # the log was compacted is kept when readable, else taken to be that head,
+    # which makes clients syncing from before it start over.
+    def rebuild_checkpoint(self):
+        with self._lock, open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    previous = self._checkpoint()
+                except (OSError, ValueError):
+                    previous = {}
+                segments = self._segments()
+                head = _segment_start(segments[-1]) - 1 if segments else previous.get("headSeq", 0)
+                checkpoint = {"headSeq": head, "compactedThrough": min(previous.get("compactedThrough", head), head)}
+                save_json(self._checkpoint_path, checkpoint, fsync=True)
+                return checkpoint
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Merge sealed segments into one, keeping the latest change per document
+    def _compact(self, sealed, checkpoint):
+        with span("changelog_compact"):
+            latest = {}
+            for name in sealed:
+                for record in self._read_segment(name):
+                    latest[(record["kind"], record["id"])] = record
+            kept = sorted(latest.values(), key=lambda r: r["seq"])
+            # Written over the first sealed segment so it still sorts before the rest
+            target = os.path.join(self.directory, sealed[0])
+            tmp_path = target + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(_encode(r) for r in kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+            for name in sealed[1:]:
+                os.remove(os.path.join(self.directory, name))
+            checkpoint["compactedThrough"] = checkpoint["headSeq"]
+            save_json(self._checkpoint_path, checkpoint, fsync=True)
+            print(f"[CHANGES] Compacted {len(sealed)} segments to {len(kept)} records through seq {checkpoint['headSeq']}")
+
+    def _collect(self, since, limit):
+        segments = self._segments()
+        changes = []
+        for i, name in enumerate(segments):
+            # Skip segments that end at or before since
+            if i + 1 < len(segments) and _segment_start(segments[i + 1]) <= since + 1:
+                continue
+            for record in self._read_segment(name):
+                if record["seq"] > since:
+                    changes.append(record)
+            if len(changes) > limit:
+                break
+        changes.sort(key=lambda r: r["seq"])
+        return changes
+
+    # Changes with seq > since, oldest first, at most limit of them
+    def read(self, since=0, limit=500):
+        with span("changelog_read"):
+            for attempt in range(3):
+                try:
+                    changes = self._collect(since, limit)
+                    break
+                except FileNotFoundError:
+                    # A segment was compacted away while we read; start over
+                    continue
+            else:
+                raise RuntimeError("Change log is being compacted; retry")
+        checkpoint = self._checkpoint()
+        has_more = len(changes) > limit
+        # The transaction tag is only for the journal's replay
+        changes = [{k: v for k, v in r.items() if k != "tx"} for r in changes[:limit]]
+        return {
+            "changes": changes,
+            "nextSince": changes[-1]["seq"] if changes else since,
+            "headSeq": self.head(),
+            "compactedThrough": checkpoint["compactedThrough"],
+            "hasMore": has_more,
+        }
@@ -0,0 +1,52 @@
+import os
+from flask import current_app, request
+
+# Origins allowed to call the API, comma separated
+CORS_ORIGINS = [
+    o.strip().rstrip("/")
+    for o in os.getenv("CORS_ORIGINS", os.getenv("FRONTEND_URL") or "https://bid-management-software.vercel.app").split(",")
+    if o.strip()
+]
+# How long browsers may cache a preflight result (seconds; browsers cap it, Chrome at 2 hours)
+CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", "86400"))
+
+ALLOW_METHODS = "GET, POST, PUT, DELETE, OPTIONS"
+ALLOW_HEADERS = "Content-Type, Authorization, X-Debug-Timing"
+
+
+def _allowed_origin():
+    origin = request.headers.get("Origin")
+    if origin and ("*" in CORS_ORIGINS or origin.rstrip("/") in CORS_ORIGINS):
+        return origin
+    return None
+
+
+def _set_headers(response, origin):
+    response.vary.add("Origin")
+    if origin:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+
+
+# Answer CORS preflights before any other hook: no logging, admission or body
+# parsing, and no route handler. Register this before the other hooks.
+def preflight():
+    if request.method != "OPTIONS" or "Access-Control-Request-Method" not in request.headers:
+        return None
+    response = current_app.response_class(status=204)
+    _set_headers(response, _allowed_origin())
+    response.headers["Access-Control-Allow-Methods"] = ALLOW_METHODS
+    response.headers["Access-Control-Allow-Headers"] = ALLOW_HEADERS
+    response.headers["Access-Control-Max-Age"] = str(CORS_MAX_AGE)
+    return response
+
+
+def add_cors_headers(response):
+    if "Access-Control-Allow-Origin" not in response.headers:
+        _set_headers(response, _allowed_origin())
+    return response
+
+
+def init_app(app):
+    app.before_request(preflight)
+    app.after_request(add_cors_headers)
@@ -0,0 +1,24 @@
+# In-process change notifications. Mutation handlers publish after a successful
+# write (journal transactions do so through tx.publish(), which also records
+# the change in the change log); derived indexes subscribe to keep themselves
+# current.
+#   kind   - "bid" (doc_id is the bid id), "tracker" (doc_id is the tracker base id),
+#            "workshop" (doc_id is the session id), "blueprint" (doc_id is the
+#            bid name under the blueprint's data directory) or "template"
+#            (doc_id is the template name)
+#   op     - "create", "update", "delete" or "archive"
+_subscribers = []
+
+
+def subscribe(fn):
+    _subscribers.append(fn)
+    return fn
+
+
+def publish(kind, doc_id, op="update"):
+    for fn in list(_subscribers):
+        try:
+            fn(kind, doc_id, op)
+        except Exception as e:
+            # A failing index must never fail the write that triggered it
+            print(f"[EVENTS] Subscriber {getattr(fn, '__name__', fn)} failed for {kind} {doc_id}: {e}")
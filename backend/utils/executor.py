@@ -0,0 +1,34 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking disk and network calls that should not hold up a request thread
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+IO_QUEUE_LIMIT = int(os.getenv("IO_QUEUE_LIMIT", "64"))
+
+_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+_slots = threading.BoundedSemaphore(IO_WORKERS + IO_QUEUE_LIMIT)
+
+
+# Submit work to the I/O pool. Returns a Future, or None when the queue is full
+# so callers can degrade (run inline or skip) instead of piling up work.
+def submit(fn, *args, **kwargs):
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        future = _executor.submit(fn, *args, **kwargs)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+# Run fn over items on the I/O pool and return the results in order.
+# Items that cannot be queued run inline on the calling thread.
+def map_blocking(fn, items):
+    pending = []
+    for item in items:
+        future = submit(fn, item)
+        pending.append((item, future))
+    return [future.result() if future is not None else fn(item) for item, future in pending]
@@ -0,0 +1,185 @@
+import csv
+import io
+import os
+import zipfile
+from xml.sax.saxutils import escape
+from utils.analytics import bid_key_from_bid_id, bid_key_from_tracker_id
+from utils.storage import load_json
+from utils import layout
+from utils import owners
+from utils import tracker_store
+
+COLUMNS = ("kind", "bid", "document", "deliverable", "id", "name", "owner", "status",
+           "startDate", "endDate", "remarks", "archived")
+
+# Rows buffered before a chunk is handed to the response
+CHUNK_ROWS = 500
+
+
+def _is_tracker(name):
+    return "_Action Tracker" in name or name.endswith('_action_tracker.json')
+
+
+# (name, path, archived) for every bid and tracker document, or only those of the given bid keys
+def _documents(roots, bids, include_archived):
+    sources = [(roots["bids"], False), (roots["trackers"], False)]
+    if include_archived:
+        sources.append((roots["archive"], True))
+    for root, archived in sources:
+        if bids:
+            entries = [e for key in bids for e in layout.list_prefix(root, key).items()]
+        else:
+            entries = layout.list_entries(root)
+        for name, path in sorted(entries):
+            if name == 'current_bid.json' or (not name.endswith('.json') and not _is_tracker(name)):
+                continue
+            yield name, path, archived
+
+
+# One flat row per activity and action, one document in memory at a time
+def iter_rows(roots, filters=None, include_archived=False):
+    filters = filters or {}
+    bids = set(filters.get("bid") or [])
+    kinds = set(filters.get("kind") or [])
+    wanted = {f: set(filters.get(f) or []) for f in ("deliverable", "owner", "status")}
+
+    for name, path, archived in _documents(roots, bids, include_archived):
+        document = name[:-len('.json')] if name.endswith('.json') else name
+        try:
+            if _is_tracker(name):
+                if kinds and "action" not in kinds:
+                    continue
+                bid = bid_key_from_tracker_id(document.replace('_action_tracker', ''))
+                doc = tracker_store.load_tracker(path, include_history=False)
+                groups = doc.get("actionsByDeliverable", {})
+                kind = "action"
+            else:
+                if kinds and "activity" not in kinds:
+                    continue
+                bid = bid_key_from_bid_id(document)
+                doc = owners.decode_bid(load_json(path))
+                groups = doc.get("activities") or {}
+                kind = "activity"
+        except Exception as e:
+            print(f"[EXPORT] Skipping {path}: {e}")
+            continue
+        # list_prefix matches by prefix, so drop neighbours such as Acme_Cloud2 for Acme_Cloud
+        if bids and bid not in bids:
+            continue
+
+        for deliverable, records in groups.items():
+            if wanted["deliverable"] and deliverable not in wanted["deliverable"]:
+                continue
+            for r in records:
+                row = {
+                    "kind": kind, "bid": bid, "document": document, "deliverable": deliverable,
+                    "id": r.get("actionId", r.get("name", "")), "name": r.get("name", ""),
+                    "owner": r.get("owner", "Unassigned"), "status": r.get("status", ""),
+                    "startDate": r.get("startDate", ""), "endDate": r.get("endDate", ""),
+                    "remarks": r.get("remarks", ""), "archived": archived,
+                }
+                if wanted["owner"] and row["owner"] not in wanted["owner"]:
+                    continue
+                if wanted["status"] and row["status"] not in wanted["status"]:
+                    continue
+                yield row
+
+
+def csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([row[c] for c in columns])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+# Collects what ZipFile writes so it can be yielded. It has no tell()/seek(),
+# which makes ZipFile write streaming-style entries with data descriptors.
+class _Sink:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_row(values):
+    cells = "".join(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(v))}</t></is></c>' for v in values)
+    return f"<row>{cells}</row>"
+
+
+# A minimal single-sheet workbook with inline strings, streamed as it is zipped
+def xlsx_chunks(rows, columns):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        yield sink.drain()
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(columns).encode("utf-8"))
+            count = 0
+            for row in rows:
+                sheet.write(_xlsx_row([row[c] for c in columns]).encode("utf-8"))
+                count += 1
+                if count % CHUNK_ROWS == 0:
+                    yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
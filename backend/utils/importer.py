@@ -0,0 +1,134 @@
+import codecs
+import csv
+import json
+import os
+from datetime import datetime
+
+# Largest upload accepted in one import, in rows
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "10000"))
+# Row errors listed in a response; the rest are only counted
+IMPORT_MAX_ERRORS = 500
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+def _lines(stream):
+    # Decode the upload incrementally instead of reading it into memory
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+# (row number, record dict or None, parse error or None) for each CSV or JSONL row
+def iter_records(stream, fmt):
+    count = 0
+    if fmt == "jsonl":
+        for number, line in enumerate(_lines(stream), 1):
+            if not line.strip():
+                continue
+            count += 1
+            if count > IMPORT_MAX_ROWS:
+                raise ImportTooLarge(f"Imports are limited to {IMPORT_MAX_ROWS} rows.")
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "Each line must be a JSON object."
+                continue
+            yield number, record, None
+    else:
+        reader = csv.DictReader(_lines(stream))
+        for record in reader:
+            count += 1
+            if count > IMPORT_MAX_ROWS:
+                raise ImportTooLarge(f"Imports are limited to {IMPORT_MAX_ROWS} rows.")
+            # Header is line 1, so the first record is row 2 as a spreadsheet shows it
+            yield reader.line_num, {k.strip(): (v or "").strip() for k, v in record.items() if k}, None
+
+
+def _valid_date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def _common(record, deliverables, team):
+    errors = []
+    deliverable = str(record.get("deliverable") or "").strip()
+    owner = str(record.get("owner") or "").strip()
+    name = str(record.get("name") or "").strip()
+    if not deliverable:
+        errors.append("deliverable is required")
+    elif deliverable not in deliverables:
+        errors.append(f"unknown deliverable '{deliverable}'")
+    if not owner:
+        errors.append("owner is required")
+    elif team and owner not in team:
+        errors.append(f"owner '{owner}' is not on the bid team")
+    if not name:
+        errors.append("name is required")
+    for field in ("startDate", "endDate"):
+        value = str(record.get(field) or "").strip()
+        if value and not _valid_date(value):
+            errors.append(f"{field} must be YYYY-MM-DD")
+    return deliverable, owner, name, errors
+
+
+# Normalized action and list of errors for one imported row
+def validate_action(record, deliverables, team):
+    deliverable, owner, name, errors = _common(record, deliverables, team)
+    action = {
+        "name": name,
+        "deliverable": deliverable,
+        "owner": owner,
+        "endDate": str(record.get("endDate") or "").strip(),
+        "status": str(record.get("status") or "Pending").strip(),
+        "remarks": str(record.get("remarks") or ""),
+    }
+    return action, errors
+
+
+# Normalized activity and list of errors for one imported row
+def validate_activity(record, deliverables, team):
+    deliverable, owner, name, errors = _common(record, deliverables, team)
+    activity = {
+        "name": name,
+        "owner": owner,
+        "status": str(record.get("status") or "Pending").strip(),
+        "startDate": str(record.get("startDate") or "").strip(),
+        "endDate": str(record.get("endDate") or "").strip(),
+        "remarks": str(record.get("remarks") or ""),
+    }
+    if activity["startDate"] and activity["endDate"] and not errors \
+            and activity["startDate"] > activity["endDate"]:
+        errors.append("startDate is after endDate")
+    return deliverable, activity, errors
+
+
+# Upload stream and format ("csv" or "jsonl") of the current request: a
+# multipart "file" field or the raw body
+def request_source(request):
+    upload = request.files.get("file")
+    fmt = request.args.get("format")
+    if upload is not None:
+        fmt = fmt or ("jsonl" if upload.filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+        return upload.stream, fmt
+    if not fmt:
+        fmt = "jsonl" if "json" in (request.content_type or "") else "csv"
+    return request.stream, fmt
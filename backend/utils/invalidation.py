@@ -0,0 +1,149 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+# Slots in a new generation table; keys sharing a slot only cost extra reloads
+INVALIDATION_SLOTS = int(os.getenv("INVALIDATION_SLOTS", "65536"))
+
+MAGIC = b"BIDGEN01"
+HEADER = struct.Struct("<8sQ")    # magic, slot count
+SLOT = struct.Struct("<Q")
+
+# Cross-worker cache invalidation. Every worker on the node maps the same
+# generation table: a file of 64-bit counters, one slot per hashed key. A
+# writer bumps the slot of what it changed once the change is on disk; a
+# reader remembers the revision it loaded at and compares it with the slot, a
+# single memory read, to know whether another worker has written since.
+#
+# Keys are file paths (storage.save_json and the journal publish every file
+# they write, move or delete) and watched trees (watch()), whose revision moves
+# whenever anything under them does. Read the revision before loading, so a
+# write that lands in between is seen as a change on the next check.
+#
+# Tracker updates staged by utils.write_coalescer are not covered until they
+# are flushed, since only then does save_json write and publish them. That is
+# why its window defaults to 0 (write through) and gunicorn.conf.py forces 0
+# with several workers; a window is only for single-process deployments.
+#
+# Until init() is called (scripts, tools) publish does nothing and revision
+# returns None; callers then fall back to their own mtime checks.
+
+_table = None
+_roots = []    # (key, root prefix, excluded prefixes)
+
+
+class _Table:
+    def __init__(self, path, slots):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_fd = None
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) == HEADER.size and HEADER.unpack(header)[0] == MAGIC:
+                # Keep the slot count of a table other workers already use
+                slots = HEADER.unpack(header)[1]
+            else:
+                os.ftruncate(fd, HEADER.size + slots * SLOT.size)
+                os.pwrite(fd, HEADER.pack(MAGIC, slots), 0)
+            self.slots = slots
+            self.map = mmap.mmap(fd, HEADER.size + slots * SLOT.size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def offset(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return HEADER.size + (int.from_bytes(digest, "little") % self.slots) * SLOT.size
+
+    def read(self, offset):
+        return SLOT.unpack_from(self.map, offset)[0]
+
+    # Increment slots under an flock; the lock file is reopened after a fork
+    # so forked workers don't share one lock
+    def bump(self, offsets):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._lock_fd = os.open(self.path, os.O_RDWR)
+                self._pid = os.getpid()
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                for offset in offsets:
+                    SLOT.pack_into(self.map, offset, self.read(offset) + 1)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+
+def init(path, slots=INVALIDATION_SLOTS):
+    global _table
+    _table = _Table(path, slots)
+
+
+def path_key(path):
+    return "path:" + os.path.abspath(path)
+
+
+# Have tree_key(root) move on every publish under root, except under exclude
+def watch(root, exclude=()):
+    root = os.path.join(os.path.abspath(root), "")
+    excluded = tuple(os.path.join(os.path.abspath(e), "") for e in exclude)
+    if all(r != root for _, r, _ in _roots):
+        _roots.append((tree_key(root), root, excluded))
+
+
+def tree_key(root):
+    return "tree:" + os.path.join(os.path.abspath(root), "")
+
+
+def publish(*keys):
+    if _table is not None and keys:
+        _table.bump({_table.offset(k) for k in keys})
+
+
+# A file (or directory) was written, replaced, moved or deleted
+def publish_paths(paths):
+    if _table is None:
+        return
+    keys = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        keys.add("path:" + path)
+        for key, root, excluded in _roots:
+            if path.startswith(root) and not path.startswith(excluded):
+                keys.add(key)
+    publish(*keys)
+
+
+def publish_path(path):
+    publish_paths([path])
+
+
+def revision(key):
+    if _table is None:
+        return None
+    return _table.read(_table.offset(key))
+
+
+def path_revision(path):
+    return revision(path_key(path))
+
+
+# Revision of everything under the given directories, or None when one of
+# them is not inside a watched tree (the caller must then scan for changes)
+def tree_revision(*directories):
+    if _table is None:
+        return None
+    keys = set()
+    for directory in directories:
+        directory = os.path.join(os.path.abspath(directory), "")
+        covering = [key for key, root, excluded in _roots
+                    if directory.startswith(root) and not directory.startswith(excluded)]
+        if not covering:
+            return None
+        keys.add(covering[0])
+    return tuple(_table.read(_table.offset(k)) for k in sorted(keys))
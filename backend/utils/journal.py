@@ -0,0 +1,450 @@
+import contextlib
+import copy
+import fcntl
+import filecmp
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from utils.metrics import span
+from utils import events
+from utils import invalidation
+from utils.storage import load_json, save_json, fsync_paths, fsync_dirs
+
+# Write-ahead journal for operations that touch several documents (finalizing
+# a bid archives the previous version, writes the new one and rotates its
+# tracker). A transaction collects its writes, moves and deletes, appends them
+# as one record under the journal directory and fsyncs it; that is the commit
+# point. The operations are then applied with atomic renames, the touched
+# files and directories are fsynced in one batch, and the record is removed.
+# Each write carries the document it replaces ("before", None for a new file)
+# and deletes move their files into <id>.trash until the record is gone, so
+# the record holds what is needed to undo it.
+#
+# On startup recover() finishes every record left behind by a crash, so a
+# transaction is either fully applied or not applied at all. A committing
+# transaction holds the recovery lock shared from writing its record until the
+# record is removed, and recover() takes it exclusively, so the records it
+# finds all belong to processes that died mid-commit. If none of the files a
+# record touches was written after it by someone else (another worker that
+# kept serving), every operation is re-applied; they are idempotent, which
+# makes re-applying a partly applied record safe. Otherwise the whole
+# transaction is rolled back in reverse order, leaving the newer data alone.
+#
+# tx.publish() stages a change for the change log (utils.changelog) as an
+# operation of the same record: it is appended once the data is applied and
+# before the record is removed, so a write and its change are both durable or
+# both replayed. A replay leaves out changes its dead process already logged.
+# If the append fails after the data is durable, the commit still succeeds and
+# the record is kept with only its changes, to be appended by this process's
+# next commit or by recover().
+
+_journal_dir = None
+_change_log = None
+_lock = threading.Lock()
+# Ids of this process's committed transactions whose changes are not yet logged
+_unlogged = set()
+_unlogged_lock = threading.Lock()
+
+LOCK_FILE = ".recover.lock"
+
+
+def init(journal_dir):
+    global _journal_dir
+    os.makedirs(journal_dir, exist_ok=True)
+    _journal_dir = journal_dir
+
+
+# The ChangeLog that tx.publish() appends to; attach before recover()
+def attach_change_log(change_log):
+    global _change_log
+    _change_log = change_log
+
+
+class Transaction:
+    def __init__(self):
+        self.id = f"{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.ops = []
+        self._callbacks = []
+
+    def save(self, path, data):
+        self.ops.append({"op": "write", "path": path, "data": data})
+
+    def move(self, src, dst):
+        self.ops.append({"op": "move", "src": src, "dst": dst})
+
+    def delete(self, path):
+        self.ops.append({"op": "delete", "path": path})
+
+    # Share src's content at dst as a hard link. Every writer replaces files by
+    # rename (utils.storage.save_json), so a later write to either path gives
+    # that path its own copy and the other keeps the shared one.
+    def link(self, src, dst):
+        self.ops.append({"op": "link", "src": src, "dst": dst})
+
+    # Record a change in the change log with the transaction and tell this
+    # process's subscribers once it is applied
+    def publish(self, kind, doc_id, op="update"):
+        self.ops.append({"op": "change", "kind": kind, "id": doc_id, "change": op})
+        self.on_commit(events.publish, kind, doc_id, op)
+
+    # Run fn once the transaction has been applied
+    def on_commit(self, fn, *args):
+        self._callbacks.append((fn, args))
+
+    # Take over other's operations and callbacks, for committing several
+    # transactions as one (utils.write_coalescer). A write replaces this
+    # transaction's earlier write of the same path, so each document is
+    # written once, and a change already recorded is not repeated.
+    def absorb(self, other):
+        for op in copy.deepcopy(other.ops):
+            if op["op"] == "write":
+                self.ops = [o for o in self.ops if o["op"] != "write" or o["path"] != op["path"]]
+            elif op["op"] == "change" and op in self.ops:
+                continue
+            self.ops.append(op)
+        self._callbacks.extend(other._callbacks)
+
+    def commit(self):
+        if self.ops:
+            with _recovery_lock(exclusive=False):
+                _log_unlogged()
+                for i, op in enumerate(self.ops):
+                    if op["op"] == "write":
+                        op["before"] = _before_image(self.ops, i)
+                record_path = _write_record(self.id, self.ops)
+                _apply(self.id, self.ops)
+                changes = [op for op in self.ops if op["op"] == "change"]
+                try:
+                    _log_changes(self.id, changes)
+                except Exception as e:
+                    # The data is durable, so the write stands; keep its changes for later
+                    print(f"[JOURNAL] Changes of {self.id} not logged yet: {e}")
+                    _keep_unlogged(self.id, changes)
+                else:
+                    os.remove(record_path)
+            shutil.rmtree(_trash_dir(self.id), ignore_errors=True)
+        # Every callback runs even if one fails; the first error is raised after
+        error = None
+        for fn, args in self._callbacks:
+            try:
+                fn(*args)
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+
+# with transaction() as tx: ... commits on a clean exit. Passing an open
+# transaction joins it instead, so helpers can take part in a caller's unit.
+@contextlib.contextmanager
+def transaction(tx=None):
+    if tx is not None:
+        yield tx
+        return
+    tx = Transaction()
+    yield tx
+    tx.commit()
+
+
+# Record a change for a write made outside a transaction (workshop sessions and
+# blueprint bids keep their own files). The write already happened, so a
+# failure is only logged.
+def publish(kind, doc_id, op="update"):
+    tx = Transaction()
+    tx.publish(kind, doc_id, op)
+    try:
+        tx.commit()
+    except Exception as e:
+        print(f"[JOURNAL] Could not record {op} of {kind} {doc_id}: {e}")
+
+
+# Opened per use: flock locks belong to the open file, which threads of one
+# process would otherwise share
+@contextlib.contextmanager
+def _recovery_lock(exclusive):
+    if _journal_dir is None:
+        raise RuntimeError("journal.init() has not been called")
+    with open(os.path.join(_journal_dir, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _write_record(tx_id, ops):
+    record_path = os.path.join(_journal_dir, f"{tx_id}.json")
+    with span("journal_write"):
+        save_json(record_path, {"id": tx_id, "pid": os.getpid(), "ops": ops}, fsync=True)
+        fsync_dirs([_journal_dir])
+    return record_path
+
+
+# Append a transaction's change operations to the change log. replay=True
+# leaves out those a dead process already appended.
+def _log_changes(tx_id, changes, replay=False):
+    if not changes:
+        return
+    if _change_log is None:
+        print(f"[JOURNAL] No change log attached; dropping {len(changes)} changes of {tx_id}")
+        return
+    since = int(tx_id.split("-")[0]) / 1e9 if replay else None
+    _change_log.append_all([(c["kind"], c["id"], c["change"]) for c in changes], tx=tx_id, since=since)
+
+
+# Rewrite the record of an applied transaction with only its changes, for
+# _log_unlogged() or recover() to append
+def _keep_unlogged(tx_id, changes):
+    _write_record(tx_id, changes)
+    with _unlogged_lock:
+        _unlogged.add(tx_id)
+
+
+# Retry the changes of earlier commits whose append failed; the caller holds
+# the recovery lock shared. A record already gone was finished by recover().
+def _log_unlogged():
+    if not _unlogged:
+        return
+    with _unlogged_lock:
+        for tx_id in sorted(_unlogged):
+            record_path = os.path.join(_journal_dir, f"{tx_id}.json")
+            try:
+                with open(record_path) as f:
+                    record = json.load(f)
+                _log_changes(tx_id, record["ops"], replay=True)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[JOURNAL] Changes of {tx_id} still not logged: {e}")
+                return
+            else:
+                os.remove(record_path)
+            _unlogged.discard(tx_id)
+
+
+# path moved along with src (itself or something inside it); None when removed
+def _rebase(path, src, dst):
+    if path == src:
+        return dst
+    if path.startswith(os.path.join(src, "")):
+        return None if dst is None else os.path.join(dst, os.path.relpath(path, src))
+    return path
+
+
+# A file, or a directory and every file under it
+def _paths_under(path):
+    if not os.path.isdir(path):
+        return [path]
+    return [path] + [os.path.join(d, f) for d, _, files in os.walk(path) for f in files]
+
+
+# Deleted files are kept here until their transaction's record is removed
+def _trash_dir(tx_id):
+    return os.path.join(_journal_dir, f"{tx_id}.trash")
+
+
+# What ops[index] (a write) replaces: the data an earlier write of the same
+# transaction left at its path, or the file on disk, followed back through the
+# transaction's earlier moves and links. None when there is no such file.
+def _before_image(ops, index):
+    path = ops[index]["path"]
+    for op in reversed(ops[:index]):
+        if op["op"] == "write" and op["path"] == path:
+            return {"data": op["data"]}
+        if op["op"] == "move":
+            if _rebase(path, op["dst"], op["src"]) != path:
+                path = _rebase(path, op["dst"], op["src"])
+            elif _rebase(path, op["src"], None) != path:
+                return None
+        elif op["op"] == "link" and op["dst"] == path:
+            path = op["src"]
+        elif op["op"] == "delete" and _rebase(path, op["path"], None) != path:
+            return None
+    if not os.path.isfile(path):
+        return None
+    return {"data": load_json(path)}
+
+
+def _apply(tx_id, ops):
+    written = []
+    dirs = set()
+    # Moved, linked and deleted paths; writes publish through save_json
+    touched = []
+    with span("journal_apply"):
+        for i, op in enumerate(ops):
+            if op["op"] == "write":
+                os.makedirs(os.path.dirname(op["path"]) or ".", exist_ok=True)
+                save_json(op["path"], op["data"])
+                written.append(op["path"])
+                dirs.add(os.path.dirname(op["path"]) or ".")
+            elif op["op"] == "move":
+                # Already moved when the source is gone and the target exists
+                if os.path.exists(op["src"]) and not os.path.exists(op["dst"]):
+                    touched.extend(_paths_under(op["src"]))
+                    os.makedirs(os.path.dirname(op["dst"]), exist_ok=True)
+                    shutil.move(op["src"], op["dst"])
+                    touched.extend(_paths_under(op["dst"]))
+                written = [_rebase(p, op["src"], op["dst"]) for p in written]
+                dirs.add(os.path.dirname(op["src"]) or ".")
+                dirs.add(os.path.dirname(op["dst"]) or ".")
+            elif op["op"] == "link":
+                # Already linked when the target exists
+                if os.path.exists(op["src"]) and not os.path.exists(op["dst"]):
+                    os.makedirs(os.path.dirname(op["dst"]), exist_ok=True)
+                    try:
+                        os.link(op["src"], op["dst"])
+                    except OSError:
+                        # File systems without hard links, or src on another device
+                        shutil.copy2(op["src"], op["dst"])
+                    touched.append(op["dst"])
+                dirs.add(os.path.dirname(op["dst"]) or ".")
+            elif op["op"] == "delete":
+                # Already deleted when its trash entry exists
+                trash = os.path.join(_trash_dir(tx_id), str(i))
+                if os.path.exists(op["path"]) and not os.path.exists(trash):
+                    touched.extend(_paths_under(op["path"]))
+                    os.makedirs(_trash_dir(tx_id), exist_ok=True)
+                    shutil.move(op["path"], trash)
+                written = [p for p in written if _rebase(p, op["path"], None) == p]
+                dirs.add(os.path.dirname(op["path"]) or ".")
+    # One fsync pass for everything the transaction touched
+    fsync_paths(written)
+    fsync_dirs(dirs)
+    invalidation.publish_paths(touched)
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+# The file's document, or None when it is missing or unreadable
+def _content(path):
+    try:
+        return {"data": load_json(path)}
+    except (OSError, ValueError):
+        return None
+
+
+# A file of a dead transaction that was written after its record was
+# committed by someone other than the transaction itself, or None. The
+# transaction's own writes are recognised by content, also where its later
+# moves took them.
+def _conflict(ops, committed):
+    own = {}
+    files = set()
+    for op in ops:
+        if op["op"] == "write":
+            own.setdefault(op["path"], []).append(op["data"])
+            files.add(op["path"])
+        elif op["op"] == "move":
+            for path, datas in list(own.items()):
+                moved = _rebase(path, op["src"], op["dst"])
+                if moved != path:
+                    own.setdefault(moved, []).extend(datas)
+            files.update(_paths_under(op["src"]))
+            files.update(_paths_under(op["dst"]))
+        elif op["op"] == "link":
+            files.add(op["dst"])
+        elif op["op"] == "delete":
+            files.update(_paths_under(op["path"]))
+    for path in sorted(files):
+        if not os.path.isfile(path) or _mtime_ns(path) <= committed:
+            continue
+        content = _content(path)
+        if content is None or content["data"] not in own.get(path, []):
+            return path
+    return None
+
+
+# Undo a dead transaction in reverse order. A write is only reverted while the
+# file still holds what the transaction wrote, and a move, link or delete only
+# while its result is still in place.
+def _rollback(tx_id, ops):
+    touched = []
+    dirs = set()
+    for i in reversed(range(len(ops))):
+        op = ops[i]
+        if op["op"] == "write":
+            # Records written before before-images were kept cannot be reverted
+            if "before" not in op or _content(op["path"]) != {"data": op["data"]}:
+                continue
+            if op["before"] is None:
+                os.remove(op["path"])
+                touched.append(op["path"])
+            else:
+                save_json(op["path"], op["before"]["data"], fsync=True)
+            dirs.add(os.path.dirname(op["path"]) or ".")
+        elif op["op"] == "move":
+            if os.path.exists(op["dst"]) and not os.path.exists(op["src"]):
+                touched.extend(_paths_under(op["dst"]))
+                os.makedirs(os.path.dirname(op["src"]) or ".", exist_ok=True)
+                shutil.move(op["dst"], op["src"])
+                touched.extend(_paths_under(op["src"]))
+                dirs.add(os.path.dirname(op["src"]) or ".")
+                dirs.add(os.path.dirname(op["dst"]) or ".")
+        elif op["op"] == "link":
+            if (os.path.isfile(op["dst"]) and os.path.isfile(op["src"])
+                    and filecmp.cmp(op["src"], op["dst"], shallow=False)):
+                os.remove(op["dst"])
+                touched.append(op["dst"])
+                dirs.add(os.path.dirname(op["dst"]) or ".")
+        elif op["op"] == "delete":
+            trash = os.path.join(_trash_dir(tx_id), str(i))
+            if os.path.exists(trash) and not os.path.exists(op["path"]):
+                os.makedirs(os.path.dirname(op["path"]) or ".", exist_ok=True)
+                shutil.move(trash, op["path"])
+                touched.extend(_paths_under(op["path"]))
+                dirs.add(os.path.dirname(op["path"]) or ".")
+    fsync_dirs(dirs)
+    invalidation.publish_paths(touched)
+
+
+# Finish transactions that were committed but not completed: re-apply them,
+# or roll them back if their files were written since. Records that were
+# never completed are temp files and are discarded.
+def recover():
+    if _journal_dir is None:
+        return 0
+    recovered = 0
+    with _lock, _recovery_lock(exclusive=True):
+        for name in sorted(os.listdir(_journal_dir)):
+            path = os.path.join(_journal_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                committed = os.stat(path).st_mtime_ns
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[JOURNAL] Discarding unreadable record {name}: {e}")
+                os.remove(path)
+                continue
+            conflict = _conflict(record["ops"], committed)
+            if conflict is None:
+                print(f"[JOURNAL] Replaying transaction {record['id']} ({len(record['ops'])} operations)")
+                _apply(record["id"], record["ops"])
+                changes = [op for op in record["ops"] if op["op"] == "change"]
+                try:
+                    _log_changes(record["id"], changes, replay=True)
+                except Exception as e:
+                    print(f"[JOURNAL] Changes of {record['id']} not logged yet: {e}")
+                    _keep_unlogged(record["id"], changes)
+                else:
+                    os.remove(path)
+            else:
+                print(f"[JOURNAL] Rolling back transaction {record['id']}: {conflict} was written after it")
+                _rollback(record["id"], record["ops"])
+                os.remove(path)
+            recovered += 1
+        # Every record is finished, so what is left in trash is no longer needed
+        for name in os.listdir(_journal_dir):
+            if name.endswith(".trash"):
+                shutil.rmtree(os.path.join(_journal_dir, name), ignore_errors=True)
+    return recovered
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import re
+
+# Bids, trackers and archived copies are spread over 256 subdirectories named
+# by the first two hex digits of sha1("<client>_<opportunity>"), so every
+# version of one bid and its trackers share a shard and no directory grows
+# with the total number of bids:
+#
+#   bids/3f/Acme_Cloud_version2.json
+#   bids/action_trackers/3f/Acme_Cloud_Action Tracker_version2/
+#   bids/Archive/3f/Acme_Cloud_version1.json
+#
+# Entries still at the top level (written before sharding) are read in place
+# until scripts/migrate_layout.py moves them.
+SHARD_CHARS = 2
+_SHARD_NAME = re.compile(r"^[0-9a-f]{%d}$" % SHARD_CHARS)
+# Tracker entries are "<key>_Action Tracker_versionN"; trackers archived by
+# /move-to-archive are named after the bid, "<key>_versionN_action_tracker.json"
+_SUFFIXES = re.compile(r"(_Action Tracker)?(_version\d+)?(_action_tracker)?(\.json)?$", re.IGNORECASE)
+
+
+def is_shard_dir(name):
+    return bool(_SHARD_NAME.match(name))
+
+
+# "<client>_<opportunity>" for a bid file, tracker entry or archived copy name
+def shard_key(name):
+    return _SUFFIXES.sub("", name, count=1)
+
+
+def shard_of(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:SHARD_CHARS]
+
+
+def shard_dir(root, key):
+    return os.path.join(root, shard_of(key))
+
+
+# Where the entry `name` lives under root: its shard, unless it has not been
+# migrated yet. create=True makes sure the shard exists for a write; reads
+# leave it alone so lookups of missing bids don't create directories.
+def entry_path(root, name, create=False):
+    sharded = os.path.join(shard_dir(root, shard_key(name)), name)
+    if os.path.exists(sharded):
+        return sharded
+    flat = os.path.join(root, name)
+    if os.path.exists(flat):
+        return flat
+    if create:
+        os.makedirs(os.path.dirname(sharded), exist_ok=True)
+    return sharded
+
+
+# Shard location for a new entry, regardless of any flat copy
+def new_entry_path(root, name):
+    path = os.path.join(shard_dir(root, shard_key(name)), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+# Names under root starting with prefix: one shard plus any unmigrated
+# top-level entries. Once migrated, the top level only holds the shard
+# directories, so both listings stay bounded.
+def list_prefix(root, prefix):
+    names = {}
+    if not os.path.isdir(root):
+        return names
+    shard = shard_dir(root, shard_key(prefix))
+    if os.path.isdir(shard):
+        for f in os.listdir(shard):
+            if f.startswith(prefix) and f != '.DS_Store':
+                names[f] = os.path.join(shard, f)
+    for f in os.listdir(root):
+        if f.startswith(prefix) and f not in names and f != '.DS_Store':
+            names[f] = os.path.join(root, f)
+    return names
+
+
+# (name, path) for every entry under root, sharded or not. Shard directories
+# themselves are not returned; other subdirectories at the top level are.
+def list_entries(root):
+    entries = []
+    if not os.path.isdir(root):
+        return entries
+    for f in os.listdir(root):
+        path = os.path.join(root, f)
+        if is_shard_dir(f) and os.path.isdir(path):
+            entries.extend((s, os.path.join(path, s)) for s in os.listdir(path) if s != '.DS_Store')
+        elif f != '.DS_Store':
+            entries.append((f, path))
+    return entries
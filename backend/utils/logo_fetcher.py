@@ -1,14 +1,17 @@
+import os
 import requests
 
+LOGO_FETCH_TIMEOUT = float(os.getenv("LOGO_FETCH_TIMEOUT", "5"))
+
 def fetch_logo(client_name, output_path):
     logo_url = f"https://logo.clearbit.com/{client_name.lower().replace(' ', '')}.com"
 
     try:
-        response = requests.get(logo_url, stream=True)
+        response = requests.get(logo_url, stream=True, timeout=LOGO_FETCH_TIMEOUT)
         if response.status_code == 200:
             with open(output_path, 'wb') as f:
                 f.write(response.content)
         else:
             print(f"Could not fetch logo for {client_name}")
     except Exception as e:
-        print(f"Error fetching logo: {e}")
\ No newline at end of file
+        print(f"Error fetching logo: {e}")
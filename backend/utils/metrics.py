@@ -0,0 +1,251 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request, Response
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How often a worker writes its metrics out for the others to merge (seconds)
+METRICS_DUMP_SECONDS = float(os.getenv("METRICS_DUMP_SECONDS", "1"))
+
+# Metrics are kept per worker process. With share_across_workers() each worker
+# also writes them to a file in a shared directory, and /metrics (whichever
+# worker answers it) reports the sum over every worker of the same server.
+_lock = threading.Lock()
+_request_histograms = {}   # (method, route) -> histogram
+_stage_histograms = {}     # (route, stage) -> histogram
+_error_counts = {}         # (method, route, status) -> count
+_cache_stats = {}          # (cache, result) -> count
+_counters = {}             # (name, labels) -> count
+_shared = {"dir": None, "file": None, "pid": None, "dumped": 0.0}
+
+
+def _new_histogram():
+    return {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+
+
+def _observe(table, key, seconds):
+    with _lock:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = _new_histogram()
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+def _current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    if has_request_context():
+        return "unmatched"
+    return "background"
+
+
+# Time a stage of the current request (disk_read, json_parse, aggregate, ...).
+# Nested or repeated spans of the same stage are summed for the request.
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if has_request_context() and hasattr(g, "timing_stages"):
+            g.timing_stages[stage] = g.timing_stages.get(stage, 0.0) + elapsed
+        _observe(_stage_histograms, (_current_route(), stage), elapsed)
+
+
+# Record a hit or miss for a named in-process cache
+def record_cache(cache, hit):
+    key = (cache, "hit" if hit else "miss")
+    with _lock:
+        _cache_stats[key] = _cache_stats.get(key, 0) + 1
+
+
+# Increment a free-form counter, e.g. record_counter("singleflight_coalesced", route="/list-files")
+def record_counter(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _start_request_timer():
+    g.timing_start = time.perf_counter()
+    g.timing_stages = {}
+
+
+def _finish_request_timer(response):
+    start = getattr(g, "timing_start", None)
+    if start is None:
+        return response
+    _dump_if_due()
+    elapsed = time.perf_counter() - start
+    route = _current_route()
+    _observe(_request_histograms, (request.method, route), elapsed)
+
+    if response.status_code >= 400:
+        key = (request.method, route, str(response.status_code))
+        with _lock:
+            _error_counts[key] = _error_counts.get(key, 0) + 1
+
+    # Opt-in per-request breakdown, in Server-Timing syntax (milliseconds)
+    if request.headers.get("X-Debug-Timing", "").lower() in ("1", "true", "yes"):
+        parts = [f"total;dur={elapsed * 1000:.2f}"]
+        for stage, seconds in sorted(g.timing_stages.items()):
+            parts.append(f"{stage};dur={seconds * 1000:.2f}")
+        response.headers["X-Debug-Timing"] = ", ".join(parts)
+    return response
+
+
+# Tables by name, as written to and merged from the shared directory
+def _tables():
+    return {
+        "requests": _request_histograms,
+        "stages": _stage_histograms,
+        "errors": _error_counts,
+        "caches": _cache_stats,
+        "counters": _counters,
+    }
+
+
+# JSON turns the tuple keys into lists; turn them back
+def _freeze(key):
+    return tuple(_freeze(k) for k in key) if isinstance(key, list) else key
+
+
+# Write this worker's metrics to <dir>/<server pid>-<pid>-<start>.json. Files
+# are per worker start, so a worker that restarts with a reused pid doesn't
+# overwrite the counts of the one that died, which stay in the totals.
+def share_across_workers(directory):
+    os.makedirs(directory, exist_ok=True)
+    _shared["dir"] = directory
+    atexit.register(_dump)
+
+
+def _dump():
+    directory = _shared["dir"]
+    if directory is None:
+        return
+    pid = os.getpid()
+    if _shared["pid"] != pid:
+        # First dump in this process (a preloaded app's workers are forked)
+        _shared["pid"] = pid
+        _shared["file"] = os.path.join(directory, f"{os.getppid()}-{pid}-{time.time_ns()}.json")
+    with _lock:
+        payload = json.dumps({name: [[key, value] for key, value in table.items()]
+                              for name, table in _tables().items()})
+        _shared["dumped"] = time.monotonic()
+    tmp_path = _shared["file"] + ".tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, _shared["file"])
+    except OSError as e:
+        print(f"[METRICS] Could not write {_shared['file']}: {e}")
+
+
+def _dump_if_due():
+    if _shared["dir"] is not None and time.monotonic() - _shared["dumped"] >= METRICS_DUMP_SECONDS:
+        _dump()
+
+
+# Sum of the metrics of every worker of this server. Files left by an earlier
+# server (another parent pid) are removed.
+def _merged_tables():
+    _dump()
+    prefix = f"{os.getppid()}-"
+    merged = {name: {} for name in _tables()}
+    for path in glob.glob(os.path.join(_shared["dir"], "*.json")):
+        if not os.path.basename(path).startswith(prefix):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, entries in data.items():
+            table = merged.get(name)
+            if table is None:
+                continue
+            for key, value in entries:
+                key = _freeze(key)
+                if isinstance(value, dict):
+                    hist = table.setdefault(key, _new_histogram())
+                    hist["buckets"] = [a + b for a, b in zip(hist["buckets"], value["buckets"])]
+                    hist["sum"] += value["sum"]
+                    hist["count"] += value["count"]
+                else:
+                    table[key] = table.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _render_histogram(lines, metric, table, label_names):
+    lines.append(f"# TYPE {metric} histogram")
+    for key, hist in sorted(table.items()):
+        base = list(zip(label_names, key))
+        for bound, count in zip(BUCKETS, hist["buckets"]):
+            lines.append(f'{metric}_bucket{{{_labels(base + [("le", bound)])}}} {count}')
+        lines.append(f'{metric}_bucket{{{_labels(base + [("le", "+Inf")])}}} {hist["count"]}')
+        lines.append(f'{metric}_sum{{{_labels(base)}}} {hist["sum"]:.6f}')
+        lines.append(f'{metric}_count{{{_labels(base)}}} {hist["count"]}')
+
+
+# Render all metrics in the Prometheus text exposition format
+def render_prometheus():
+    if _shared["dir"] is not None:
+        return _render(_merged_tables())
+    with _lock:
+        return _render(_tables())
+
+
+def _render(tables):
+    lines = []
+    _render_histogram(lines, "http_request_duration_seconds", tables["requests"], ("method", "route"))
+    _render_histogram(lines, "http_request_stage_duration_seconds", tables["stages"], ("route", "stage"))
+
+    lines.append("# TYPE http_request_errors_total counter")
+    for (method, route, status), count in sorted(tables["errors"].items()):
+        lines.append(f'http_request_errors_total{{{_labels([("method", method), ("route", route), ("status", status)])}}} {count}')
+
+    lines.append("# TYPE cache_requests_total counter")
+    for (cache, result), count in sorted(tables["caches"].items()):
+        lines.append(f'cache_requests_total{{{_labels([("cache", cache), ("result", result)])}}} {count}')
+
+    typed = set()
+    for (name, labels), count in sorted(tables["counters"].items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name}_total counter")
+            typed.add(name)
+        lines.append(f"{name}_total{{{_labels(labels)}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_route():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# Wire the timing middleware and the /metrics endpoint into the Flask app
+def init_app(app):
+    app.before_request(_start_request_timer)
+    app.after_request(_finish_request_timer)
+    app.add_url_rule('/metrics', 'metrics', metrics_route, methods=['GET'])
@@ -0,0 +1,127 @@
+import fcntl
+import os
+import threading
+from utils.storage import load_json, save_json
+
+# Registry of people (activity/action owners and team members) with stable
+# small integer ids. Documents store "ownerId" instead of repeating the name
+# in every activity and action; names are resolved in bulk when a document is
+# read, and aggregations can group by the integer id directly.
+#
+# The registry is one JSON list shared by every worker: a person's id is their
+# index in it. Ids are only ever appended, under an flock, so an id never
+# changes meaning. Records without an ownerId (written before the registry)
+# keep their "owner" string and are read as-is.
+
+_path = None
+_names = []
+_ids = {}
+_lock = threading.Lock()
+
+
+def init(path):
+    global _path
+    _path = path
+    with _lock:
+        _reload()
+
+
+def _reload():
+    global _names, _ids
+    names = load_json(_path)["names"] if _path and os.path.exists(_path) else []
+    _names = names
+    _ids = {name: i for i, name in enumerate(names)}
+
+
+def id_for(name):
+    name = (name or "Unassigned").strip() or "Unassigned"
+    owner_id = _ids.get(name)
+    if owner_id is not None:
+        return owner_id
+    with _lock, open(_path + ".lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another worker may have registered the name since we last looked
+            _reload()
+            if name not in _ids:
+                save_json(_path, {"names": _names + [name]}, fsync=True)
+                _reload()
+            return _ids[name]
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Names for a batch of ids, reloading once if any were registered by another worker
+def names_for(owner_ids):
+    if any(not isinstance(i, int) or i >= len(_names) for i in owner_ids):
+        with _lock:
+            _reload()
+    names = _names
+    return [names[i] if isinstance(i, int) and 0 <= i < len(names) else "Unassigned" for i in owner_ids]
+
+
+def name_for(owner_id):
+    return names_for([owner_id])[0]
+
+
+# Names for a mix of ids and legacy name strings, as found in owner summaries
+def resolve(keys):
+    ids = [k for k in keys if isinstance(k, int)]
+    names = iter(names_for(ids))
+    return [next(names) if isinstance(k, int) else k for k in keys]
+
+
+# Key to group a record by owner: its id, or the legacy name
+def owner_key(record):
+    return record["ownerId"] if "ownerId" in record else record.get("owner", "Unassigned")
+
+
+def encode_records(records):
+    encoded = []
+    for record in records:
+        record = dict(record)
+        if "owner" in record:
+            record["ownerId"] = id_for(record.pop("owner"))
+        encoded.append(record)
+    return encoded
+
+
+# Replace ownerId with the owner name, in place, with one registry lookup for the batch
+def decode_records(records):
+    records = [r for r in records if "ownerId" in r]
+    for record, name in zip(records, names_for([r["ownerId"] for r in records])):
+        record["owner"] = name
+        del record["ownerId"]
+
+
+def encode_team(team):
+    return [
+        {**{k: v for k, v in m.items() if k != "name"}, "ownerId": id_for(m["name"])} if "name" in m else m
+        for m in team or []
+    ]
+
+
+def decode_team(team):
+    members = [m for m in team or [] if "ownerId" in m]
+    for member, name in zip(members, names_for([m["ownerId"] for m in members])):
+        member["name"] = name
+        del member["ownerId"]
+
+
+# Copy of a bid document in its stored form
+def encode_bid(doc):
+    doc = dict(doc)
+    if isinstance(doc.get("activities"), dict):
+        doc["activities"] = {d: encode_records(acts) for d, acts in doc["activities"].items()}
+    if isinstance(doc.get("team"), list):
+        doc["team"] = encode_team(doc["team"])
+    return doc
+
+
+# Stored bid document back to the shape clients use, in place; returns it
+def decode_bid(doc):
+    if isinstance(doc.get("activities"), dict):
+        decode_records([a for acts in doc["activities"].values() for a in acts])
+    if isinstance(doc.get("team"), list):
+        decode_team(doc["team"])
+    return doc
@@ -0,0 +1,55 @@
+# Field projection for read endpoints. ?fields= (or ?sections=) is a comma
+# separated list of top-level keys; "key.sub" keeps only some entries of a
+# dict-valued key, e.g. "clientName,actionsByDeliverable.Pricing". Parsed
+# into {key: None for the whole value, or a set of sub-keys}; no parameter
+# means everything and parses to None.
+
+
+def parse(value):
+    if value is None:
+        return None
+    fields = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, sub = item.partition(".")
+        if not sub or fields.get(key, set()) is None:
+            fields[key] = None
+        else:
+            fields.setdefault(key, set()).add(sub)
+    return fields
+
+
+def from_request(args):
+    return parse(args.get("fields", args.get("sections")))
+
+
+# Hashable form of a parsed projection, equal for equivalent ones (cache keys)
+def cache_key(fields):
+    if fields is None:
+        return None
+    return tuple(sorted((k, None if v is None else tuple(sorted(v))) for k, v in fields.items()))
+
+
+def wants(fields, key):
+    return fields is None or key in fields
+
+
+# Sub-keys wanted under key, or None for all of them
+def subkeys(fields, key):
+    return None if fields is None else fields.get(key)
+
+
+def project(doc, fields):
+    if fields is None:
+        return doc
+    projected = {}
+    for key, sub in fields.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if sub is not None and isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k in sub}
+        projected[key] = value
+    return projected
@@ -0,0 +1,225 @@
+import os
+import re
+import sqlite3
+import threading
+from utils.analytics import bid_key_from_bid_id, bid_key_from_tracker_id
+from utils.metrics import span
+from utils.storage import load_json
+from utils import layout
+from utils import tracker_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    bid TEXT NOT NULL,
+    document TEXT NOT NULL,
+    deliverable TEXT,
+    archived INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_path ON items(path);
+CREATE INDEX IF NOT EXISTS items_bid ON items(bid);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5(
+    title, body,
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+"""
+
+_TERM = re.compile(r"[\w\-']+\*?", re.UNICODE)
+
+
+# Full-text index over bids (client, opportunity, deliverables), their
+# activities and tracker actions (names and remarks), in the active store and
+# the archive. It lives in an SQLite FTS5 database under the state directory
+# and is shared by all workers: the worker that writes a document re-indexes
+# that client/opportunity's documents from its write event, and every other
+# worker searches the updated rows without looking at the store. The
+# documents table records the version each file was indexed at, so the scan a
+# worker makes when it starts (to catch changes made while no worker was
+# running, e.g. by scripts) only re-tokenizes files that changed.
+class SearchIndex:
+    def __init__(self, db_path, bids_dir, trackers_dir, archive_dir):
+        self.db_path = db_path
+        self.bids_dir = bids_dir
+        self.trackers_dir = trackers_dir
+        self.archive_dir = archive_dir
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._scanned = False
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # events.subscribe hook: re-index the written client/opportunity now
+    def notify(self, kind, doc_id, op):
+        if kind not in ("bid", "tracker"):
+            return
+        bid_key = bid_key_from_bid_id(doc_id) if kind == "bid" else bid_key_from_tracker_id(doc_id)
+        with self._lock, span("search_update"):
+            db = self._connect()
+            with db:
+                # Take the write lock before reading the files, so a worker
+                # indexing an older read of them cannot commit after this one
+                db.execute("BEGIN IMMEDIATE")
+                versions = self._versions(bid_key)
+                indexed = {}
+                for path in versions:
+                    row = db.execute("SELECT version FROM documents WHERE path = ?", (path,)).fetchone()
+                    if row:
+                        indexed[path] = row[0]
+                for (path,) in db.execute("SELECT DISTINCT path FROM items WHERE bid = ?", (bid_key,)).fetchall():
+                    indexed.setdefault(path, None)
+                self._sync(db, versions, indexed)
+
+    # Index version of every searchable document, by path; with bid_key only
+    # that client/opportunity's, from its shard of each root
+    def _versions(self, bid_key=None):
+        def entries(root):
+            if bid_key is None:
+                return layout.list_entries(root)
+            return [(f, path) for f, path in layout.list_prefix(root, bid_key).items()
+                    if self._document(path)[0] == bid_key]
+
+        versions = {}
+        for root in (self.bids_dir, self.archive_dir):
+            for f, path in entries(root):
+                if f.endswith('.json') and f != 'current_bid.json' and not f.endswith('_action_tracker.json'):
+                    versions[path] = os.stat(path).st_mtime_ns
+        for root in (self.trackers_dir, self.archive_dir):
+            for f, path in entries(root):
+                if "_Action Tracker" not in f and not f.endswith('_action_tracker.json'):
+                    continue
+                stamp_path = path if f.endswith('.json') else os.path.join(path, tracker_store.HEADER_FILE)
+                if os.path.exists(stamp_path):
+                    versions[path] = os.stat(stamp_path).st_mtime_ns
+        return versions
+
+    # (kind, deliverable, title, body) rows for one document
+    def _items(self, path):
+        name = os.path.basename(path)
+        if name.endswith('.json') and "_Action Tracker" not in name and not name.endswith('_action_tracker.json'):
+            doc = load_json(path)
+            yield "bid", None, f"{doc.get('clientName', '')} {doc.get('opportunityName', '')}", \
+                " ".join(doc.get("deliverables") or [])
+            for deliverable, activities in (doc.get("activities") or {}).items():
+                for a in activities:
+                    yield "activity", deliverable, a.get("name", ""), a.get("remarks", "")
+        else:
+            doc = tracker_store.load_tracker(path, include_history=False)
+            for deliverable, actions in doc.get("actionsByDeliverable", {}).items():
+                for a in actions:
+                    yield "action", deliverable, a.get("name", ""), a.get("remarks", "")
+
+    def _document(self, path):
+        name = os.path.basename(path)
+        document = name[:-len('.json')] if name.endswith('.json') else name
+        if "_Action Tracker" in name or name.endswith('_action_tracker.json'):
+            return bid_key_from_tracker_id(document.replace('_action_tracker', '')), document
+        return bid_key_from_bid_id(document), document
+
+    def _drop(self, db, path):
+        ids = [row[0] for row in db.execute("SELECT id FROM items WHERE path = ?", (path,))]
+        if ids:
+            db.executemany("DELETE FROM entries WHERE rowid = ?", [(i,) for i in ids])
+            db.execute("DELETE FROM items WHERE path = ?", (path,))
+        db.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+    def _index(self, db, path, version):
+        self._drop(db, path)
+        bid, document = self._document(path)
+        archived = 1 if path.startswith(os.path.join(self.archive_dir, "")) else 0
+        for kind, deliverable, title, body in self._items(path):
+            cursor = db.execute(
+                "INSERT INTO items (path, kind, bid, document, deliverable, archived) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, kind, bid, document, deliverable, archived),
+            )
+            db.execute("INSERT INTO entries (rowid, title, body) VALUES (?, ?, ?)",
+                       (cursor.lastrowid, title or "", body or ""))
+        db.execute("INSERT OR REPLACE INTO documents (path, version) VALUES (?, ?)", (path, version))
+
+    # Drop indexed paths that are gone and re-index those whose version changed
+    def _sync(self, db, versions, indexed):
+        for path in indexed:
+            if path not in versions:
+                self._drop(db, path)
+        changed = 0
+        for path, version in versions.items():
+            if indexed.get(path) == version:
+                continue
+            try:
+                self._index(db, path, version)
+                changed += 1
+            except Exception as e:
+                print(f"[SEARCH] Skipping {path}: {e}")
+        return changed
+
+    # Compare the whole store with the database. Runs once per process
+    # (writes after that arrive through notify), or when forced.
+    def refresh(self, force=False):
+        if self._scanned and not force:
+            return 0
+        with self._lock, span("search_refresh"):
+            if self._scanned and not force:
+                return 0
+            db = self._connect()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                changed = self._sync(db, self._versions(), dict(db.execute("SELECT path, version FROM documents")))
+            self._scanned = True
+            return changed
+
+    # FTS5 MATCH expression: terms are ANDed, "term*" and the last term match as prefixes
+    @staticmethod
+    def _match_expression(query):
+        terms = _TERM.findall(query)
+        parts = []
+        for i, term in enumerate(terms):
+            prefix = term.endswith("*") or i == len(terms) - 1
+            term = term.rstrip("*").replace('"', '')
+            if term:
+                parts.append(f'"{term}"' + ("*" if prefix else ""))
+        return " ".join(parts)
+
+    # Ranked matches; name matches weigh more than remark/deliverable matches
+    def search(self, query, limit=20, include_archived=True, kinds=None):
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        self.refresh()
+        sql = """
+            SELECT items.kind, items.bid, items.document, items.deliverable, items.archived,
+                   snippet(entries, 0, '[', ']', '...', 8), snippet(entries, 1, '[', ']', '...', 12),
+                   bm25(entries, 5.0, 1.0) AS score
+            FROM entries JOIN items ON items.id = entries.rowid
+            WHERE entries MATCH ?
+        """
+        params = [expression]
+        if not include_archived:
+            sql += " AND items.archived = 0"
+        if kinds:
+            sql += f" AND items.kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with span("search_query"):
+            rows = self._connect().execute(sql, params).fetchall()
+        return [
+            {
+                "kind": kind, "bid": bid, "document": document, "deliverable": deliverable,
+                "archived": bool(archived), "title": title, "snippet": body, "score": round(-score, 4),
+            }
+            for kind, bid, document, deliverable, archived, title, body, score in rows
+        ]
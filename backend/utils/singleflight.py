@@ -0,0 +1,122 @@
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from utils.metrics import record_counter, span
+from utils.storage import load_json, save_json
+
+# Share results between gunicorn workers through lock and result files
+SINGLEFLIGHT_SHARED = os.getenv("SINGLEFLIGHT_SHARED", "false").lower() == "true"
+# How long a result written by another worker may be reused (seconds)
+SINGLEFLIGHT_SHARE_SECONDS = float(os.getenv("SINGLEFLIGHT_SHARE_SECONDS", "5"))
+# Longest a request waits on another's computation before doing its own (seconds)
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "20"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Concurrent calls with the same key share one computation: the first caller
+# (the leader) runs fn and the rest wait for its result. Keys must include the
+# revision of everything fn reads (file mtimes, query parameters), so a result
+# is never shared across a write.
+#
+# With a directory, the leaders of different workers also take an flock on a
+# per-key lock file; the first writes its result next to it and the others
+# reuse it for up to share_seconds. Results are shared, not copied: callers
+# must not modify them, and they must be JSON-serializable in shared mode.
+#
+# Counted in singleflight_requests_total{group, result}, where result is
+# leader, coalesced (waited in this worker) or shared (reused across workers).
+class SingleFlight:
+    def __init__(self, name, directory=None, share_seconds=SINGLEFLIGHT_SHARE_SECONDS,
+                 wait_seconds=SINGLEFLIGHT_WAIT_SECONDS):
+        self.name = name
+        self.directory = directory
+        self.share_seconds = share_seconds
+        self.wait_seconds = wait_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def do(self, key, fn):
+        key = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            record_counter("singleflight_requests", group=self.name, result="coalesced")
+            with span("singleflight_wait"):
+                finished = call.done.wait(self.wait_seconds)
+            if finished:
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # The leader is stuck; don't queue every request behind it
+            return fn()
+
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn):
+        if not self.directory:
+            record_counter("singleflight_requests", group=self.name, result="leader")
+            return fn()
+
+        base = os.path.join(self.directory, f"{self.name}-{key}")
+        with open(base + ".lock", 'a') as lock_file:
+            with span("singleflight_wait"):
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                result_path = base + ".json"
+                try:
+                    if time.time() - os.path.getmtime(result_path) <= self.share_seconds:
+                        result = load_json(result_path)
+                        record_counter("singleflight_requests", group=self.name, result="shared")
+                        return result
+                except (OSError, ValueError):
+                    pass
+                record_counter("singleflight_requests", group=self.name, result="leader")
+                result = fn()
+                save_json(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._prune()
+
+    # Drop the result and lock files of keys nobody has computed in a while
+    def _prune(self):
+        now = time.time()
+        horizon = max(60.0, self.share_seconds * 10)
+        if now - self._last_prune < horizon:
+            return
+        self._last_prune = now
+        prefix = self.name + "-"
+        for f in os.listdir(self.directory):
+            if not f.startswith(prefix) or not f.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, f)
+            try:
+                if now - os.path.getmtime(path) > horizon:
+                    os.remove(path)
+                    os.remove(path[:-len(".json")] + ".lock")
+            except OSError:
+                pass
@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+from utils.metrics import span
+from utils import invalidation
+
+# Utility: Read JSON from file
+def load_json(file_path):
+    with span("disk_read"):
+        with open(file_path, 'r') as f:
+            raw = f.read()
+    with span("json_parse"):
+        return json.loads(raw)
+
+# Utility: Save JSON to file, optionally forcing it to stable storage.
+# The data goes to a temp file in the same directory which is then renamed over
+# the target, so readers and crashes see either the old or the new document.
+# Caches in other workers learn of the new version through the invalidation table.
+def save_json(file_path, data, fsync=False):
+    with span("json_serialize"):
+        payload = json.dumps(data, indent=4)
+    directory, name = os.path.split(file_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with span("disk_write"):
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    invalidation.publish_path(file_path)
+
+# Utility: Force already-written files to stable storage
+def fsync_paths(file_paths):
+    with span("fsync"):
+        for file_path in file_paths:
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+# Utility: Persist renames and new entries in the given directories
+def fsync_dirs(directories):
+    with span("fsync"):
+        for directory in directories:
+            fd = os.open(directory or ".", os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
@@ -0,0 +1,223 @@
+import fcntl
+import os
+import re
+import threading
+import time
+from utils.analytics import bid_key_from_bid_id
+from utils.metrics import span
+from utils import invalidation
+from utils.storage import load_json, save_json
+from utils import layout
+
+# Rebuild the table from every bid when its last rebuild is older than this (seconds)
+SUGGESTIONS_REBUILD_SECONDS = float(os.getenv("SUGGESTIONS_REBUILD_SECONDS", str(24 * 3600)))
+# Sequences kept per deliverable in the table
+SUGGESTIONS_TOP_SEQUENCES = 5
+
+SEP = "\x1f"
+
+
+def _key(deliverable):
+    return re.sub(r"\s+", " ", deliverable.strip().lower())
+
+
+def _version(name):
+    match = re.search(r"_version(\d+)", name, re.IGNORECASE)
+    return int(match.group(1)) if match else 1
+
+
+# Activity-template suggestions mined from past bids. Every bid (the latest
+# version of each client/opportunity, active or archived) contributes the
+# activity sequence it used per deliverable; the table keeps how many bids
+# used each sequence, and the most common one is the suggestion.
+#
+# The table is one JSON file shared by every worker:
+#   contributions  bid key -> {deliverable key: [name, activity names...]}
+#   counts         deliverable key -> {"name", "bids", "sequences": {joined names: bids}}
+#   suggestions    deliverable key -> most common activity names
+#   deliverables   deliverable names by how many bids used them
+# A lookup is a dict access on the in-memory copy, reloaded when the file's
+# revision in the invalidation table (or, without it, its mtime) changes. A
+# finalized bid that is created, edited or deleted only replaces its own
+# contribution (notify); rebuild() re-mines everything, from a background
+# thread whenever the last rebuild ("rebuiltAt") is rebuild_seconds old, to
+# pick up changes that bypassed the events (files edited by hand, restores).
+# Only the top sequences per deliverable are kept. Updates are
+# read-modify-write under an flock.
+class ActivitySuggestions:
+    def __init__(self, table_path, bids_dir, archive_dir, rebuild_seconds=SUGGESTIONS_REBUILD_SECONDS):
+        self.table_path = table_path
+        self.lock_path = table_path + ".lock"
+        self.bids_dir = bids_dir
+        self.archive_dir = archive_dir
+        self.rebuild_seconds = rebuild_seconds
+        self._table = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    # Rebuild the table in the background now if it is missing or stale, and
+    # again every rebuild_seconds. Every worker checks; the one that gets the
+    # lock rebuilds.
+    def start(self):
+        threading.Thread(target=self._run, name="suggestions-rebuild", daemon=True).start()
+
+    def _run(self):
+        while True:
+            age = time.time() - self._current().get("rebuiltAt", 0)
+            if age > self.rebuild_seconds:
+                try:
+                    if self.rebuild():
+                        age = 0
+                except Exception as e:
+                    print(f"[SUGGESTIONS] Rebuild failed: {e}")
+            # Check again when the table is due, or soon if another worker was rebuilding it
+            time.sleep(max(self.rebuild_seconds - age, min(self.rebuild_seconds, 60)))
+
+    def _current(self):
+        # Revision in the invalidation table, or the mtime without one
+        version = invalidation.path_revision(self.table_path)
+        if version is None:
+            try:
+                version = os.stat(self.table_path).st_mtime_ns
+            except FileNotFoundError:
+                return {}
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        self._table = load_json(self.table_path)
+                    except FileNotFoundError:
+                        return {}
+                    self._version = version
+        return self._table
+
+    # Most common activity names for a deliverable, or None if no bid used it
+    def suggest(self, deliverable):
+        return self._current().get("suggestions", {}).get(_key(deliverable))
+
+    def top_deliverables(self, limit):
+        return self._current().get("deliverables", [])[:limit]
+
+    # Latest stored document of a bid key, active versions before archived ones
+    def _latest_document(self, bid_key):
+        for root in (self.bids_dir, self.archive_dir):
+            versions = [
+                (_version(name), path) for name, path in layout.list_prefix(root, bid_key).items()
+                if name.endswith('.json') and "_Action Tracker" not in name
+                and bid_key_from_bid_id(name[:-len('.json')]) == bid_key
+            ]
+            if versions:
+                return max(versions)[1]
+        return None
+
+    @staticmethod
+    def _contribution(doc):
+        sequences = {}
+        for deliverable, activities in (doc.get("activities") or {}).items():
+            names = [a.get("name") for a in activities if a.get("name")]
+            if names and deliverable.strip():
+                sequences[_key(deliverable)] = [deliverable.strip()] + names
+        return sequences
+
+    @staticmethod
+    def _apply(counts, contribution, sign):
+        for key, (name, *activities) in contribution.items():
+            entry = counts.setdefault(key, {"name": name, "bids": 0, "sequences": {}})
+            entry["bids"] += sign
+            sequence = SEP.join(activities)
+            entry["sequences"][sequence] = entry["sequences"].get(sequence, 0) + sign
+            if entry["sequences"][sequence] <= 0:
+                del entry["sequences"][sequence]
+            if entry["bids"] <= 0:
+                del counts[key]
+            elif sign > 0:
+                entry["name"] = name
+
+    # Rebuild suggestions and deliverables for the given (or all) deliverable keys
+    @staticmethod
+    def _derive(table, keys=None):
+        counts = table["counts"]
+        suggestions = table.setdefault("suggestions", {})
+        for key in list(counts) if keys is None else keys:
+            entry = counts.get(key)
+            if not entry or not entry["sequences"]:
+                suggestions.pop(key, None)
+                continue
+            ranked = sorted(entry["sequences"].items(), key=lambda kv: (-kv[1], kv[0]))
+            entry["sequences"] = dict(ranked[:SUGGESTIONS_TOP_SEQUENCES])
+            suggestions[key] = ranked[0][0].split(SEP)
+        table["deliverables"] = [
+            e["name"] for e in sorted(counts.values(), key=lambda e: (-e["bids"], e["name"]))
+        ]
+
+    def _locked(self, blocking=True):
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    # Mine every active and archived bid; skipped if another worker is already at it
+    def rebuild(self):
+        lock_file = self._locked(blocking=False)
+        if lock_file is None:
+            return False
+        try:
+            with span("suggestions_rebuild"):
+                latest = {}
+                for root in (self.archive_dir, self.bids_dir):
+                    for name, path in layout.list_entries(root):
+                        if not name.endswith('.json') or name == 'current_bid.json' or "_Action Tracker" in name \
+                                or name.endswith('_action_tracker.json'):
+                            continue
+                        bid_key = bid_key_from_bid_id(name[:-len('.json')])
+                        # Active versions rank above archived ones, then by version
+                        rank = (root == self.bids_dir, _version(name))
+                        if bid_key not in latest or rank >= latest[bid_key][0]:
+                            latest[bid_key] = (rank, path)
+                table = {"contributions": {}, "counts": {}, "rebuiltAt": time.time()}
+                for bid_key, (_, path) in latest.items():
+                    try:
+                        contribution = self._contribution(load_json(path))
+                    except Exception as e:
+                        print(f"[SUGGESTIONS] Skipping {path}: {e}")
+                        continue
+                    table["contributions"][bid_key] = contribution
+                    self._apply(table["counts"], contribution, 1)
+                self._derive(table)
+                save_json(self.table_path, table)
+            print(f"[SUGGESTIONS] Mined {len(table['contributions'])} bids, {len(table['counts'])} deliverables")
+            return True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    # Replace one bid's contribution with its latest document's
+    def refresh_bid(self, bid_key):
+        path = self._latest_document(bid_key)
+        contribution = self._contribution(load_json(path)) if path else {}
+        lock_file = self._locked()
+        try:
+            table = load_json(self.table_path) if os.path.exists(self.table_path) \
+                else {"contributions": {}, "counts": {}}
+            previous = table["contributions"].pop(bid_key, {})
+            if previous == contribution:
+                return
+            self._apply(table["counts"], previous, -1)
+            self._apply(table["counts"], contribution, 1)
+            if contribution:
+                table["contributions"][bid_key] = contribution
+            self._derive(table, set(previous) | set(contribution))
+            save_json(self.table_path, table)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    # events.subscribe hook: finalized, created, cloned, edited and deleted
+    # bids. The draft (current_bid) is not mined; an edit that leaves the
+    # activity names alone doesn't rewrite the table.
+    def notify(self, kind, doc_id, op):
+        if kind == "bid" and op in ("create", "update", "delete") and doc_id != "current_bid":
+            self.refresh_bid(bid_key_from_bid_id(doc_id))
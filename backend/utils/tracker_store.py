@@ -0,0 +1,229 @@
+import fcntl
+import hashlib
+import os
+from utils.write_coalescer import tracker_writes
+from utils import journal
+from utils import owners
+from utils import projection
+
+# An action tracker version is stored as a directory of shards:
+#   header.json               counters, owners, deliverables and shard bookkeeping
+#   deliverable-<hash>.json   the actions of one deliverable
+#   history.json              actionHistory for every action
+# so a handler reads and rewrites only the parts it touches. Trackers written
+# before sharding are a single <id>.json file; they are read as-is and split
+# into shards on their first write.
+#
+# Actions are stored with an "ownerId" from the owner registry and the header
+# keeps "ownerIds"; both are resolved back to names when read.
+HEADER_FILE = "header.json"
+HISTORY_FILE = "history.json"
+
+# Header keys that are storage bookkeeping and never returned to clients
+INTERNAL_KEYS = ("shards", "actionIndex", "ownerIds")
+
+
+def is_sharded(path):
+    return not path.endswith('.json')
+
+
+def shard_file(deliverable):
+    return "deliverable-" + hashlib.sha1(deliverable.encode("utf-8")).hexdigest()[:16] + ".json"
+
+
+# Counts for stored (encoded) actions. Owner counts are keyed by the id as a
+# string, JSON objects only having string keys.
+def summarize_actions(actions):
+    counts = {}
+    closed = 0
+    for a in actions:
+        owner = str(owners.owner_key(a))
+        counts[owner] = counts.get(owner, 0) + 1
+        if a.get("status", "").lower() == "completed":
+            closed += 1
+    return {"total": len(actions), "closed": closed, "owners": counts}
+
+
+# Recalculate total, open and closed actions and owners from the per-shard summaries
+def refresh_totals(header):
+    total = 0
+    closed = 0
+    counts = {}
+    for info in header["shards"].values():
+        total += info["total"]
+        closed += info["closed"]
+        for owner, count in info["owners"].items():
+            counts[owner] = counts.get(owner, 0) + count
+    header["totalActions"] = total
+    header["openActions"] = total - closed
+    header["closedActions"] = closed
+    # Summaries of shards not yet rewritten since the registry was added are keyed by name
+    header["ownerIds"] = [int(k) if k.isdigit() else k for k in counts]
+    header.pop("owners", None)
+
+
+def split_tracker(doc):
+    header = {k: v for k, v in doc.items() if k not in ("actionsByDeliverable", "actionHistory", "owners")}
+    header["ownerIds"] = [owners.id_for(name) for name in doc.get("owners", [])]
+    actions_by_deliverable = {
+        d: owners.encode_records(actions) for d, actions in doc.get("actionsByDeliverable", {}).items()
+    }
+    header["shards"] = {
+        d: {"file": shard_file(d), **summarize_actions(actions)}
+        for d, actions in actions_by_deliverable.items()
+    }
+    header["actionIndex"] = {
+        a.get("actionId"): d for d, actions in actions_by_deliverable.items() for a in actions
+    }
+    return header, actions_by_deliverable, doc.get("actionHistory", {})
+
+
+def public_header(header):
+    data = {k: v for k, v in header.items() if k not in INTERNAL_KEYS}
+    if "ownerIds" in header:
+        data["owners"] = owners.resolve(header["ownerIds"])
+    return data
+
+
+def load_header(path):
+    if is_sharded(path):
+        return tracker_writes.load(os.path.join(path, HEADER_FILE))
+    return split_tracker(tracker_writes.load(path))[0]
+
+
+def load_actions(path, header, deliverable):
+    if deliverable not in header["shards"]:
+        return []
+    if is_sharded(path):
+        actions = tracker_writes.load(os.path.join(path, header["shards"][deliverable]["file"]))
+    else:
+        actions = tracker_writes.load(path).get("actionsByDeliverable", {}).get(deliverable, [])
+    owners.decode_records(actions)
+    return actions
+
+
+def load_history(path):
+    if is_sharded(path):
+        return tracker_writes.load(os.path.join(path, HISTORY_FILE))
+    return tracker_writes.load(path).get("actionHistory", {})
+
+
+# Assemble the tracker document in the shape clients expect. With a parsed
+# projection (utils.projection) only the shards it needs are read: the header
+# alone for counters, the named deliverables' shards, history only if asked.
+def load_tracker(path, include_history=True, fields=None):
+    if fields is not None:
+        include_history = projection.wants(fields, "actionHistory")
+    if not is_sharded(path):
+        data = tracker_writes.load(path)
+        if not include_history:
+            data.pop("actionHistory", None)
+        return projection.project(data, fields)
+    header = load_header(path)
+    data = public_header(header)
+    if projection.wants(fields, "actionsByDeliverable"):
+        wanted = projection.subkeys(fields, "actionsByDeliverable")
+        data["actionsByDeliverable"] = {}
+        for deliverable in header["shards"]:
+            if wanted is not None and deliverable not in wanted:
+                continue
+            actions = load_actions(path, header, deliverable)
+            if actions:
+                data["actionsByDeliverable"][deliverable] = actions
+    if include_history:
+        data["actionHistory"] = load_history(path)
+    return projection.project(data, fields)
+
+
+# The save_* functions and write_tracker() add their writes to a journal
+# transaction; commit it with commit() so tracker updates can be coalesced.
+def commit(tx):
+    tracker_writes.commit(tx)
+
+
+def save_header(path, header, tx):
+    tx.save(os.path.join(path, HEADER_FILE), header)
+
+
+# Stage one deliverable's actions and update the header's shard summary, action
+# index and totals. The caller saves the header afterwards.
+def save_actions(path, header, deliverable, actions, tx):
+    actions = owners.encode_records(actions)
+    info = header["shards"].setdefault(deliverable, {"file": shard_file(deliverable)})
+    info.update(summarize_actions(actions))
+    index = header["actionIndex"]
+    for action_id in [k for k, d in index.items() if d == deliverable]:
+        del index[action_id]
+    for a in actions:
+        index[a.get("actionId")] = deliverable
+    refresh_totals(header)
+    tx.save(os.path.join(path, info["file"]), actions)
+
+
+def save_history(path, history, tx):
+    tx.save(os.path.join(path, HISTORY_FILE), history)
+
+
+# Write a full tracker document as shards, keeping its counters as given
+def write_tracker(path, doc, tx):
+    header, actions_by_deliverable, history = split_tracker(doc)
+    for deliverable, actions in actions_by_deliverable.items():
+        tx.save(os.path.join(path, header["shards"][deliverable]["file"]), actions)
+    save_history(path, history, tx)
+    save_header(path, header, tx)
+
+
+# Copy-on-write clone of a tracker into the shard directory dst, with header
+# updates applied (bidId, deliverables). Only the header is written: the
+# action shards and history are hard-linked through the journal, and
+# deliverables no longer listed are left out. Single-file trackers are copied.
+def clone_tracker(src, dst, updates, tx):
+    if is_sharded(src):
+        flush(src)
+        header, actions_by_deliverable, history = load_header(src), None, None
+    else:
+        header, actions_by_deliverable, history = split_tracker(tracker_writes.load(src))
+    header.update(updates)
+    keep = set(header.get("deliverables", []))
+    header["shards"] = {d: info for d, info in header["shards"].items() if d in keep}
+    header["actionIndex"] = {a: d for a, d in header["actionIndex"].items() if d in keep}
+    refresh_totals(header)
+    for deliverable, info in header["shards"].items():
+        if actions_by_deliverable is None:
+            tx.link(os.path.join(src, info["file"]), os.path.join(dst, info["file"]))
+        else:
+            tx.save(os.path.join(dst, info["file"]), actions_by_deliverable[deliverable])
+    if history is None:
+        tx.link(os.path.join(src, HISTORY_FILE), os.path.join(dst, HISTORY_FILE))
+    else:
+        tx.save(os.path.join(dst, HISTORY_FILE), history)
+    tx.save(os.path.join(dst, HEADER_FILE), header)
+
+
+# Convert a single-file tracker to shards before it is modified; returns the
+# shard directory. The shards are written and the file removed in one journal
+# transaction, under the file's flock: a worker that was waiting for the lock
+# finds the file gone and uses the shards the other one wrote.
+def ensure_sharded(path):
+    if is_sharded(path):
+        return path
+    shard_dir = path[:-len('.json')]
+    try:
+        lock_file = open(path, 'r')
+    except FileNotFoundError:
+        return shard_dir
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            return shard_dir
+        tracker_writes.flush([path])
+        with journal.transaction() as tx:
+            write_tracker(shard_dir, tracker_writes.load(path), tx)
+            tx.delete(path)
+    return shard_dir
+
+
+# Write out staged shards before a tracker is moved or deleted
+def flush(path):
+    tracker_writes.flush([path])
+    tracker_writes.flush_tree(path)
@@ -0,0 +1,283 @@
+import os
+import random
+import threading
+from datetime import date
+from utils.analytics import DocumentWatch, bid_key_from_bid_id, bid_key_from_tracker_id, parse_date
+from utils.metrics import span
+from utils.storage import load_json
+from utils import owners
+from utils import tracker_store
+
+# How often to rescan the store for changed documents when there is no change log (seconds)
+WORKLOAD_RESCAN_SECONDS = float(os.getenv("WORKLOAD_RESCAN_SECONDS", "5"))
+
+
+class _Node:
+    __slots__ = ("key", "item", "priority", "max_end", "left", "right")
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+        self.priority = random.random()
+        self.max_end = key[1]
+        self.left = None
+        self.right = None
+
+
+def _update(node):
+    node.max_end = node.key[1]
+    if node.left and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+# Split into nodes with keys below key and the rest
+def _split(node, key):
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.priority > node.priority:
+        new.left, new.right = _split(node, new.key)
+        _update(new)
+        return new
+    if new.key < node.key:
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    _update(node)
+    return node
+
+
+def _delete(node, key):
+    if node is None:
+        return None
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _delete(node.left, key)
+    else:
+        node.right = _delete(node.right, key)
+    _update(node)
+    return node
+
+
+# Interval tree over inclusive day-ordinal ranges: a treap ordered by
+# (start, end, id) where every node also keeps the largest end below it.
+# Insert and remove cost O(log n) expected and an overlap query O(log n + k)
+# for k matches, so a write updates the tree in place instead of rebuilding it.
+class IntervalTree:
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    # key is (start, end, id) with id unique within the tree
+    def insert(self, key, item):
+        self.root = _insert(self.root, _Node(key, item))
+        self.size += 1
+
+    def remove(self, key):
+        self.root = _delete(self.root, key)
+        self.size -= 1
+
+    # Items of all intervals overlapping [start, end]
+    def overlapping(self, start, end):
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            # Nothing below ends on or after the window start
+            if node is None or node.max_end < start:
+                continue
+            stack.append(node.left)
+            # Everything to the right starts after this node does
+            if node.key[0] <= end:
+                if node.key[1] >= start:
+                    found.append(node.item)
+                stack.append(node.right)
+        return found
+
+
+# Per-owner interval index over activity and action date ranges across all
+# active bids. A write event re-reads the written bid's documents and moves
+# only their intervals in the owners' trees; writes by other workers are
+# picked up the same way from the change log (see analytics.DocumentWatch).
+class WorkloadIndex:
+    def __init__(self, bids_dir, trackers_dir, changes=None, rescan_seconds=WORKLOAD_RESCAN_SECONDS):
+        self.bids_dir = bids_dir
+        self.trackers_dir = trackers_dir
+        self._lock = threading.RLock()
+        self.documents = DocumentWatch(bids_dir, trackers_dir, changes, rescan_seconds)
+        self._documents = {}    # document path -> list of assignments
+        self._keys = {}         # document path -> [(owner, tree key), ...]
+        self._trees = {}        # owner -> IntervalTree
+        self._sequence = 0
+        # Called as fn(path, assignments) whenever a document's assignments are replaced
+        self.listeners = []
+
+    # events.subscribe hook: move the written bid's intervals now
+    def notify(self, kind, doc_id, op):
+        if kind not in ("bid", "tracker"):
+            return
+        bid_key = bid_key_from_bid_id(doc_id) if kind == "bid" else bid_key_from_tracker_id(doc_id)
+        with self._lock:
+            self._apply(self.documents.changed_for(bid_key, force=True))
+
+    # Dated assignments in one document. Actions only carry an end date, so
+    # they occupy that single day.
+    def _assignments(self, path):
+        name = os.path.basename(path)
+        assignments = []
+        if path.startswith(self.trackers_dir):
+            doc = tracker_store.load_tracker(path, include_history=False)
+            bid = bid_key_from_tracker_id(name)
+            for deliverable, actions in doc.get("actionsByDeliverable", {}).items():
+                for a in actions:
+                    end = parse_date(a.get("endDate", ""))[0]
+                    start = parse_date(a.get("startDate", ""))[0] if a.get("startDate") else end
+                    if start >= 0 and end >= start:
+                        assignments.append({
+                            "kind": "action", "bid": bid, "deliverable": deliverable,
+                            "id": a.get("actionId"), "name": a.get("name"),
+                            "owner": a.get("owner") or "Unassigned", "status": a.get("status", ""),
+                            "start": start, "end": end,
+                        })
+        else:
+            doc = owners.decode_bid(load_json(path))
+            bid = bid_key_from_bid_id(name[:-len('.json')])
+            for deliverable, activities in (doc.get("activities") or {}).items():
+                for a in activities:
+                    start = parse_date(a.get("startDate", ""))[0]
+                    end = parse_date(a.get("endDate", ""))[0]
+                    if start >= 0 and end >= start:
+                        assignments.append({
+                            "kind": "activity", "bid": bid, "deliverable": deliverable,
+                            "id": a.get("name"), "name": a.get("name"),
+                            "owner": a.get("owner") or "Unassigned", "status": a.get("status", ""),
+                            "start": start, "end": end,
+                        })
+        return assignments
+
+    def _replace(self, path, assignments):
+        for owner, key in self._keys.pop(path, []):
+            tree = self._trees[owner]
+            tree.remove(key)
+            if not tree.size:
+                del self._trees[owner]
+        self._documents.pop(path, None)
+        if assignments is not None:
+            self._documents[path] = assignments
+            keys = self._keys[path] = []
+            for a in assignments:
+                self._sequence += 1
+                key = (a["start"], a["end"], self._sequence)
+                self._trees.setdefault(a["owner"], IntervalTree()).insert(key, a)
+                keys.append((a["owner"], key))
+        for fn in self.listeners:
+            fn(path, assignments or [])
+
+    def _apply(self, changes):
+        for path, version in changes:
+            if version is None:
+                self._replace(path, None)
+                continue
+            try:
+                self._replace(path, self._assignments(path))
+            except Exception as e:
+                print(f"[WORKLOAD] Skipping {path}: {e}")
+                self._replace(path, None)
+                self.documents.forget(path)
+
+    # Pick up documents written by other workers
+    def refresh(self):
+        with self._lock, span("workload_refresh"):
+            self._apply(self.documents.changed())
+
+    # All indexed assignments by document path, for consumers that need the full set (e.g. alerts)
+    def assignments_by_document(self):
+        self.refresh()
+        with self._lock:
+            return {path: list(assignments) for path, assignments in self._documents.items()}
+
+    # Per-person load over [start, end]: assignments overlapping the window,
+    # peak number held on the same day, and the pairs that overlap each other.
+    def capacity(self, start, end, people=None, include_completed=False):
+        self.refresh()
+        with self._lock:
+            trees = {o: t for o, t in self._trees.items() if not people or o in people}
+            matches = {o: t.overlapping(start, end) for o, t in trees.items()}
+
+        report = []
+        for owner, assignments in sorted(matches.items()):
+            if not include_completed:
+                assignments = [a for a in assignments if a["status"].lower() != "completed"]
+            if not assignments:
+                continue
+            assignments.sort(key=lambda a: (a["start"], a["end"]))
+
+            # Sweep the window: +1 at each clipped start, -1 the day after each clipped end
+            events = []
+            for a in assignments:
+                events.append((max(a["start"], start), 1))
+                events.append((min(a["end"], end) + 1, -1))
+            events.sort()
+            concurrent = peak = 0
+            for _, delta in events:
+                concurrent += delta
+                peak = max(peak, concurrent)
+
+            # Overlapping pairs via a sweep over assignments sorted by start
+            overlaps = []
+            active = []
+            for a in assignments:
+                active = [b for b in active if b["end"] >= a["start"]]
+                for b in active:
+                    overlaps.append({
+                        "first": _describe(b), "second": _describe(a),
+                        "from": _iso(max(a["start"], b["start"])), "to": _iso(min(a["end"], b["end"])),
+                    })
+                active.append(a)
+
+            report.append({
+                "owner": owner,
+                "assignments": len(assignments),
+                "peakConcurrent": peak,
+                "overlapping": bool(overlaps),
+                "overlaps": overlaps,
+                "items": [_describe(a) for a in assignments],
+            })
+        return report
+
+
+def _iso(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+def _describe(a):
+    return {
+        "kind": a["kind"], "bid": a["bid"], "deliverable": a["deliverable"], "id": a["id"],
+        "name": a["name"], "status": a["status"], "startDate": _iso(a["start"]), "endDate": _iso(a["end"]),
+    }
@@ -0,0 +1,270 @@
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from utils.metrics import span
+from utils import invalidation
+from utils.storage import load_json, save_json
+
+# Events between tally snapshots, so a worker loading a session replays at most this many
+WORKSHOP_SNAPSHOT_EVENTS = int(os.getenv("WORKSHOP_SNAPSHOT_EVENTS", "500"))
+
+SESSION_FILE = "session.json"
+EVENTS_FILE = "events.jsonl"
+SNAPSHOT_FILE = "snapshot.json"
+LOCK_FILE = ".lock"
+
+CATEGORIES = ("pain", "gain", "strengths", "weaknesses", "opportunities", "threats")
+# Categories placed on the votes/impact quadrant chart
+QUADRANT_CATEGORIES = ("pain", "gain")
+# Vote caps, as enforced by the workshop screens
+VOTE_LIMITS = {"pain": 25, "gain": 25}
+DEFAULT_VOTE_LIMIT = 50
+
+SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# Same classification as determineQuadrant in frontend/src/utils/dataProcessing.js
+def determine_quadrant(votes, impact_score, mid_votes=5, mid_impact=5):
+    if votes >= mid_votes and impact_score >= mid_impact:
+        return "Q1"   # High votes, high impact
+    if votes < mid_votes and impact_score >= mid_impact:
+        return "Q2"   # Low votes, high impact
+    if votes >= mid_votes and impact_score < mid_impact:
+        return "Q3"   # High votes, low impact
+    return "Q4"       # Low votes, low impact
+
+
+def _encode(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+# Server-side state for win-theme workshop sessions, so every participant
+# works on the same pains, gains and SWOT items. Each session directory holds
+#   session.json   id, bid, name and quadrant settings
+#   events.jsonl   append-only stream of item, vote, impact and comment events
+#   snapshot.json  tallies as of some event, written every WORKSHOP_SNAPSHOT_EVENTS
+# Appends are serialized across workers with flock. Every worker keeps the
+# tallies in memory and folds in only the events appended since it last
+# looked, so a vote costs O(1) to tally; a read skips even that while the
+# events file's revision in the invalidation table is unchanged. Each item records the sequence
+# number of the last event that changed it, including its quadrant, so a
+# participant polling with ?since=<seq> receives only what changed.
+class WorkshopStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._states = {}
+        self._revisions = {}    # session id -> events file revision last caught up to
+
+    def _dir(self, session_id):
+        if not SESSION_ID.match(session_id or ""):
+            return None
+        path = os.path.join(self.root, session_id)
+        return path if os.path.exists(os.path.join(path, SESSION_FILE)) else None
+
+    def create(self, bid_id, name, mid_votes=5, mid_impact=None):
+        session_id = uuid.uuid4().hex
+        path = os.path.join(self.root, session_id)
+        os.makedirs(path)
+        session = {
+            "id": session_id, "bidId": bid_id, "name": name, "created": round(time.time(), 3),
+            # midImpact None follows the chart: half the highest impact score, at least 5
+            "midVotes": mid_votes, "midImpact": mid_impact,
+        }
+        open(os.path.join(path, EVENTS_FILE), 'a').close()
+        save_json(os.path.join(path, SESSION_FILE), session, fsync=True)
+        return session
+
+    def list(self, bid_id=None):
+        sessions = []
+        for name in sorted(os.listdir(self.root)):
+            path = self._dir(name)
+            if path:
+                session = load_json(os.path.join(path, SESSION_FILE))
+                if bid_id is None or session.get("bidId") == bid_id:
+                    sessions.append(session)
+        return sessions
+
+    def _state(self, session_id, path):
+        state = self._states.get(session_id)
+        if state is None:
+            snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+            if os.path.exists(snapshot_path):
+                state = load_json(snapshot_path)
+            else:
+                state = {"seq": 0, "offset": 0, "items": {}}
+            state["session"] = load_json(os.path.join(path, SESSION_FILE))
+            self._states[session_id] = state
+            self._revisions.pop(session_id, None)
+        return state
+
+    # Fold in events other workers appended since this worker last read
+    def _catch_up(self, state, path):
+        with open(os.path.join(path, EVENTS_FILE), 'rb') as f:
+            f.seek(state["offset"])
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return
+        touched = set()
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Torn line from a crash mid-append
+                continue
+            if event["seq"] > state["seq"]:
+                touched.add(self._apply(state, event))
+                state["seq"] = event["seq"]
+        state["offset"] += end
+        self._place(state, touched)
+
+    # Apply one event to the tallies; returns the category it touched
+    def _apply(self, state, event):
+        items = state["items"]
+        kind = event["type"]
+        if kind == "add":
+            item = dict(event["item"])
+            item.update({"votes": 0, "removed": False, "seq": event["seq"]})
+            items[item["id"]] = item
+            return item["category"]
+        item = items[event["itemId"]]
+        if kind == "vote":
+            limit = VOTE_LIMITS.get(item["category"], DEFAULT_VOTE_LIMIT)
+            item["votes"] = min(limit, max(0, item["votes"] + event["delta"]))
+        elif kind == "impact":
+            item["impactScore"] = event["value"]
+        elif kind == "comment":
+            item["comment"] = event["value"]
+        elif kind == "text":
+            item["text"] = event["value"]
+        elif kind == "remove":
+            item["removed"] = True
+        item["seq"] = event["seq"]
+        return item["category"]
+
+    # Recompute quadrants of the touched categories; an item whose quadrant
+    # moves (the impact midpoint follows the highest score) counts as changed
+    def _place(self, state, categories):
+        session = state["session"]
+        for category in categories:
+            if category not in QUADRANT_CATEGORIES:
+                continue
+            members = [i for i in state["items"].values() if i["category"] == category and not i["removed"]]
+            mid_impact = session.get("midImpact")
+            if mid_impact is None:
+                mid_impact = math.ceil(max([i.get("impactScore", 0) for i in members] + [10]) / 2)
+            for item in members:
+                quadrant = determine_quadrant(item["votes"], item.get("impactScore", 0),
+                                              session.get("midVotes", 5), mid_impact)
+                if item.get("quadrant") != quadrant:
+                    item["quadrant"] = quadrant
+                    item["seq"] = state["seq"]
+
+    # Items changed after seq `since` (all live items for since=0)
+    def read(self, session_id, since=0):
+        path = self._dir(session_id)
+        if path is None:
+            return None
+        with self._lock:
+            state = self._state(session_id, path)
+            revision = invalidation.path_revision(os.path.join(path, EVENTS_FILE))
+            if revision is None or revision != self._revisions.get(session_id):
+                with span("workshop_catch_up"):
+                    self._catch_up(state, path)
+                self._revisions[session_id] = revision
+            changed = [dict(i) for i in state["items"].values() if i["seq"] > since and not (since == 0 and i["removed"])]
+            return {"session": state["session"], "seq": state["seq"], "since": since,
+                    "items": sorted(changed, key=lambda i: i["seq"])}
+
+    def _validate(self, state, event, pending_ids):
+        kind = event.get("type")
+        if kind == "add":
+            category = event.get("category")
+            text = str(event.get("text") or "").strip()
+            if category not in CATEGORIES:
+                return None, f"category must be one of {', '.join(CATEGORIES)}"
+            if not text:
+                return None, "text is required"
+            item_id = str(event.get("id") or uuid.uuid4().hex[:12])
+            if item_id in state["items"] or item_id in pending_ids:
+                return None, f"item {item_id} already exists"
+            pending_ids.add(item_id)
+            return {"type": "add", "item": {
+                "id": item_id, "category": category, "text": text,
+                "impactScore": _number(event.get("impactScore"), 0), "comment": str(event.get("comment") or ""),
+            }}, None
+        if kind not in ("vote", "impact", "comment", "text", "remove"):
+            return None, "type must be add, vote, impact, comment, text or remove"
+        item_id = event.get("itemId")
+        if item_id not in state["items"] and item_id not in pending_ids:
+            return None, f"unknown item {item_id}"
+        if kind == "vote":
+            delta = event.get("delta", 1)
+            if not isinstance(delta, int) or isinstance(delta, bool) or delta == 0:
+                return None, "delta must be a non-zero integer"
+            return {"type": "vote", "itemId": item_id, "delta": delta}, None
+        if kind == "impact":
+            value = _number(event.get("value"), None)
+            if value is None or value < 0:
+                return None, "value must be a non-negative number"
+            return {"type": "impact", "itemId": item_id, "value": value}, None
+        if kind in ("comment", "text"):
+            return {"type": kind, "itemId": item_id, "value": str(event.get("value") or "")}, None
+        return {"type": "remove", "itemId": item_id}, None
+
+    # Validate and append a participant's events; returns (changes since `since`, errors)
+    def append(self, session_id, participant, events, since=0):
+        path = self._dir(session_id)
+        if path is None:
+            return None, None
+        errors = []
+        with self._lock, open(os.path.join(path, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._state(session_id, path)
+                self._catch_up(state, path)
+                records = []
+                pending_ids = set()
+                for index, event in enumerate(events):
+                    record, error = self._validate(state, event if isinstance(event, dict) else {}, pending_ids)
+                    if error:
+                        errors.append({"index": index, "error": error})
+                        continue
+                    record.update({"seq": state["seq"] + len(records) + 1, "ts": round(time.time(), 3),
+                                   "participant": participant})
+                    records.append(record)
+                if records:
+                    with span("workshop_append"), open(os.path.join(path, EVENTS_FILE), 'a+b') as f:
+                        size = f.seek(0, os.SEEK_END)
+                        clean = size == 0 or (f.seek(size - 1) == size - 1 and f.read(1) == b"\n")
+                        # Terminate a line torn by a crash so these events start on their own line
+                        f.write((b"" if clean else b"\n") + "".join(_encode(r) for r in records).encode("utf-8"))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    invalidation.publish_path(os.path.join(path, EVENTS_FILE))
+                    before = state["seq"]
+                    self._catch_up(state, path)
+                    if state["seq"] // WORKSHOP_SNAPSHOT_EVENTS != before // WORKSHOP_SNAPSHOT_EVENTS:
+                        save_json(os.path.join(path, SNAPSHOT_FILE),
+                                  {k: v for k, v in state.items() if k != "session"})
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return self.read(session_id, since), errors
+
+
+def _number(value, default):
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,144 @@
+import atexit
+import copy
+import os
+import threading
+from utils.metrics import record_cache, record_counter
+from utils.storage import load_json
+from utils import journal
+
+# How long tracker transactions are collected before they commit as one
+# (seconds). Staged documents live in one process, so another worker reading
+# the files meanwhile would work from the old versions and its writes would
+# replace them: coalescing is a single-worker mode (threads are fine).
+# gunicorn.conf.py runs one worker when a window is set, and turns the window
+# off if more workers are forced on the command line.
+TRACKER_COALESCE_WINDOW = float(os.getenv("TRACKER_COALESCE_WINDOW", "0"))
+# commit - commit() returns once its group commit is written and fsynced
+# window - commit() returns immediately; each window commits as one journal transaction
+# never  - as window (group commits always go through the fsynced journal)
+TRACKER_DURABILITY = os.getenv("TRACKER_DURABILITY", "window")
+
+
+# Group commit for journal transactions that only write documents. Each one
+# committed within the window is merged into a single transaction (a document
+# written several times is written once, with its latest version), which
+# commits as one journal record with one fsync pass when the window closes.
+# Reads through load() see staged and in-flight versions, so a worker always
+# reads its own writes; the transactions' callbacks (events.publish) run once
+# the group is committed. With window 0 every commit() goes straight to the
+# journal. A failed group stays staged and is retried after another window;
+# commit() callers waiting on it in "commit" mode get the error.
+class WriteCoalescer:
+    def __init__(self, name, window, durability):
+        if durability not in ("commit", "window", "never"):
+            raise ValueError(f"Unknown durability policy: {durability}")
+        self.name = name
+        self.window = window
+        self.durability = durability
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._group = journal.Transaction()  # staged transactions, merged
+        self._pending = {}    # path -> latest staged document
+        self._inflight = {}   # path -> document of the group being committed
+        self._timer = None
+        self._staged_generation = 0
+        self._committed_generation = 0
+        self._failure = None  # (staged generation, error) of the last failed flush
+
+    def load(self, path):
+        with self._lock:
+            data = self._pending.get(path, self._inflight.get(path))
+            if data is not None:
+                record_cache(self.name, True)
+                return copy.deepcopy(data)
+        record_cache(self.name, False)
+        return load_json(path)
+
+    # Commit tx, staging it for the window's group commit. A transaction that
+    # also moves, links or deletes commits at once, after everything staged.
+    def commit(self, tx):
+        if self.window <= 0 or not tx.ops or any(op["op"] not in ("write", "change") for op in tx.ops):
+            self.flush()
+            tx.commit()
+            return
+        with self._lock:
+            for op in tx.ops:
+                if op["op"] == "write":
+                    if op["path"] in self._pending:
+                        record_counter("write_coalesced", cache=self.name)
+                    self._pending[op["path"]] = copy.deepcopy(op["data"])
+            self._group.absorb(tx)
+            self._staged_generation += 1
+            generation = self._staged_generation
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if self.durability == "commit":
+            # Group commit: wait for the flush that carries this transaction
+            with self._lock:
+                while self._committed_generation < generation:
+                    if self._failure is not None and self._failure[0] >= generation:
+                        raise self._failure[1]
+                    self._lock.wait()
+
+    # Timer callback; a failure is retried by the timer flush() re-arms
+    def _flush_later(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[COALESCER] Flush of {self.name} failed, retrying in {self.window}s: {e}")
+
+    # Commit the staged group now if anything under directory is staged
+    def flush_tree(self, directory):
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            staged = any(p.startswith(prefix) for p in self._pending)
+        if staged:
+            self.flush()
+
+    # Commit the staged group now: always, or only if one of paths is staged.
+    # The group is committed whole, so staged transactions stay atomic.
+    # Call before moving, archiving or deleting a file that may have staged writes.
+    def flush(self, paths=None):
+        with self._flush_lock:
+            with self._lock:
+                if not self._group.ops or (paths is not None and not any(p in self._pending for p in paths)):
+                    return
+                group, self._group = self._group, journal.Transaction()
+                batch, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                staged = self._staged_generation
+                self._inflight = batch
+
+            try:
+                group.commit()
+            except Exception as e:
+                # Keep the failed group staged under anything staged since and
+                # retry it after another window; commit-mode callers in it fail
+                with self._lock:
+                    group.absorb(self._group)
+                    self._group = group
+                    self._pending = {**batch, **self._pending}
+                    self._failure = (staged, e)
+                    if self.window > 0 and self._timer is None:
+                        self._timer = threading.Timer(self.window, self._flush_later)
+                        self._timer.daemon = True
+                        self._timer.start()
+                raise
+            else:
+                with self._lock:
+                    self._committed_generation = staged
+                    self._failure = None
+            finally:
+                with self._lock:
+                    self._inflight = {}
+                    self._lock.notify_all()
+            record_counter("write_commits", cache=self.name)
+
+
+tracker_writes = WriteCoalescer("tracker_writes", TRACKER_COALESCE_WINDOW, TRACKER_DURABILITY)
+atexit.register(tracker_writes.flush)